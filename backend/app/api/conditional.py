@@ -0,0 +1,65 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304) for cached session reads
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from ..services.session_cache import CachedRead
+
+
+def _http_date(value: datetime) -> str:
+    # updated_at is stored as naive UTC
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+def conditional_response(request: Request, cached: CachedRead, cache_control: str) -> Response:
+    """
+    Serve a cached read, or 304 Not Modified when the client's copy is current
+
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+
+    Args:
+        request: Incoming request carrying the conditional headers
+        cached: Serialized body and validators
+        cache_control: Cache-Control policy for this endpoint
+
+    Returns:
+        200 JSON response with the cached body, or an empty 304
+    """
+    headers = {
+        "ETag": cached.etag,
+        "Last-Modified": _http_date(cached.last_modified),
+        "Cache-Control": cache_control
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, cached.etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, cached.last_modified)
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
@@ -0,0 +1,48 @@
+"""
+API endpoints for background AI jobs
+"""
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+from ..services.job_queue import job_queue, InvalidJobPayloadError, InvalidJobPriorityError, JobQueueFullError, UnknownJobKindError
+
+router = APIRouter()
+
+
+class JobSubmission(BaseModel):
+    """Request body for submitting a job"""
+    kind: str
+    payload: Dict = {}
+    session_id: Optional[str] = None
+    priority: Optional[int] = None
+
+
+@router.post("/")
+async def submit_job(submission: JobSubmission):
+    """Queue a transcription, soap, summary, compliance or finalize job"""
+    try:
+        job = await job_queue.submit(
+            submission.kind,
+            submission.payload,
+            session_id=submission.session_id,
+            priority=submission.priority
+        )
+    except (UnknownJobKindError, InvalidJobPriorityError, InvalidJobPayloadError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return job
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Get job status, progress and result"""
+    job = await job_queue.get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
@@ -2,121 +2,265 @@
 API endpoints for QR code generation and patient summary sharing
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-import qrcode
-import io
+from pydantic import BaseModel, Field
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import base64
-from typing import Optional
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
 
-from ..models.database import get_db, Session as SessionModel
+from ..core.config import settings
+from ..models.database import get_async_db, Session as SessionModel
+from ..services.session_cache import session_read_cache
+from ..services.qr_renderer import MEDIA_TYPES, qr_renderer
+from .conditional import conditional_response
 
 router = APIRouter()
 
 
+def patient_summary_url(session_id: str) -> str:
+    """QR code target: the frontend patient view"""
+    return f"http://localhost:3000/patient/{session_id}"
+
+
+class QRBatchRequest(BaseModel):
+    """Sessions to render: explicit IDs, or every session matching date/doctor"""
+    session_ids: Optional[List[str]] = None
+    clinic_date: Optional[date] = Field(None, alias="date")
+    doctor_name: Optional[str] = None
+    format: str = Field("png", pattern="^(png|svg)$")
+    output: str = Field("zip", pattern="^(zip|pdf)$")
+
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink that hands written ZIP bytes to a response generator"""
+    
+    def __init__(self):
+        self.chunks: List[bytes] = []
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _zip_chunks(files: List[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """Yield a ZIP archive file by file instead of building it in memory"""
+    sink = _ZipStream()
+    # Images are already compressed, so entries are stored as-is
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _handout_name(row, extension: str) -> str:
+    """Sortable, filesystem-safe file name for a session's QR code"""
+    parts = [
+        row.created_at.strftime("%Y%m%d-%H%M") if row.created_at else "undated",
+        row.doctor_name or "",
+        row.patient_name or "",
+        row.session_id[:8],
+    ]
+    slug = "_".join(re.sub(r"[^A-Za-z0-9]+", "-", part).strip("-") for part in parts if part)
+    return f"{slug}.{extension}"
+
+
 @router.post("/generate/{session_id}")
 async def generate_qr_code(
     session_id: str,
-    db: Session = Depends(get_db)
+    image_format: str = Query("png", alias="format", pattern="^(png|svg)$"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Generate QR code for patient summary access"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Create QR code URL (pointing to frontend patient view)
-    qr_url = f"http://localhost:3000/patient/{session_id}"
-    
-    # Generate QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    
-    # Create QR code image
-    img = qr.make_image(fill_color="black", back_color="white")
+    qr_url = patient_summary_url(session_id)
     
-    # Convert to base64 for easy transmission
-    img_buffer = io.BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
+    # Rendered in a worker process, or served from the QR cache
+    image = await qr_renderer.render(qr_url, image_format)
     
-    # Save QR code URL to database
-    session.qr_code_url = qr_url
-    db.commit()
+    # Save QR code URL to database (regenerating an existing code writes nothing)
+    if session.qr_code_url != qr_url:
+        session.qr_code_url = qr_url
+        await db.commit()
     
     # Return base64 encoded image
-    img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+    img_base64 = base64.b64encode(image).decode()
     
     return {
         "qr_code_url": qr_url,
-        "qr_code_image": f"data:image/png;base64,{img_base64}",
+        "qr_code_image": f"data:{MEDIA_TYPES[image_format]};base64,{img_base64}",
         "session_id": session_id
     }
 
 
+@router.post("/batch")
+async def generate_qr_batch(batch: QRBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Generate QR codes for many sessions at once (e.g. a clinic day's handouts)
+    
+    Sessions are loaded in one query, codes are rendered in parallel in the
+    QR worker pool, and every new ``qr_code_url`` is saved in one transaction.
+    The response is a ZIP of images plus ``manifest.csv``, or with
+    ``output=pdf`` a printable PDF with one captioned page per session.
+    """
+    if not batch.session_ids and not batch.clinic_date and not batch.doctor_name:
+        raise HTTPException(status_code=400, detail="Provide session_ids or a date/doctor_name filter")
+    if batch.output == "pdf" and batch.format != "png":
+        raise HTTPException(status_code=400, detail="PDF output is built from PNG codes")
+    
+    query = select(
+        SessionModel.id,
+        SessionModel.session_id,
+        SessionModel.doctor_name,
+        SessionModel.patient_name,
+        SessionModel.created_at,
+        SessionModel.qr_code_url
+    )
+    if batch.session_ids:
+        query = query.where(SessionModel.session_id.in_(batch.session_ids))
+    if batch.clinic_date:
+        day_start = datetime.combine(batch.clinic_date, datetime.min.time())
+        query = query.where(SessionModel.created_at >= day_start, SessionModel.created_at < day_start + timedelta(days=1))
+    if batch.doctor_name:
+        query = query.where(SessionModel.doctor_name == batch.doctor_name)
+    query = query.order_by(SessionModel.created_at, SessionModel.id).limit(settings.QR_BATCH_MAX_SESSIONS + 1)
+    
+    rows = (await db.execute(query)).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No matching sessions")
+    if len(rows) > settings.QR_BATCH_MAX_SESSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch matches more than {settings.QR_BATCH_MAX_SESSIONS} sessions; narrow the filter"
+        )
+    
+    urls = [patient_summary_url(row.session_id) for row in rows]
+    images = await asyncio.gather(*(qr_renderer.render(url, batch.format) for url in urls))
+    
+    # One transaction for every session that did not have its URL yet
+    changed = [(row, url) for row, url in zip(rows, urls) if row.qr_code_url != url]
+    if changed:
+        now = datetime.utcnow()
+        await db.execute(
+            update(SessionModel),
+            [{"id": row.id, "qr_code_url": url, "updated_at": now} for row, url in changed]
+        )
+        await db.commit()
+        # Bulk updates bypass the ORM flush that normally invalidates reads
+        session_read_cache.invalidate(row.session_id for row, _ in changed)
+    
+    if batch.output == "pdf":
+        captions = [
+            f"{row.patient_name} - {row.doctor_name} - {row.created_at:%Y-%m-%d}" if row.created_at
+            else f"{row.patient_name} - {row.doctor_name}"
+            for row in rows
+        ]
+        pdf = await qr_renderer.render_pdf(list(zip(images, captions)))
+        return Response(
+            content=pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": "attachment; filename=qr_codes.pdf"}
+        )
+    
+    files = []
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["file", "session_id", "patient_name", "doctor_name", "created_at", "qr_code_url"])
+    for row, url, image in zip(rows, urls, images):
+        name = _handout_name(row, batch.format)
+        files.append((name, image))
+        writer.writerow([name, row.session_id, row.patient_name, row.doctor_name, row.created_at, url])
+    files.append(("manifest.csv", manifest.getvalue().encode()))
+    
+    missing = set(batch.session_ids or []) - {row.session_id for row in rows}
+    return StreamingResponse(
+        _zip_chunks(files),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=qr_codes.zip",
+            "X-QR-Count": str(len(rows)),
+            "X-Missing-Sessions": str(len(missing))
+        }
+    )
+
+
 @router.get("/image/{session_id}")
 async def get_qr_code_image(
     session_id: str,
-    db: Session = Depends(get_db)
+    image_format: str = Query("png", alias="format", pattern="^(png|svg)$"),
+    box_size: int = Query(10, ge=1, le=40),
+    border: int = Query(4, ge=0, le=10),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get QR code image as PNG"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    """Get QR code image as PNG or SVG"""
+    row = (await db.execute(
+        select(SessionModel.id, SessionModel.qr_code_url).where(SessionModel.session_id == session_id)
+    )).first()
     
-    if not session:
+    if not row:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    if not session.qr_code_url:
+    if not row.qr_code_url:
         raise HTTPException(status_code=404, detail="QR code not generated yet")
     
-    # Generate QR code image
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(session.qr_code_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Return as PNG image
-    img_buffer = io.BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
+    # Cached bytes are returned as-is
+    image = await qr_renderer.render(row.qr_code_url, image_format, box_size, border)
     
-    return StreamingResponse(
-        io.BytesIO(img_buffer.getvalue()),
-        media_type="image/png",
-        headers={"Content-Disposition": f"inline; filename=qr_code_{session_id}.png"}
+    return Response(
+        content=image,
+        media_type=MEDIA_TYPES[image_format],
+        headers={
+            "Content-Disposition": f"inline; filename=qr_code_{session_id}.{image_format}",
+            "Cache-Control": "private, max-age=3600"
+        }
     )
 
 
 @router.get("/summary/{session_id}")
 async def get_patient_summary_by_qr(
     session_id: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get patient summary via QR code access (public endpoint)"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    """Get patient summary via QR code access (public endpoint, supports conditional GET)"""
+    async def load():
+        session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
     
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
     
-    if not session.patient_summary:
-        raise HTTPException(status_code=404, detail="Patient summary not available")
+        if not session.patient_summary:
+            raise HTTPException(status_code=404, detail="Patient summary not available")
     
-    return {
-        "patient_name": session.patient_name,
-        "doctor_name": session.doctor_name,
-        "summary": session.patient_summary,
-        "created_at": session.created_at,
-        "session_id": session_id
-    }
+        payload = {
+            "patient_name": session.patient_name,
+            "doctor_name": session.doctor_name,
+            "summary": session.patient_summary,
+            "created_at": session.created_at,
+            "session_id": session_id
+        }
+        return payload, session.updated_at or session.created_at
+
+    cached = await session_read_cache.get_or_load("patient_summary", session_id, load)
+    return conditional_response(request, cached, settings.PATIENT_SUMMARY_CACHE_CONTROL)
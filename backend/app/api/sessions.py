@@ -2,24 +2,55 @@
 API endpoints for managing medical sessions
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Form
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Form, Query, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import String, and_, cast, delete, func, select, tuple_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from datetime import datetime
+import base64
+import json
 import uuid
 
-from ..models.database import get_db, Session as SessionModel
+from ..core.config import settings
+from ..models.database import get_async_db, Session as SessionModel, TranscriptChunk
 from ..services.ai_service import AIService
+from ..services.container import get_ai_service
+from ..services.encounter_pipeline import finalize_encounter, regenerate_soap_note
+from ..services.write_coalescer import write_coalescer
+from ..services.transcript_writer import join_chunks, load_chunks, transcript_writer
+from ..services.session_search import search_sessions
+from ..services.session_cache import session_read_cache
+from .conditional import conditional_response
 
 router = APIRouter()
-ai_service = AIService()
+
+
+def _encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class TranscriptChunkIn(BaseModel):
+    """Request body for appending a transcript chunk"""
+    text: str
+    confidence: Optional[str] = None
 
 
 @router.post("/")
 async def create_session(
     doctor_name: str = Form(...),
     patient_name: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new medical session"""
     session_id = str(uuid.uuid4())
@@ -33,8 +64,8 @@ async def create_session(
     )
     
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     
     return {
         "session_id": session_id,
@@ -44,56 +75,139 @@ async def create_session(
     }
 
 
-@router.get("/{session_id}")
-async def get_session(session_id: str, db: Session = Depends(get_db)):
-    """Get session details"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    doctor_name: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search transcripts, SOAP notes and summaries, best match first"""
+    try:
+        results = await search_sessions(db, q, doctor_name=doctor_name, limit=limit + 1, offset=offset)
+    except OperationalError as e:
+        print(f"Search failed: {e}")
+        raise HTTPException(status_code=503, detail="Search index not available")
     
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+    has_more = len(results) > limit
+    results = results[:limit]
     
     return {
-        "session_id": session.session_id,
-        "doctor_name": session.doctor_name,
-        "patient_name": session.patient_name,
-        "transcript": session.transcript,
-        "soap_note": session.soap_note,
-        "patient_summary": session.patient_summary,
-        "compliance_report": session.compliance_report,
-        "qr_code_url": session.qr_code_url,
-        "created_at": session.created_at,
-        "updated_at": session.updated_at
+        "query": q,
+        "results": results,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None
     }
 
 
+@router.get("/{session_id}")
+async def get_session(session_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get session details (supports If-None-Match / If-Modified-Since)"""
+    async def load():
+        session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
+    
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+    
+        payload = {
+            "session_id": session.session_id,
+            "doctor_name": session.doctor_name,
+            "patient_name": session.patient_name,
+            "transcript": session.transcript,
+            "soap_note": session.soap_note,
+            "patient_summary": session.patient_summary,
+            "compliance_report": session.compliance_report,
+            "qr_code_url": session.qr_code_url,
+            "created_at": session.created_at,
+            "updated_at": session.updated_at
+        }
+        return payload, session.updated_at or session.created_at
+    
+    cached = await session_read_cache.get_or_load("session", session_id, load)
+    return conditional_response(request, cached, settings.SESSION_CACHE_CONTROL)
+
+
 @router.put("/{session_id}/transcript")
 async def update_transcript(
     session_id: str,
-    transcript: str = Form(...),
-    db: Session = Depends(get_db)
+    transcript: str = Form(...)
 ):
     """Update session transcript"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    # Frequent autosaves from many rooms are batched into shared commits
+    updated = await write_coalescer.update(session_id, transcript=transcript)
+    
+    if not updated:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return {"message": "Transcript updated successfully"}
+
+
+@router.post("/{session_id}/transcript/chunks")
+async def append_transcript_chunk(
+    session_id: str,
+    chunk: TranscriptChunkIn,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Append a chunk to the session transcript (append-only)"""
+    session = await db.scalar(select(SessionModel.id).where(SessionModel.session_id == session_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session.transcript = transcript
-    session.updated_at = datetime.utcnow()
+    # Return the pooled connection before waiting on the writer's own transaction
+    await db.close()
+    seq = await transcript_writer.append(session_id, chunk.text, chunk.confidence, wait=True)
     
-    db.commit()
+    return {
+        "session_id": session_id,
+        "seq": seq,
+        "next_offset": seq + 1
+    }
     
-    return {"message": "Transcript updated successfully"}
+
+@router.get("/{session_id}/transcript/chunks")
+async def get_transcript_chunks(
+    session_id: str,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get transcript chunks from an offset, e.g. to resume after reconnecting"""
+    session = await db.scalar(select(SessionModel.id).where(SessionModel.session_id == session_id))
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Include chunks still waiting in the write buffer
+    await transcript_writer.flush()
+    chunks = await load_chunks(session_id, offset)
+    
+    return {
+        "session_id": session_id,
+        "offset": offset,
+        "next_offset": chunks[-1].seq + 1 if chunks else offset,
+        "text": join_chunks([chunk.chunk_text for chunk in chunks]),
+        "chunks": [
+            {
+                "seq": chunk.seq,
+                "text": chunk.chunk_text,
+                "confidence": chunk.confidence,
+                "timestamp": chunk.timestamp
+            }
+            for chunk in chunks
+        ]
+    }
 
 
 @router.put("/{session_id}/soap")
 async def update_soap_note(
     session_id: str,
     soap_note: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update session SOAP note"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -101,19 +215,46 @@ async def update_soap_note(
     session.soap_note = soap_note
     session.updated_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     return {"message": "SOAP note updated successfully"}
 
 
+@router.post("/{session_id}/soap/regenerate")
+async def regenerate_soap(
+    session_id: str,
+    incremental: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """Regenerate the SOAP note from the stored transcript, merging only new text when possible"""
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if not session.transcript:
+        raise HTTPException(status_code=400, detail="No transcript to generate a SOAP note from")
+    
+    soap_note, mode = await regenerate_soap_note(
+        ai_service, session_id, session.transcript, incremental=incremental
+    )
+    
+    return {
+        "session_id": session_id,
+        "soap_note": soap_note,
+        "mode": mode
+    }
+
+
 @router.put("/{session_id}/summary")
 async def update_patient_summary(
     session_id: str,
     summary: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update patient summary"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -121,7 +262,7 @@ async def update_patient_summary(
     session.patient_summary = summary
     session.updated_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Patient summary updated successfully"}
 
@@ -130,10 +271,11 @@ async def update_patient_summary(
 async def edit_summary_with_prompt(
     session_id: str,
     edit_prompt: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """Edit patient summary using AI with doctor's prompt"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -151,7 +293,7 @@ async def edit_summary_with_prompt(
     session.patient_summary = edited_summary
     session.updated_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Summary edited successfully",
@@ -159,38 +301,123 @@ async def edit_summary_with_prompt(
     }
 
 
+@router.post("/{session_id}/finalize")
+async def finalize_session(
+    session_id: str,
+    transcript: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """Generate SOAP note, patient summary and compliance report in one request"""
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    transcript = transcript or session.transcript
+    if not transcript:
+        raise HTTPException(status_code=400, detail="No transcript to finalize")
+    
+    results = await finalize_encounter(ai_service, transcript, session_id=session_id)
+    
+    return {
+        "session_id": session_id,
+        **results
+    }
+
+
 @router.get("/")
 async def list_sessions(
-    limit: int = 50,
-    offset: int = 0,
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    offset: int = Query(0, ge=0, deprecated=True),
+    doctor_name: Optional[str] = None,
+    patient_name: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all sessions"""
-    sessions = db.query(SessionModel).offset(offset).limit(limit).all()
+    """
+    List sessions, newest first
+    
+    Pages are keyed on (created_at, id): pass the X-Next-Cursor header of one
+    page as ``cursor`` to get the next. With ``include_total`` the number of
+    matching sessions is returned in X-Total-Count. ``offset`` is still
+    accepted for older clients (without ``cursor``) but scans every skipped row.
+    """
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    
+    filters = []
+    if doctor_name:
+        filters.append(SessionModel.doctor_name == doctor_name)
+    if patient_name:
+        filters.append(SessionModel.patient_name == patient_name)
+    if created_from:
+        filters.append(SessionModel.created_at >= created_from)
+    if created_to:
+        filters.append(SessionModel.created_at <= created_to)
+    
+    # Only the list columns are read; the flags are computed in SQL so large
+    # transcript/SOAP/summary values never leave the database
+    query = select(
+        SessionModel.id,
+        SessionModel.session_id,
+        SessionModel.doctor_name,
+        SessionModel.patient_name,
+        SessionModel.created_at,
+        (func.coalesce(SessionModel.transcript, "") != "").label("has_transcript"),
+        and_(
+            SessionModel.soap_note.isnot(None),
+            cast(SessionModel.soap_note, String).notin_(["null", "{}"])
+        ).label("has_soap_note"),
+        (func.coalesce(SessionModel.patient_summary, "") != "").label("has_summary")
+    ).where(*filters)
+    
+    if cursor:
+        created_at, row_id = _decode_cursor(cursor)
+        query = query.where(tuple_(SessionModel.created_at, SessionModel.id) < (created_at, row_id))
+    elif offset:
+        query = query.offset(offset)
+        response.headers["Deprecation"] = "true"
+    
+    query = query.order_by(SessionModel.created_at.desc(), SessionModel.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1][4], rows[-1][0])
+    
+    if include_total:
+        total = await db.scalar(select(func.count()).select_from(SessionModel).where(*filters))
+        response.headers["X-Total-Count"] = str(total)
     
     return [
         {
-            "session_id": session.session_id,
-            "doctor_name": session.doctor_name,
-            "patient_name": session.patient_name,
-            "created_at": session.created_at,
-            "has_transcript": bool(session.transcript),
-            "has_soap_note": bool(session.soap_note),
-            "has_summary": bool(session.patient_summary)
+            "session_id": session_id,
+            "doctor_name": doctor,
+            "patient_name": patient,
+            "created_at": created_at,
+            "has_transcript": bool(has_transcript),
+            "has_soap_note": bool(has_soap_note),
+            "has_summary": bool(has_summary)
         }
-        for session in sessions
+        for _, session_id, doctor, patient, created_at, has_transcript, has_soap_note, has_summary in rows
     ]
 
 
 @router.delete("/{session_id}")
-async def delete_session(session_id: str, db: Session = Depends(get_db)):
+async def delete_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a session"""
-    session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    db.delete(session)
-    db.commit()
+    await db.delete(session)
+    await db.execute(delete(TranscriptChunk).where(TranscriptChunk.session_id == session_id))
+    await db.commit()
     
     return {"message": "Session deleted successfully"}
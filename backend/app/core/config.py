@@ -3,7 +3,7 @@ Configuration settings for Skribe backend
 """
 
 import os
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 
@@ -13,6 +13,31 @@ class Settings(BaseSettings):
     
     # Database Configuration
     DATABASE_URL: str = "sqlite:///./skribe.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a pooled connection
+    
+    # SQLite Storage Profile (applied to every new connection)
+    SQLITE_JOURNAL_MODE: str = "WAL"  # readers do not block the writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # safe with WAL; FULL fsyncs every commit
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # page cache per connection
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    
+    # Live Transcript Chunks (batched inserts into transcript_chunks)
+    TRANSCRIPT_CHUNK_FLUSH_SIZE: int = 50  # flush once this many chunks are buffered
+    TRANSCRIPT_CHUNK_FLUSH_INTERVAL: float = 0.5  # seconds a chunk may wait before flushing
+    
+    # Write Coalescer (batches frequent transcript/updated_at writes into one commit)
+    WRITE_COALESCE_INTERVAL: float = 0.005  # seconds to linger collecting a batch
+    WRITE_COALESCE_MAX_BATCH: int = 200
+    
+    # Session Read Cache (serialized GET responses, invalidated on writes)
+    SESSION_READ_CACHE_ENTRIES: int = 1024
+    SESSION_READ_CACHE_TTL: float = 30.0  # seconds; bounds staleness from writes not announced over pub/sub
+    SESSION_CACHE_CONTROL: str = "private, no-cache"  # clinician view: always revalidate
+    PATIENT_SUMMARY_CACHE_CONTROL: str = "private, max-age=60"  # patient page opened from phones
     
     # Security
     SECRET_KEY: str = "your-secret-key-here"
@@ -26,10 +51,83 @@ class Settings(BaseSettings):
     WHISPER_MODEL: str = "whisper-1"
     GPT_MODEL: str = "gpt-4"
     
+    # Long Transcript Map-Reduce (token estimates, ~4 characters per token)
+    LONG_TRANSCRIPT_TOKEN_THRESHOLD: int = 6000  # transcripts above this are condensed before prompting
+    MAP_WINDOW_TOKENS: int = 3000
+    MAP_WINDOW_OVERLAP_TURNS: int = 2
+    MAP_REDUCE_MAX_CONCURRENCY: int = 4
+    
+    # Compliance checking: "rules" (local only), "hybrid" (rules + LLM narrative review) or "llm"
+    COMPLIANCE_MODE: str = "rules"
+    
+    # OpenAI Client Settings
+    OPENAI_TIMEOUT: float = 120.0  # seconds, per request
+    OPENAI_CONNECT_TIMEOUT: float = 10.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_MAX_CONCURRENT_REQUESTS: int = 16
+    
+    # OpenAI Rate Governor (per-model quotas; 0 means unlimited)
+    OPENAI_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+        "gpt-4": {"rpm": 500, "tpm": 10000},
+        "whisper-1": {"rpm": 50, "tpm": 0},
+    }
+    OPENAI_DEFAULT_RPM: int = 500
+    OPENAI_DEFAULT_TPM: int = 0
+    OPENAI_COMPLETION_TOKEN_RESERVE: int = 1000  # completion tokens budgeted per chat request
+    OPENAI_BACKOFF_BASE: float = 1.0  # seconds, doubled on each retry
+    OPENAI_BACKOFF_MAX: float = 60.0
+    
+    # WebSocket Connections
+    WS_SEND_QUEUE_SIZE: int = 256  # outbound messages buffered per connection
+    WS_SLOW_CONSUMER_POLICY: str = "coalesce"  # "drop", "coalesce" or "disconnect" when the queue is full
+    WS_SEND_TIMEOUT: float = 10.0  # seconds a single send may take before the client is dropped
+    WS_HEARTBEAT_INTERVAL: float = 20.0  # seconds between server pings (0 disables heartbeats and idle reaping)
+    WS_IDLE_TIMEOUT: float = 60.0  # seconds without a client message (pongs included) before the socket is closed
+    WS_MAX_CONNECTIONS: int = 1000  # per worker process
+    WS_MAX_CONNECTIONS_PER_SESSION: int = 10
+    WS_MAX_INFLIGHT_PER_CONNECTION: int = 8  # unfinished jobs plus streaming chunks being transcribed
+    
+    # WebSocket Fan-out: "memory" (single process) or "redis" (any Redis-protocol server, for multiple workers/hosts)
+    PUBSUB_BACKEND: str = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    PUBSUB_CHANNEL_PREFIX: str = "skribe:ws:"
+    
+    # Background Job Queue
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_MAX_DEPTH: int = 1000
+    JOB_DEFAULT_PRIORITY: int = 5  # 0-9, lower runs first
+    JOB_LEASE_SECONDS: float = 30.0  # running jobs not renewed within this are re-queued
+    JOB_RETRY_DELAY: float = 1.0  # seconds before retrying a job that could not be started (doubles, up to the lease)
+    JOB_AUDIO_DIR: str = "./job_audio"  # audio of transcription jobs, kept out of the jobs table until the job finishes
+    
+    # Result Cache Settings
+    CACHE_DB_PATH: str = "./cache/skribe_cache.db"
+    TRANSCRIPTION_CACHE_ENABLED: bool = True
+    TRANSCRIPTION_CACHE_MEMORY_ENTRIES: int = 256
+    TRANSCRIPTION_CACHE_MAX_DISK_BYTES: int = 50 * 1024 * 1024  # 50MB
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MEMORY_ENTRIES: int = 512
+    AI_CACHE_MAX_DISK_BYTES: int = 100 * 1024 * 1024  # 100MB
+    QR_CACHE_MEMORY_ENTRIES: int = 512
+    QR_CACHE_MAX_DISK_BYTES: int = 20 * 1024 * 1024  # 20MB
+    QR_RENDER_WORKERS: int = 2  # processes encoding QR images off the event loop
+    QR_BATCH_MAX_SESSIONS: int = 500
+    
     # File Upload Settings
     MAX_AUDIO_FILE_SIZE: int = 25 * 1024 * 1024  # 25MB
     ALLOWED_AUDIO_EXTENSIONS: List[str] = [".mp3", ".wav", ".m4a", ".webm"]
     
+    # Long Recording Settings (split at silence and transcribed in parallel)
+    MAX_LONG_AUDIO_FILE_SIZE: int = 200 * 1024 * 1024  # 200MB
+    LONG_AUDIO_THRESHOLD_BYTES: int = 10 * 1024 * 1024  # complete uploads above this are segmented
+    LONG_AUDIO_SEGMENT_SECONDS: float = 300.0
+    LONG_AUDIO_OVERLAP_SECONDS: float = 2.0
+    LONG_AUDIO_SILENCE_SEARCH_SECONDS: float = 20.0
+    LONG_AUDIO_MAX_SEGMENT_BYTES: int = 24 * 1000 * 1000  # per segment WAV file, under Whisper's 25MB request limit
+    LONG_AUDIO_MAX_CONCURRENCY: int = 4
+    
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -2,23 +2,85 @@
 Database models and setup for Skribe
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Boolean
+from sqlalchemy import create_engine, event, inspect, select, text, Column, Index, Integer, String, Text, DateTime, JSON, Boolean
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
 import os
 
 from ..core.config import settings
 
-# Database setup
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver (sqlite -> aiosqlite)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _pool_options(url: str, pool_class) -> Dict:
+    """Connection pool sizing; in-memory SQLite keeps the driver default"""
+    if _is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith(":")):
+        return {}
+    return {
+        "poolclass": pool_class,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": not _is_sqlite(url)
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the SQLite storage profile to a new connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA temp_store={settings.SQLITE_TEMP_STORE}")
+    cursor.close()
+
+
+# Database setup (sync engine for scripts such as seed_demo_data.py)
+engine = create_engine(
+    settings.DATABASE_URL,
+    connect_args={"check_same_thread": False} if _is_sqlite(settings.DATABASE_URL) else {},
+    **_pool_options(settings.DATABASE_URL, QueuePool)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine used by the API, WebSocket handler and background workers.
+# Objects stay loaded after commit so handlers can read them without lazy IO.
+async_engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    **_pool_options(settings.DATABASE_URL, AsyncAdaptedQueuePool)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+if _is_sqlite(settings.DATABASE_URL):
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
 
 class Session(Base):
     """Database model for medical sessions"""
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Keyset pagination of the dashboard list, newest first, optionally filtered
+        Index("ix_sessions_created_at_id", "created_at", "id"),
+        Index("ix_sessions_doctor_created_at_id", "doctor_name", "created_at", "id"),
+        Index("ix_sessions_patient_created_at_id", "patient_name", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, unique=True, index=True)
@@ -28,6 +90,9 @@ class Session(Base):
     soap_note = Column(JSON)
     patient_summary = Column(Text)
     compliance_report = Column(JSON)
+    # Prefix of the transcript the stored SOAP note was generated from (for incremental updates)
+    soap_transcript_length = Column(Integer)
+    soap_transcript_hash = Column(String)
     qr_code_url = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -37,17 +102,121 @@ class Session(Base):
 class TranscriptChunk(Base):
     """Database model for transcript chunks (real-time updates)"""
     __tablename__ = "transcript_chunks"
+    __table_args__ = (
+        Index("ix_transcript_chunks_session_seq", "session_id", "seq", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, index=True)
+    seq = Column(Integer)  # position of the chunk within its session's transcript
     chunk_text = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
     confidence = Column(String)  # Whisper confidence score
 
 
+class Job(Base):
+    """Database model for background AI jobs"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True)
+    kind = Column(String, index=True)  # transcription, soap, summary, compliance, finalize
+    status = Column(String, index=True)  # queued, running, completed, failed
+    priority = Column(Integer, default=5)
+    session_id = Column(String, index=True)
+    payload = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    progress = Column(JSON)
+    owner = Column(String)  # worker process running the job
+    heartbeat_at = Column(DateTime)  # last lease renewal by the owner
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
 async def create_tables():
     """Create database tables"""
-    Base.metadata.create_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(add_missing_indexes)
+        if _is_sqlite(settings.DATABASE_URL):
+            await conn.run_sync(create_search_index)
+
+
+def add_missing_columns(conn):
+    """
+    Add columns introduced after a table was first created
+    
+    create_all() only creates missing tables, so existing databases are
+    brought up to date with ALTER TABLE ... ADD COLUMN for new nullable columns.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def add_missing_indexes(conn):
+    """Create indexes added to models after their table was first created"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# Text indexed for a session's SOAP note: every string value in the JSON, not its keys
+_SOAP_TEXT = "(SELECT group_concat(value, ' ') FROM json_tree({row}.soap_note) WHERE type = 'text')"
+
+_SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE sessions_fts USING fts5(
+        transcript, soap_note, patient_summary,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER sessions_fts_insert AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_fts(rowid, transcript, soap_note, patient_summary)
+        VALUES (new.id, new.transcript, {_SOAP_TEXT.format(row="new")}, new.patient_summary);
+    END
+    """,
+    f"""
+    CREATE TRIGGER sessions_fts_update AFTER UPDATE OF transcript, soap_note, patient_summary ON sessions BEGIN
+        DELETE FROM sessions_fts WHERE rowid = old.id;
+        INSERT INTO sessions_fts(rowid, transcript, soap_note, patient_summary)
+        VALUES (new.id, new.transcript, {_SOAP_TEXT.format(row="new")}, new.patient_summary);
+    END
+    """,
+    """
+    CREATE TRIGGER sessions_fts_delete AFTER DELETE ON sessions BEGIN
+        DELETE FROM sessions_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    INSERT INTO sessions_fts(rowid, transcript, soap_note, patient_summary)
+    SELECT id, transcript, {_SOAP_TEXT.format(row="sessions")}, patient_summary FROM sessions
+    """,
+]
+
+
+def create_search_index(conn):
+    """
+    Create the FTS5 index over transcripts, SOAP notes and summaries
+    
+    The index is kept in sync by triggers, so every write path (ORM updates,
+    coalesced writes, transcript chunk appends) is covered. Existing sessions
+    are indexed when the table is first created.
+    """
+    if inspect(conn).has_table("sessions_fts"):
+        return
+    for statement in _SEARCH_INDEX_DDL:
+        conn.execute(text(statement))
 
 
 def get_db():
@@ -57,3 +226,38 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def load_session_async(session_id: str) -> Optional[Session]:
+    """Load a session by its public ID without blocking the event loop"""
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Session).where(Session.session_id == session_id))
+
+
+async def update_session_fields_async(session_id: str, **fields) -> bool:
+    """
+    Persist fields on a session and stamp updated_at without blocking the event loop
+    
+    Returns:
+        True if the session exists and was updated
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            session = await db.scalar(select(Session).where(Session.session_id == session_id))
+            if not session:
+                return False
+            for name, value in fields.items():
+                setattr(session, name, value)
+            session.updated_at = datetime.utcnow()
+            await db.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving session {session_id}: {e}")
+            await db.rollback()
+            return False
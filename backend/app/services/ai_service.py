@@ -2,17 +2,121 @@
 AI service for SOAP note generation, patient summaries, and compliance checking
 """
 
-import openai
+import asyncio
+import copy
 import json
-from typing import Dict, List, Optional
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 from ..core.config import settings
+from openai import AsyncOpenAI
+from .openai_client import create_chat_completion
+from .cache import TieredCache, make_key
+from .incremental_json import IncrementalObjectParser
+from .compliance_rules import build_report, evaluate_soap_note
+from .transcript_chunker import chunk_transcript, estimate_tokens
+
+
+# Sampling temperature per operation (part of the result cache key)
+SOAP_TEMPERATURE = 0.1
+SUMMARY_TEMPERATURE = 0.3
+FINDINGS_TEMPERATURE = 0.0
+COMPLIANCE_TEMPERATURE = 0.1
+EDIT_TEMPERATURE = 0.2
+
+# Bump an operation's version whenever its prompt changes so stale cached results are not served
+PROMPT_VERSIONS = {
+    "soap": 1,
+    "soap_merge": 1,
+    "findings": 1,
+    "summary": 1,
+    "compliance": 1,
+    "compliance_narrative": 1,
+    "edit_summary": 1,
+}
+
+# Result caches are shared by every AIService instance in the process
+_result_caches: Dict[str, TieredCache] = {}
+
+
+def _get_result_cache(operation: str) -> TieredCache:
+    if operation not in _result_caches:
+        _result_caches[operation] = TieredCache(
+            f"ai:{operation}",
+            memory_entries=settings.AI_CACHE_MEMORY_ENTRIES,
+            max_disk_bytes=settings.AI_CACHE_MAX_DISK_BYTES
+        )
+    return _result_caches[operation]
+
+
+def close_result_caches():
+    """Close the disk tier of every AI result cache"""
+    for cache in _result_caches.values():
+        cache.close()
+    _result_caches.clear()
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def normalize_json(data: Any) -> str:
+    """Canonical JSON encoding used when hashing structured inputs"""
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
 
 
 class AIService:
     """Service for AI-powered medical documentation processing"""
     
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+    
+    async def _cached(
+        self,
+        operation: str,
+        normalized_input: str,
+        temperature: float,
+        compute: Callable[[], Awaitable[Any]],
+        should_cache: Callable[[Any], bool]
+    ) -> Any:
+        """
+        Serve an AI result from the cache when the same request was answered before
+        
+        The key covers the operation, a hash of the normalized input, the model,
+        the prompt version and the temperature. Error results are never cached.
+        """
+        if not settings.AI_CACHE_ENABLED:
+            return await compute()
+        key = self._cache_key(operation, normalized_input, temperature)
+        result = await _get_result_cache(operation).get_or_compute(key, compute, should_cache)
+        # Callers may mutate returned notes; never hand out the cached object itself
+        return copy.deepcopy(result)
+    
+    @staticmethod
+    def _cache_key(operation: str, normalized_input: str, temperature: float) -> str:
+        return make_key(
+            operation,
+            make_key(normalized_input),
+            settings.GPT_MODEL,
+            PROMPT_VERSIONS[operation],
+            temperature
+        )
+    
+    async def invalidate_cache(self, operation: Optional[str] = None):
+        """
+        Explicitly drop cached AI results
+        
+        Args:
+            operation: One of the PROMPT_VERSIONS keys; clears every
+                operation when omitted
+        """
+        operations = [operation] if operation else list(PROMPT_VERSIONS)
+        for name in operations:
+            await _get_result_cache(name).invalidate()
+    
+    def cache_stats(self) -> List[Dict]:
+        """Hit/miss counters for each AI result cache"""
+        return [_get_result_cache(name).stats() for name in PROMPT_VERSIONS]
     
     async def generate_soap_note(self, transcript: str) -> Dict:
         """
@@ -24,86 +128,308 @@ class AIService:
         Returns:
             Structured SOAP note dictionary
         """
+        return await self._cached(
+            "soap",
+            normalize_text(transcript),
+            SOAP_TEMPERATURE,
+            lambda: self._generate_soap_note(transcript),
+            should_cache=lambda note: "error" not in note and "parsing_error" not in note
+        )
+    
+    async def _condense_transcript(self, transcript: str) -> str:
+        """
+        Return text that fits in one prompt and stands in for the transcript
+        
+        Transcripts under LONG_TRANSCRIPT_TOKEN_THRESHOLD are returned unchanged.
+        Longer ones are split into speaker-turn-aligned windows, clinical
+        findings are extracted from each window concurrently (map), and the
+        ordered findings are returned for the SOAP/summary prompt to reduce.
+        """
+        if estimate_tokens(transcript) <= settings.LONG_TRANSCRIPT_TOKEN_THRESHOLD:
+            return transcript
+        
+        windows = chunk_transcript(
+            transcript,
+            max_tokens=settings.MAP_WINDOW_TOKENS,
+            overlap_turns=settings.MAP_WINDOW_OVERLAP_TURNS
+        )
+        semaphore = asyncio.Semaphore(settings.MAP_REDUCE_MAX_CONCURRENCY)
+        
+        async def extract(window: str) -> Dict:
+            async with semaphore:
+                return await self._cached(
+                    "findings",
+                    normalize_text(window),
+                    FINDINGS_TEMPERATURE,
+                    lambda: self._extract_findings(window),
+                    should_cache=lambda findings: "error" not in findings and "parsing_error" not in findings
+                )
+        
+        findings = await asyncio.gather(*(extract(window) for window in windows))
+        
+        parts = []
+        for index, (window, window_findings) in enumerate(zip(windows, findings), start=1):
+            if "error" in window_findings or "parsing_error" in window_findings:
+                # Extraction failed; keep the raw text rather than lose that part of the visit
+                parts.append({"part": index, "transcript": window})
+            else:
+                parts.append({"part": index, "findings": window_findings})
+        
+        return (
+            f"This visit was too long to include verbatim. Below are the clinical findings extracted from "
+            f"{len(windows)} consecutive parts of the conversation, in order. Later parts may update or "
+            f"correct earlier ones.\n" + json.dumps(parts, indent=1)
+        )
+    
+    async def _extract_findings(self, window: str) -> Dict:
+        """Extract structured clinical findings from one transcript window"""
         try:
             prompt = f"""
-            You are a medical AI assistant. Convert the following doctor-patient conversation transcript into a structured SOAP note format.
-
-            Transcript:
-            {transcript}
-
-            Generate a SOAP note with the following structure:
+            You are a medical AI assistant. Extract the clinical findings from this part of a longer doctor-patient conversation.
+            
+            Transcript Part:
+            {window}
+            
+            Return a JSON object with these keys, each a list of short factual statements (empty list if nothing was said):
             {{
-                "subjective": {{
-                    "chief_complaint": "Patient's main concern",
-                    "history_present_illness": "Detailed description of current symptoms",
-                    "review_of_systems": "Relevant systems review",
-                    "past_medical_history": "Relevant past medical history",
-                    "medications": ["Current medications"],
-                    "allergies": ["Known allergies"],
-                    "social_history": "Relevant social history"
-                }},
-                "objective": {{
-                    "vital_signs": {{
-                        "blood_pressure": "BP if mentioned",
-                        "heart_rate": "HR if mentioned",
-                        "temperature": "Temp if mentioned",
-                        "respiratory_rate": "RR if mentioned",
-                        "oxygen_saturation": "O2 sat if mentioned"
-                    }},
-                    "physical_exam": "Physical examination findings",
-                    "diagnostic_tests": "Lab results, imaging, etc."
-                }},
-                "assessment": {{
-                    "primary_diagnosis": "Most likely diagnosis",
-                    "differential_diagnoses": ["Alternative diagnoses"],
-                    "clinical_impression": "Overall clinical assessment"
-                }},
-                "plan": {{
-                    "treatment": "Treatment plan",
-                    "medications": ["Prescribed medications with dosage"],
-                    "follow_up": "Follow-up instructions",
-                    "patient_education": "Education provided to patient",
-                    "additional_testing": "Any additional tests ordered"
-                }}
+                "symptoms": [],
+                "history": [],
+                "medications": [],
+                "allergies": [],
+                "vital_signs": [],
+                "exam_findings": [],
+                "test_results": [],
+                "assessments": [],
+                "plan": [],
+                "patient_education": [],
+                "follow_up": []
             }}
-
-            Only include information that was actually discussed in the conversation. Use "Not discussed" for missing information.
+            
+            Only include information actually stated in this part of the conversation.
             """
             
-            response = self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=settings.GPT_MODEL,
                 messages=[
-                    {"role": "system", "content": "You are a medical AI assistant specialized in creating SOAP notes. You must respond with ONLY valid JSON, no additional text or formatting."},
-                    {"role": "user", "content": prompt + "\n\nIMPORTANT: Return ONLY the JSON object, no markdown formatting or additional text."}
+                    {"role": "system", "content": "You are a medical AI assistant that extracts clinical findings. You must respond with ONLY valid JSON, no additional text or formatting."},
+                    {"role": "user", "content": prompt}
                 ],
-                temperature=0.1
+                temperature=FINDINGS_TEMPERATURE
             )
             
-            soap_text = response.choices[0].message.content
+            return self._parse_json_response(response.choices[0].message.content)
+        
+        except Exception as e:
+            print(f"Error extracting findings: {e}")
+            return {"error": str(e)}
+    
+    @staticmethod
+    def _soap_messages(transcript: str) -> List[Dict]:
+        """Build the chat messages for SOAP note generation (transcript may be condensed findings)"""
+        prompt = f"""
+        You are a medical AI assistant. Convert the following doctor-patient conversation transcript into a structured SOAP note format.
+
+        Transcript:
+        {transcript}
+
+        Generate a SOAP note with the following structure:
+        {{
+            "subjective": {{
+                "chief_complaint": "Patient's main concern",
+                "history_present_illness": "Detailed description of current symptoms",
+                "review_of_systems": "Relevant systems review",
+                "past_medical_history": "Relevant past medical history",
+                "medications": ["Current medications"],
+                "allergies": ["Known allergies"],
+                "social_history": "Relevant social history"
+            }},
+            "objective": {{
+                "vital_signs": {{
+                    "blood_pressure": "BP if mentioned",
+                    "heart_rate": "HR if mentioned",
+                    "temperature": "Temp if mentioned",
+                    "respiratory_rate": "RR if mentioned",
+                    "oxygen_saturation": "O2 sat if mentioned"
+                }},
+                "physical_exam": "Physical examination findings",
+                "diagnostic_tests": "Lab results, imaging, etc."
+            }},
+            "assessment": {{
+                "primary_diagnosis": "Most likely diagnosis",
+                "differential_diagnoses": ["Alternative diagnoses"],
+                "clinical_impression": "Overall clinical assessment"
+            }},
+            "plan": {{
+                "treatment": "Treatment plan",
+                "medications": ["Prescribed medications with dosage"],
+                "follow_up": "Follow-up instructions",
+                "patient_education": "Education provided to patient",
+                "additional_testing": "Any additional tests ordered"
+            }}
+        }}
+
+        Only include information that was actually discussed in the conversation. Use "Not discussed" for missing information.
+        """
+            
+        return [
+            {"role": "system", "content": "You are a medical AI assistant specialized in creating SOAP notes. You must respond with ONLY valid JSON, no additional text or formatting."},
+            {"role": "user", "content": prompt + "\n\nIMPORTANT: Return ONLY the JSON object, no markdown formatting or additional text."}
+        ]
             
-            # Clean up common formatting issues
-            if soap_text.startswith('```json'):
-                soap_text = soap_text.replace('```json', '').replace('```', '').strip()
-            elif soap_text.startswith('```'):
-                soap_text = soap_text.replace('```', '').strip()
+    @staticmethod
+    def _parse_json_response(soap_text: str) -> Dict:
+        """Parse a JSON response from the model, tolerating markdown code fences"""
+        # Clean up common formatting issues
+        if soap_text.startswith('```json'):
+            soap_text = soap_text.replace('```json', '').replace('```', '').strip()
+        elif soap_text.startswith('```'):
+            soap_text = soap_text.replace('```', '').strip()
             
-            # Try to parse as JSON, fallback to structured text if parsing fails
-            try:
-                soap_note = json.loads(soap_text)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                print(f"Raw response: {soap_text[:200]}...")
-                soap_note = {
-                    "raw_response": soap_text,
-                    "parsing_error": f"Could not parse as JSON: {str(e)}"
-                }
+        # Try to parse as JSON, fallback to structured text if parsing fails
+        try:
+            soap_note = json.loads(soap_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error: {e}")
+            print(f"Raw response: {soap_text[:200]}...")
+            soap_note = {
+                "raw_response": soap_text,
+                "parsing_error": f"Could not parse as JSON: {str(e)}"
+            }
+            
+        return soap_note
             
-            return soap_note
+    async def _generate_soap_note(self, transcript: str) -> Dict:
+        try:
+            conversation = await self._condense_transcript(transcript)
             
+            response = await create_chat_completion(
+                self.client,
+                model=settings.GPT_MODEL,
+                messages=self._soap_messages(conversation),
+                temperature=SOAP_TEMPERATURE
+            )
+            
+            return self._parse_json_response(response.choices[0].message.content)
+        
         except Exception as e:
             print(f"Error generating SOAP note: {e}")
             return {"error": str(e)}
     
+    async def merge_soap_note(self, soap_note: Dict, new_transcript: str) -> Dict:
+        """
+        Update an existing SOAP note with the part of the conversation it has not seen
+        
+        Only the new transcript span is sent along with the current note, so the
+        prompt stays roughly the same size however long the visit runs.
+        
+        Args:
+            soap_note: SOAP note covering the earlier part of the transcript
+            new_transcript: Transcript text that follows what the note covers
+        
+        Returns:
+            Complete updated SOAP note dictionary
+        """
+        return await self._cached(
+            "soap_merge",
+            normalize_json([soap_note, normalize_text(new_transcript)]),
+            SOAP_TEMPERATURE,
+            lambda: self._merge_soap_note(soap_note, new_transcript),
+            should_cache=lambda note: "error" not in note and "parsing_error" not in note
+        )
+    
+    async def _merge_soap_note(self, soap_note: Dict, new_transcript: str) -> Dict:
+        try:
+            new_transcript = await self._condense_transcript(new_transcript)
+            
+            prompt = f"""
+            You are a medical AI assistant. A SOAP note has already been written for the first part of a doctor-patient conversation.
+            Update it with the new part of the conversation below.
+            
+            Current SOAP Note:
+            {json.dumps(soap_note, indent=2)}
+            
+            New Conversation:
+            {new_transcript}
+            
+            Return the complete updated SOAP note with exactly the same structure. Keep existing information unless the new
+            conversation corrects it, add newly discussed information to the appropriate fields, and replace "Not discussed"
+            only when the new conversation covers that item.
+            """
+            
+            response = await create_chat_completion(
+                self.client,
+                model=settings.GPT_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a medical AI assistant specialized in creating SOAP notes. You must respond with ONLY valid JSON, no additional text or formatting."},
+                    {"role": "user", "content": prompt + "\n\nIMPORTANT: Return ONLY the JSON object, no markdown formatting or additional text."}
+                ],
+                temperature=SOAP_TEMPERATURE
+            )
+            
+            return self._parse_json_response(response.choices[0].message.content)
+        
+        except Exception as e:
+            print(f"Error merging SOAP note: {e}")
+            return {"error": str(e)}
+    
+    async def stream_soap_note(self, transcript: str) -> AsyncIterator[Dict]:
+        """
+        Generate a SOAP note, yielding progress while the model is still writing
+        
+        Args:
+            transcript: Raw conversation transcript
+        
+        Yields:
+            {"type": "token", "data": str} for each streamed chunk of model output,
+            {"type": "section", "section": str, "data": dict} as each of
+            subjective/objective/assessment/plan is complete, and finally
+            {"type": "complete", "data": dict} with the full SOAP note
+        """
+        normalized = normalize_text(transcript)
+        cache = _get_result_cache("soap") if settings.AI_CACHE_ENABLED else None
+        key = self._cache_key("soap", normalized, SOAP_TEMPERATURE)
+        
+        cached = await cache.get(key) if cache else None
+        if cached is not None:
+            soap_note = copy.deepcopy(cached)
+            for section, value in soap_note.items():
+                yield {"type": "section", "section": section, "data": value}
+            yield {"type": "complete", "data": soap_note}
+            return
+        
+        parser = IncrementalObjectParser()
+        try:
+            conversation = await self._condense_transcript(transcript)
+            
+            stream = await create_chat_completion(
+                self.client,
+                model=settings.GPT_MODEL,
+                messages=self._soap_messages(conversation),
+                temperature=SOAP_TEMPERATURE,
+                stream=True
+            )
+            # Closing returns the request slot even if the consumer stops early
+            async with stream:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    yield {"type": "token", "data": delta}
+                    for section, value in parser.feed(delta):
+                        yield {"type": "section", "section": section, "data": value}
+        except Exception as e:
+            print(f"Error streaming SOAP note: {e}")
+            yield {"type": "complete", "data": {"error": str(e)}}
+            return
+        
+        soap_note = self._parse_json_response(parser.text.strip())
+        if cache and "error" not in soap_note and "parsing_error" not in soap_note:
+            await cache.set(key, copy.deepcopy(soap_note))
+        yield {"type": "complete", "data": soap_note}
+    
     async def generate_patient_summary(self, transcript: str) -> str:
         """
         Generate plain English patient summary
@@ -114,12 +440,23 @@ class AIService:
         Returns:
             Patient-friendly summary text
         """
+        return await self._cached(
+            "summary",
+            normalize_text(transcript),
+            SUMMARY_TEMPERATURE,
+            lambda: self._generate_patient_summary(transcript),
+            should_cache=lambda summary: bool(summary) and not summary.startswith("Error generating summary")
+        )
+    
+    async def _generate_patient_summary(self, transcript: str) -> str:
         try:
+            conversation = await self._condense_transcript(transcript)
+            
             prompt = f"""
             You are a medical AI assistant. Create a clear, patient-friendly summary of the following doctor-patient conversation.
 
             Transcript:
-            {transcript}
+            {conversation}
 
             Write a summary that:
             1. Uses simple, non-medical language
@@ -132,13 +469,14 @@ class AIService:
             Keep it concise but comprehensive. This will be shared with the patient via QR code.
             """
             
-            response = self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=settings.GPT_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a medical AI assistant that creates patient-friendly summaries."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.3
+                temperature=SUMMARY_TEMPERATURE
             )
             
             return response.choices[0].message.content
@@ -156,7 +494,95 @@ class AIService:
             
         Returns:
             Compliance report with missing items and suggestions
+        
+        Structural gaps (missing vitals, allergies, follow-up, ...) are found by
+        the local rule engine. COMPLIANCE_MODE="hybrid" additionally asks the
+        model to review narrative quality, and "llm" sends the whole note to
+        the model for review instead of using the rules.
         """
+        if settings.COMPLIANCE_MODE == "llm":
+            return await self._cached(
+                "compliance",
+                normalize_json(soap_note),
+                COMPLIANCE_TEMPERATURE,
+                lambda: self._check_compliance(soap_note),
+                should_cache=lambda report: "error" not in report and "raw_response" not in report
+            )
+        
+        report = evaluate_soap_note(soap_note)
+        if settings.COMPLIANCE_MODE != "hybrid" or report.get("invalid_input"):
+            # A note scoring 0 on the rules is still worth a narrative review
+            return report
+        
+        review = await self._cached(
+            "compliance_narrative",
+            normalize_json(soap_note),
+            COMPLIANCE_TEMPERATURE,
+            lambda: self._review_narrative_quality(soap_note),
+            should_cache=lambda result: "error" not in result and "parsing_error" not in result
+        )
+        if "error" in review or "parsing_error" in review:
+            return report
+        
+        return build_report(
+            report["missing_items"] + list(review.get("issues") or []),
+            engine="hybrid",
+            recommendations=review.get("recommendations")
+        )
+    
+    async def _review_narrative_quality(self, soap_note: Dict) -> Dict:
+        """Ask the model to review only the narrative sections of a SOAP note"""
+        try:
+            narrative = json.dumps({
+                "history_present_illness": (soap_note.get("subjective") or {}).get("history_present_illness"),
+                "assessment": soap_note.get("assessment"),
+                "plan": soap_note.get("plan")
+            }, indent=2)
+            
+            prompt = f"""
+            You are a medical compliance AI assistant. Structural completeness has already been checked.
+            Review ONLY the narrative quality of the following SOAP note sections.
+            
+            Sections:
+            {narrative}
+            
+            Check for:
+            1. Vague or non-specific history of present illness
+            2. Assessment not supported by the documented findings
+            3. Plan items that do not address the assessment
+            4. Medications in the plan without dose, route or frequency
+            
+            Return a JSON response with:
+            {{
+                "issues": [
+                    {{
+                        "category": "Narrative Quality",
+                        "item": "Plan does not address secondary diagnosis",
+                        "severity": "medium",
+                        "suggestion": "Add a plan item for each diagnosis in the assessment"
+                    }}
+                ],
+                "recommendations": ["Short actionable recommendation"]
+            }}
+            """
+            
+            response = await create_chat_completion(
+                self.client,
+                model=settings.GPT_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a medical compliance AI assistant. You must respond with ONLY valid JSON, no additional text or formatting."},
+                    {"role": "user", "content": prompt + "\n\nIMPORTANT: Return ONLY the JSON object, no markdown formatting or additional text."}
+                ],
+                temperature=COMPLIANCE_TEMPERATURE
+            )
+            
+            return self._parse_json_response(response.choices[0].message.content)
+        
+        except Exception as e:
+            print(f"Error reviewing narrative quality: {e}")
+            return {"error": str(e)}
+    
+    async def _check_compliance(self, soap_note: Dict) -> Dict:
         try:
             soap_json = json.dumps(soap_note, indent=2)
             
@@ -194,13 +620,14 @@ class AIService:
             }}
             """
             
-            response = self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=settings.GPT_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a medical compliance AI assistant. You must respond with ONLY valid JSON, no additional text or formatting."},
                     {"role": "user", "content": prompt + "\n\nIMPORTANT: Return ONLY the JSON object, no markdown formatting or additional text."}
                 ],
-                temperature=0.1
+                temperature=COMPLIANCE_TEMPERATURE
             )
             
             compliance_text = response.choices[0].message.content
@@ -248,6 +675,15 @@ class AIService:
         Returns:
             Updated summary
         """
+        return await self._cached(
+            "edit_summary",
+            normalize_json([normalize_text(current_summary), normalize_text(edit_prompt)]),
+            EDIT_TEMPERATURE,
+            lambda: self._edit_summary_with_prompt(current_summary, edit_prompt),
+            should_cache=lambda summary: bool(summary) and summary != current_summary
+        )
+    
+    async def _edit_summary_with_prompt(self, current_summary: str, edit_prompt: str) -> str:
         try:
             prompt = f"""
             You are a medical AI assistant. Edit the following patient summary based on the doctor's instructions.
@@ -261,13 +697,14 @@ class AIService:
             Provide the updated summary that incorporates the requested changes while maintaining a patient-friendly tone.
             """
             
-            response = self.client.chat.completions.create(
+            response = await create_chat_completion(
+                self.client,
                 model=settings.GPT_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a medical AI assistant that edits patient summaries."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.2
+                temperature=EDIT_TEMPERATURE
             )
             
             return response.choices[0].message.content
@@ -0,0 +1,63 @@
+"""
+Bounded in-memory buffer for audio received as binary WebSocket frames
+"""
+
+from typing import Optional
+
+from ..core.config import settings
+
+
+class AudioTooLargeError(ValueError):
+    """Raised when received audio exceeds the configured size limit"""
+
+
+class AudioBuffer:
+    """
+    Accumulates raw audio bytes for one upload
+
+    Frames are appended into a single ``bytearray`` so the upload is held in
+    memory exactly once, and the configured ``MAX_AUDIO_FILE_SIZE`` is
+    enforced as frames arrive rather than after the whole file is received.
+    """
+
+    def __init__(
+        self,
+        audio_format: str = "webm",
+        mode: str = "complete",
+        seq: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ):
+        extension = f".{audio_format.lower().lstrip('.')}"
+        if extension not in settings.ALLOWED_AUDIO_EXTENSIONS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+
+        self.filename = f"audio{extension}"
+        self.mode = mode
+        self.seq = seq
+        self.max_size = max_size or settings.MAX_AUDIO_FILE_SIZE
+        self.rejected = False
+        self._data = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def append(self, frame: bytes):
+        """
+        Append one binary frame, enforcing the size limit
+
+        Once the limit is exceeded the buffered audio is released and the
+        remaining frames of the upload are ignored.
+        """
+        if self.rejected:
+            return
+        if len(self._data) + len(frame) > self.max_size:
+            self.rejected = True
+            self._data = bytearray()
+            raise AudioTooLargeError(
+                f"Audio exceeds maximum size of {self.max_size} bytes"
+            )
+        self._data.extend(frame)
+
+    def getvalue(self) -> bytes:
+        """Return the buffered audio"""
+        return bytes(self._data)
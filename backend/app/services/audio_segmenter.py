@@ -0,0 +1,256 @@
+"""
+Silence-aware splitting of long recordings into overlapping segments
+"""
+
+import array
+import asyncio
+import io
+import math
+import shutil
+import warnings
+import wave
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # Removed from the standard library in Python 3.13
+    audioop = None
+
+
+# Whisper resamples everything to 16 kHz mono, so nothing is lost by segmenting at that rate
+TARGET_SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Window used to measure loudness when looking for silence
+ENERGY_FRAME_MS = 50
+
+WAV_HEADER_BYTES = 44
+
+
+class AudioDecodeError(Exception):
+    """Raised when a recording cannot be decoded to PCM for segmentation"""
+
+
+@dataclass
+class AudioSegment:
+    """One slice of a long recording, encoded as a standalone WAV file"""
+    index: int
+    start: float  # seconds where this segment's owned span begins
+    end: float  # seconds where this segment's owned span ends
+    offset: float  # seconds where the segment audio actually begins (start minus overlap)
+    wav_bytes: bytes
+
+
+def _read_wav(audio_bytes: bytes) -> Tuple[bytes, int, int, int]:
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wav_file:
+        return (
+            wav_file.readframes(wav_file.getnframes()),
+            wav_file.getframerate(),
+            wav_file.getsampwidth(),
+            wav_file.getnchannels(),
+        )
+
+
+def _wav_to_mono16(audio_bytes: bytes) -> Optional[Tuple[bytes, int]]:
+    """
+    Convert a WAV file to 16 kHz 16-bit mono PCM without ffmpeg when possible
+
+    Returns None when the conversion needs audioop and it is unavailable, so
+    the caller falls back to ffmpeg.
+    """
+    pcm, sample_rate, sample_width, channels = _read_wav(audio_bytes)
+    if sample_width == SAMPLE_WIDTH and channels == 1 and sample_rate == TARGET_SAMPLE_RATE:
+        return pcm, sample_rate
+    if audioop is None or channels not in (1, 2):
+        return None
+    if sample_width != SAMPLE_WIDTH:
+        pcm = audioop.lin2lin(pcm, sample_width, SAMPLE_WIDTH)
+    if channels == 2:
+        pcm = audioop.tomono(pcm, SAMPLE_WIDTH, 0.5, 0.5)
+    if sample_rate != TARGET_SAMPLE_RATE:
+        # Higher rates would make segments of the same length several times larger
+        pcm, _ = audioop.ratecv(pcm, SAMPLE_WIDTH, 1, sample_rate, TARGET_SAMPLE_RATE, None)
+    return pcm, TARGET_SAMPLE_RATE
+
+
+async def _ffmpeg_to_pcm(audio_bytes: bytes) -> bytes:
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise AudioDecodeError("ffmpeg is required to segment compressed audio")
+
+    process = await asyncio.create_subprocess_exec(
+        ffmpeg, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE),
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    pcm, stderr = await process.communicate(audio_bytes)
+    if process.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg failed to decode audio: {stderr.decode(errors='ignore').strip()}")
+    return pcm
+
+
+async def decode_to_pcm(audio_bytes: bytes) -> Tuple[bytes, int]:
+    """
+    Decode a recording to 16-bit mono PCM
+
+    WAV input is handled in-process; other formats (webm, m4a, mp3) are
+    decoded with ffmpeg when it is installed.
+
+    Returns:
+        Tuple of (pcm bytes, sample rate)
+    """
+    if audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE":
+        try:
+            converted = _wav_to_mono16(audio_bytes)
+        except wave.Error as e:
+            raise AudioDecodeError(f"Invalid WAV file: {e}")
+        if converted:
+            return converted
+    return await _ffmpeg_to_pcm(audio_bytes), TARGET_SAMPLE_RATE
+
+
+def _frame_rms(frame: bytes) -> float:
+    if audioop is not None:
+        return audioop.rms(frame, SAMPLE_WIDTH)
+    samples = array.array("h")
+    samples.frombytes(frame[: len(frame) - len(frame) % SAMPLE_WIDTH])
+    if not samples:
+        return 0.0
+    # Every 4th sample is plenty to find quiet stretches
+    sampled = samples[::4]
+    return math.sqrt(sum(s * s for s in sampled) / len(sampled))
+
+
+def _energy_profile(pcm: bytes, sample_rate: int) -> List[float]:
+    frame_bytes = sample_rate * ENERGY_FRAME_MS // 1000 * SAMPLE_WIDTH
+    return [_frame_rms(pcm[i:i + frame_bytes]) for i in range(0, len(pcm), frame_bytes)]
+
+
+def find_cut_points(
+    pcm: bytes,
+    sample_rate: int,
+    segment_seconds: float,
+    search_seconds: float,
+) -> List[float]:
+    """
+    Choose segment boundaries at the quietest point near each target length
+
+    Returns:
+        Boundary times in seconds, including 0 and the total duration
+    """
+    duration = len(pcm) / (sample_rate * SAMPLE_WIDTH)
+    if duration <= segment_seconds:
+        return [0.0, duration]
+
+    energy = _energy_profile(pcm, sample_rate)
+    frame_seconds = ENERGY_FRAME_MS / 1000
+    search_frames = max(1, int(search_seconds / frame_seconds))
+
+    cuts = [0.0]
+    while duration - cuts[-1] > segment_seconds:
+        target = int((cuts[-1] + segment_seconds) / frame_seconds)
+        low = max(int(cuts[-1] / frame_seconds) + 1, target - search_frames)
+        high = min(len(energy), target + search_frames)
+        quietest = min(range(low, high), key=lambda i: energy[i]) if high > low else target
+        cuts.append(quietest * frame_seconds)
+    cuts.append(duration)
+    return cuts
+
+
+def _encode_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def max_segment_seconds(
+    sample_rate: int,
+    max_segment_bytes: int,
+    overlap_seconds: float,
+    search_seconds: float,
+) -> float:
+    """
+    Longest target segment length whose WAV file stays within ``max_segment_bytes``
+
+    A cut can land up to ``search_seconds`` past its target and every segment
+    is padded by ``overlap_seconds`` on both sides, so both are budgeted.
+
+    Raises:
+        ValueError: If the overlap and search window alone exceed the budget
+    """
+    budget = (max_segment_bytes - WAV_HEADER_BYTES) / (sample_rate * SAMPLE_WIDTH)
+    seconds = budget - 2 * overlap_seconds - search_seconds
+    if seconds <= 0:
+        raise ValueError(f"Segments of at most {max_segment_bytes} bytes cannot hold the overlap and silence search window")
+    return seconds
+
+
+def split_pcm(
+    pcm: bytes,
+    sample_rate: int,
+    segment_seconds: float,
+    overlap_seconds: float,
+    search_seconds: float,
+    max_segment_bytes: Optional[int] = None,
+) -> List[AudioSegment]:
+    """
+    Split PCM audio at silence boundaries into overlapping WAV segments
+
+    Each segment owns the span between two cut points and is padded with
+    ``overlap_seconds`` of audio on either side so words at a boundary are
+    heard in full by at least one segment. With ``max_segment_bytes`` the
+    segment length is shortened as needed so no WAV file exceeds it.
+    """
+    if max_segment_bytes is not None:
+        segment_seconds = min(
+            segment_seconds,
+            max_segment_seconds(sample_rate, max_segment_bytes, overlap_seconds, search_seconds)
+        )
+    cuts = find_cut_points(pcm, sample_rate, segment_seconds, search_seconds)
+    bytes_per_second = sample_rate * SAMPLE_WIDTH
+    total = len(pcm)
+
+    segments = []
+    for index, (start, end) in enumerate(zip(cuts, cuts[1:])):
+        offset = max(0.0, start - overlap_seconds)
+        first = int(offset * bytes_per_second) & ~1
+        last = min(total, int((end + overlap_seconds) * bytes_per_second) & ~1)
+        segments.append(AudioSegment(
+            index=index,
+            start=start,
+            end=end,
+            offset=first / bytes_per_second,
+            wav_bytes=_encode_wav(pcm[first:last], sample_rate),
+        ))
+    return segments
+
+
+async def segment_audio(
+    audio_bytes: bytes,
+    segment_seconds: float,
+    overlap_seconds: float,
+    search_seconds: float,
+    max_segment_bytes: Optional[int] = None,
+) -> List[AudioSegment]:
+    """
+    Decode a recording and split it into overlapping segments
+
+    Raises:
+        AudioDecodeError: If the audio cannot be decoded
+    """
+    pcm, sample_rate = await decode_to_pcm(audio_bytes)
+    # Energy scanning and WAV encoding are CPU bound; keep them off the event loop
+    return await asyncio.to_thread(
+        split_pcm, pcm, sample_rate, segment_seconds, overlap_seconds, search_seconds, max_segment_bytes
+    )
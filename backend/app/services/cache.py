@@ -0,0 +1,298 @@
+"""
+Two-tier result cache: in-memory LRU backed by a size-bounded SQLite store
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..core.config import settings
+
+
+def hash_bytes(data: bytes) -> str:
+    """Content hash used as a cache key component"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """Build a cache key from several components"""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class LRUCache:
+    """Bounded in-memory least-recently-used cache"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class DiskCache:
+    """
+    Persistent cache tier stored in a SQLite file
+
+    Entries are JSON encoded, or stored as-is when ``raw`` is set (values are
+    then bytes, e.g. rendered images). When a namespace grows past
+    ``max_bytes`` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, namespace: str, max_bytes: int, raw: bool = False):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.raw = raw
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_access ON cache_entries (namespace, last_access)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key),
+            )
+            conn.commit()
+        return row[0] if self.raw else json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        encoded = value if self.raw else json.dumps(value, default=str)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, encoded, len(encoded), time.time()),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY last_access",
+            (self.namespace,),
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((self.namespace, key))
+            total -= size
+        conn.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", evicted)
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TieredCache:
+    """
+    Memory LRU in front of a persistent SQLite tier
+
+    Concurrent lookups of the same missing key share one computation, so a
+    burst of identical requests only does the expensive work once.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        memory_entries: int,
+        max_disk_bytes: int,
+        path: Optional[str] = None,
+        raw: bool = False,
+    ):
+        self.namespace = namespace
+        self.memory = LRUCache(memory_entries)
+        self.disk = (
+            DiskCache(path or settings.CACHE_DB_PATH, namespace, max_disk_bytes, raw=raw)
+            if max_disk_bytes > 0 else None
+        )
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Look up a value, promoting disk hits into memory"""
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self.disk is not None:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                print(f"Cache read error ({self.namespace}): {e}")
+                value = None
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Store a value in both tiers"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value)
+            except sqlite3.Error as e:
+                print(f"Cache write error ({self.namespace}): {e}")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        should_cache: Callable[[Any], bool] = lambda value: value is not None,
+    ) -> Any:
+        """
+        Return the cached value for ``key`` or compute, cache and return it
+
+        Args:
+            key: Cache key
+            compute: Coroutine factory producing the value on a miss
+            should_cache: Predicate deciding whether a computed value is stored
+                (failures are returned to the caller but never cached)
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        # The computation runs in its own task shared by every caller for the
+        # key, so a caller that is cancelled (e.g. its client disconnected)
+        # stops waiting without cancelling the work for the others
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute, should_cache))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._computed(key, done))
+        return await asyncio.shield(task)
+
+    async def _compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        should_cache: Callable[[Any], bool],
+    ) -> Any:
+        value = await compute()
+        if should_cache(value):
+            await self.set(key, value)
+        return value
+
+    def _computed(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved if every caller stopped waiting
+            task.exception()
+
+    async def invalidate(self, key: Optional[str] = None):
+        """Drop one entry, or the whole namespace when no key is given"""
+        if key is None:
+            self.memory.clear()
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.clear)
+        else:
+            self.memory.delete(key)
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.delete, key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory)
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
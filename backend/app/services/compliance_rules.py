@@ -0,0 +1,161 @@
+"""
+Deterministic compliance checks for generated SOAP notes
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Score deducted per missing item, by severity
+SEVERITY_WEIGHTS = {"high": 10, "medium": 5, "low": 2}
+
+# Values the SOAP prompt (or a clinician) uses to mean "nothing documented"
+_MISSING_MARKERS = {
+    "", "none documented", "not discussed", "not recorded", "not mentioned",
+    "not documented", "not assessed", "not performed", "not available",
+    "n/a", "na", "unknown", "none reported", "-",
+}
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A required SOAP field and how to report it when missing"""
+    path: Tuple[str, ...]
+    category: str
+    item: str
+    severity: str
+    suggestion: str
+
+
+RULES: List[Rule] = [
+    Rule(("subjective", "chief_complaint"), "Subjective", "Chief complaint not documented", "high",
+         "Document the patient's primary reason for the visit"),
+    Rule(("subjective", "history_present_illness"), "Subjective", "History of present illness not documented", "high",
+         "Describe onset, duration, severity and modifying factors of current symptoms"),
+    Rule(("subjective", "review_of_systems"), "Subjective", "Review of systems not documented", "low",
+         "Record pertinent positives and negatives from the review of systems"),
+    Rule(("subjective", "past_medical_history"), "Subjective", "Past medical history not documented", "low",
+         "Record relevant past medical and surgical history"),
+    Rule(("subjective", "medications"), "Medication Reconciliation", "Current medications not reconciled", "high",
+         "Reconcile and document all current medications, including over-the-counter drugs"),
+    Rule(("subjective", "allergies"), "Allergies", "Allergy information missing", "high",
+         "Document known allergies or explicitly record 'No known allergies'"),
+    Rule(("subjective", "social_history"), "Subjective", "Social history not documented", "low",
+         "Record relevant social history such as tobacco, alcohol and occupation"),
+    Rule(("objective", "vital_signs", "blood_pressure"), "Vital Signs", "Blood pressure not recorded", "high",
+         "Blood pressure should be recorded for all patient visits"),
+    Rule(("objective", "vital_signs", "heart_rate"), "Vital Signs", "Heart rate not recorded", "medium",
+         "Record heart rate with the other vital signs"),
+    Rule(("objective", "vital_signs", "temperature"), "Vital Signs", "Temperature not recorded", "medium",
+         "Record temperature, especially when infection is suspected"),
+    Rule(("objective", "vital_signs", "respiratory_rate"), "Vital Signs", "Respiratory rate not recorded", "low",
+         "Record respiratory rate with the other vital signs"),
+    Rule(("objective", "vital_signs", "oxygen_saturation"), "Vital Signs", "Oxygen saturation not recorded", "low",
+         "Record oxygen saturation, especially for respiratory complaints"),
+    Rule(("objective", "physical_exam"), "Objective", "Physical examination findings not documented", "medium",
+         "Document examination findings relevant to the chief complaint"),
+    Rule(("assessment", "primary_diagnosis"), "Assessment", "Primary diagnosis not documented", "high",
+         "Record the working diagnosis supported by the subjective and objective findings"),
+    Rule(("assessment", "clinical_impression"), "Assessment", "Clinical impression not documented", "medium",
+         "Summarize the overall clinical impression"),
+    Rule(("plan", "treatment"), "Plan", "Treatment plan not documented", "high",
+         "Document the treatment plan for each diagnosis"),
+    Rule(("plan", "follow_up"), "Follow-up", "Follow-up instructions missing", "high",
+         "Document when and under what circumstances the patient should return"),
+    Rule(("plan", "patient_education"), "Patient Education", "Patient education not documented", "medium",
+         "Document the education and counseling provided to the patient"),
+]
+
+
+def is_missing(value: Any) -> bool:
+    """True if a SOAP field holds no real clinical content"""
+    if value is None:
+        return True
+    if isinstance(value, str):
+        text = value.strip().lower().rstrip(".")
+        return text in _MISSING_MARKERS or text.endswith("if mentioned")
+    if isinstance(value, (list, tuple)):
+        return all(is_missing(item) for item in value)
+    if isinstance(value, dict):
+        return all(is_missing(item) for item in value.values())
+    return False
+
+
+def _lookup(soap_note: Dict, path: Tuple[str, ...]) -> Optional[Any]:
+    value: Any = soap_note
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _overall_assessment(score: int) -> str:
+    if score >= 90:
+        return "Complete documentation with minimal gaps"
+    if score >= 75:
+        return "Good documentation with minor gaps"
+    if score >= 50:
+        return "Documentation has several gaps that should be addressed"
+    return "Documentation is substantially incomplete"
+
+
+def evaluate_soap_note(soap_note: Dict) -> Dict:
+    """
+    Score a SOAP note against the required documentation rules
+
+    Args:
+        soap_note: SOAP note in the structure produced by AIService.generate_soap_note
+
+    Returns:
+        Compliance report with the same shape as the LLM compliance check;
+        ``invalid_input`` is set when the note failed or could not be parsed
+        and so was not evaluated
+    """
+    if not isinstance(soap_note, dict) or "error" in soap_note or "parsing_error" in soap_note:
+        return {
+            "compliance_score": 0,
+            "missing_items": [],
+            "recommendations": ["Regenerate the SOAP note before checking compliance"],
+            "overall_assessment": "SOAP note could not be evaluated",
+            "engine": "rules",
+            "invalid_input": True
+        }
+
+    exam_documented = not is_missing(_lookup(soap_note, ("objective", "physical_exam")))
+
+    missing_items = []
+    for rule in RULES:
+        if not is_missing(_lookup(soap_note, rule.path)):
+            continue
+        severity = rule.severity
+        # Vitals matter more once an exam was performed
+        if rule.category == "Vital Signs" and exam_documented and severity == "low":
+            severity = "medium"
+        missing_items.append({
+            "category": rule.category,
+            "item": rule.item,
+            "severity": severity,
+            "suggestion": rule.suggestion
+        })
+
+    return build_report(missing_items, engine="rules")
+
+
+def build_report(missing_items: List[Dict], engine: str, recommendations: Optional[List[str]] = None) -> Dict:
+    """Compute score, recommendations and overall assessment for a list of findings"""
+    deductions = sum(SEVERITY_WEIGHTS.get(item.get("severity", "low"), 2) for item in missing_items)
+    score = max(0, 100 - deductions)
+
+    recommendations = list(recommendations or [])
+    for item in missing_items:
+        if item["severity"] == "high" and item["suggestion"] not in recommendations:
+            recommendations.append(item["suggestion"])
+
+    return {
+        "compliance_score": score,
+        "missing_items": missing_items,
+        "recommendations": recommendations,
+        "overall_assessment": _overall_assessment(score),
+        "engine": engine
+    }
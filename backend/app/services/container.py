@@ -0,0 +1,73 @@
+"""
+Process-wide service container shared by the REST routers and WebSocket handler
+"""
+
+from typing import Optional
+
+from openai import AsyncOpenAI
+
+from .ai_service import AIService, close_result_caches
+from .openai_client import create_openai_client
+from .transcription_service import TranscriptionService
+from .websocket_manager import WebSocketManager
+
+
+class ServiceContainer:
+    """
+    Holds one instance of each service and one pooled client per provider
+
+    Nothing is built at import time: the OpenAI client and the services that
+    use it are created on first access, so startup does not pay for client
+    construction and every caller shares the same connection pool. ``close()``
+    is called from the application lifespan on shutdown.
+    """
+
+    def __init__(self):
+        self._openai_client: Optional[AsyncOpenAI] = None
+        self._ai_service: Optional[AIService] = None
+        self._transcription_service: Optional[TranscriptionService] = None
+        self.websocket_manager = WebSocketManager()
+
+    @property
+    def openai_client(self) -> AsyncOpenAI:
+        if self._openai_client is None:
+            self._openai_client = create_openai_client()
+        return self._openai_client
+
+    @property
+    def ai_service(self) -> AIService:
+        if self._ai_service is None:
+            self._ai_service = AIService(self.openai_client)
+        return self._ai_service
+
+    @property
+    def transcription_service(self) -> TranscriptionService:
+        if self._transcription_service is None:
+            self._transcription_service = TranscriptionService(self.openai_client)
+        return self._transcription_service
+
+    async def close(self):
+        """Close pooled connections and cache files; services are rebuilt on next use"""
+        if self._transcription_service is not None:
+            self._transcription_service.close()
+            self._transcription_service = None
+        self._ai_service = None
+        close_result_caches()
+
+        if self._openai_client is not None:
+            await self._openai_client.close()
+            self._openai_client = None
+
+
+# Global service container
+services = ServiceContainer()
+
+
+def get_ai_service() -> AIService:
+    """FastAPI dependency returning the shared AIService"""
+    return services.ai_service
+
+
+def get_transcription_service() -> TranscriptionService:
+    """FastAPI dependency returning the shared TranscriptionService"""
+    return services.transcription_service
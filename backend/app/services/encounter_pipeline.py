@@ -0,0 +1,175 @@
+"""
+End-of-visit pipeline that produces all documentation for an encounter concurrently
+"""
+
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from ..models.database import load_session_async, update_session_fields_async
+from .ai_service import AIService
+
+
+EventCallback = Callable[[Dict], Awaitable[None]]
+
+
+def _transcript_hash(transcript: str) -> str:
+    return hashlib.sha256(transcript.encode()).hexdigest()
+
+
+def soap_coverage(transcript: str) -> Dict:
+    """Fields recording which transcript a stored SOAP note was generated from"""
+    return {
+        "soap_transcript_length": len(transcript),
+        "soap_transcript_hash": _transcript_hash(transcript)
+    }
+
+
+def soap_note_error(soap_note: Optional[Dict]) -> Optional[str]:
+    """Why a generated SOAP note must not be saved or checked, or None if it is usable"""
+    if not soap_note:
+        return "No SOAP note was generated"
+    if "error" in soap_note:
+        return soap_note["error"]
+    if "parsing_error" in soap_note:
+        return soap_note["parsing_error"]
+    return None
+
+
+def is_valid_soap_note(soap_note: Optional[Dict]) -> bool:
+    return soap_note_error(soap_note) is None
+
+
+async def regenerate_soap_note(
+    ai_service: AIService,
+    session_id: str,
+    transcript: Optional[str] = None,
+    incremental: bool = True,
+) -> Tuple[Optional[Dict], str]:
+    """
+    Bring a session's SOAP note up to date with its transcript
+    
+    When the stored note was generated from a prefix of the current
+    transcript, only the new span is sent to the model and merged into the
+    note. Otherwise (first generation, edited transcript, or
+    ``incremental=False``) the note is regenerated from the full transcript.
+    
+    Args:
+        ai_service: Service used for the AI calls
+        session_id: Session whose SOAP note is regenerated
+        transcript: Current transcript; defaults to the stored transcript
+        incremental: Allow merging only the new transcript span
+    
+    Returns:
+        Tuple of (SOAP note, mode) where mode is "unchanged", "incremental" or
+        "full"; the note is None if the session does not exist
+    """
+    session = await load_session_async(session_id)
+    if not session:
+        return None, "full"
+    
+    transcript = transcript if transcript is not None else (session.transcript or "")
+    covered = session.soap_transcript_length or 0
+    can_merge = (
+        incremental
+        and is_valid_soap_note(session.soap_note)
+        and 0 < covered <= len(transcript)
+        and session.soap_transcript_hash == _transcript_hash(transcript[:covered])
+    )
+    
+    if can_merge:
+        new_span = transcript[covered:]
+        if not new_span.strip():
+            return session.soap_note, "unchanged"
+        soap_note = await ai_service.merge_soap_note(session.soap_note, new_span)
+        mode = "incremental"
+    else:
+        soap_note = await ai_service.generate_soap_note(transcript)
+        mode = "full"
+    
+    if is_valid_soap_note(soap_note):
+        await update_session_fields_async(session_id, soap_note=soap_note, **soap_coverage(transcript))
+    return soap_note, mode
+
+
+async def finalize_encounter(
+    ai_service: AIService,
+    transcript: str,
+    session_id: Optional[str] = None,
+    on_event: Optional[EventCallback] = None,
+) -> Dict:
+    """
+    Generate the SOAP note, patient summary and compliance report for a visit
+    
+    The SOAP note and patient summary are generated concurrently, and the
+    compliance check starts as soon as the SOAP note is ready, so total latency
+    is max(SOAP, summary) + compliance. Each result is persisted and emitted as
+    soon as it lands rather than when the whole pipeline finishes.
+    
+    Args:
+        ai_service: Service used for the AI calls
+        transcript: Complete conversation transcript
+        session_id: Session to persist results to (optional)
+        on_event: Async callback receiving progress/result events; events use the
+            same message types as the individual WebSocket requests
+    
+    Returns:
+        Dict with soap_note, patient_summary, compliance_report and timings (ms),
+        plus errors by step if the SOAP note could not be used
+    """
+    started = time.perf_counter()
+    results: Dict = {"soap_note": None, "patient_summary": None, "compliance_report": None}
+    timings: Dict[str, int] = {}
+    
+    async def emit(event: Dict):
+        if on_event:
+            await on_event(event)
+    
+    async def persist(**fields):
+        if session_id:
+            await update_session_fields_async(session_id, **fields)
+    
+    def elapsed_ms() -> int:
+        return int((time.perf_counter() - started) * 1000)
+    
+    async def soap_then_compliance():
+        soap_note = await ai_service.generate_soap_note(transcript)
+        timings["soap"] = elapsed_ms()
+        results["soap_note"] = soap_note
+        await emit({"type": "soap_generated", "data": soap_note})
+        
+        error = soap_note_error(soap_note)
+        if error:
+            # Keep the previously saved note and do not check an unusable one
+            results.setdefault("errors", {})["soap"] = error
+            await emit({"type": "finalize_progress", "step": "soap", "status": "failed", "error": error})
+            await emit({"type": "finalize_progress", "step": "compliance", "status": "skipped"})
+            return
+        
+        await persist(soap_note=soap_note, **soap_coverage(transcript))
+        
+        await emit({"type": "finalize_progress", "step": "compliance", "status": "started"})
+        compliance_report = await ai_service.check_compliance(soap_note)
+        timings["compliance"] = elapsed_ms()
+        results["compliance_report"] = compliance_report
+        if "error" not in compliance_report:
+            await persist(compliance_report=compliance_report)
+        await emit({"type": "compliance_report", "data": compliance_report})
+    
+    async def summary():
+        patient_summary = await ai_service.generate_patient_summary(transcript)
+        timings["summary"] = elapsed_ms()
+        results["patient_summary"] = patient_summary
+        if patient_summary and not patient_summary.startswith("Error generating summary"):
+            await persist(patient_summary=patient_summary)
+        await emit({"type": "summary_generated", "data": patient_summary})
+    
+    await emit({"type": "finalize_progress", "step": "soap", "status": "started"})
+    await emit({"type": "finalize_progress", "step": "summary", "status": "started"})
+    await asyncio.gather(soap_then_compliance(), summary())
+    
+    timings["total"] = elapsed_ms()
+    results["timings"] = timings
+    await emit({"type": "finalize_complete", "session_id": session_id, "timings": timings})
+    return results
@@ -0,0 +1,93 @@
+"""
+Incremental parser for JSON objects that arrive a few tokens at a time
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class IncrementalObjectParser:
+    """
+    Emits the top-level fields of a streamed JSON object as each one completes
+
+    Text is fed in as it arrives from the model. The parser tracks nesting
+    depth and string state across calls, and as soon as the value of a
+    top-level key is closed it is decoded and returned, without waiting for
+    the rest of the object. Anything before the opening brace (such as a
+    markdown code fence) is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text and return any top-level fields completed by it
+
+        Returns:
+            List of (key, decoded value) pairs in the order they completed
+        """
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer) and not self.done:
+            char = buffer[self._pos]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None and self._string_start is not None:
+                        self._key = json.loads(buffer[self._string_start:self._pos + 1])
+                        self._string_start = None
+                self._pos += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._string_start = self._pos
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 1:
+                    self._complete_value(self._pos, completed)
+                    self.done = True
+                self._depth -= 1
+            elif char == ":" and self._depth == 1 and self._key is not None:
+                self._value_start = self._pos + 1
+            elif char == "," and self._depth == 1:
+                self._complete_value(self._pos, completed)
+
+            self._pos += 1
+
+        return completed
+
+    def _complete_value(self, end: int, completed: List[Tuple[str, Any]]):
+        if self._key is None or self._value_start is None:
+            return
+        raw = self._buffer[self._value_start:end].strip()
+        try:
+            completed.append((self._key, json.loads(raw)))
+        except json.JSONDecodeError:
+            # Malformed field; the full response is still parsed at the end
+            pass
+        self._key = None
+        self._value_start = None
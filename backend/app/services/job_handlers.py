@@ -0,0 +1,166 @@
+"""
+Handlers that run AI work for background jobs
+"""
+
+import asyncio
+import os
+import uuid
+from typing import Dict, Optional
+
+from ..core.config import settings
+from ..models.database import update_session_fields_async
+from .container import ServiceContainer
+from .encounter_pipeline import finalize_encounter, is_valid_soap_note, regenerate_soap_note, soap_coverage, soap_note_error
+from .job_queue import JobQueue, ProgressCallback
+from .transcription_service import decode_audio
+
+
+def _job_audio_path(name: str) -> str:
+    # Only names created by store_job_audio are accepted (no directories)
+    if os.path.basename(name) != name or name.startswith("."):
+        raise ValueError(f"Invalid job audio file: {name}")
+    return os.path.join(settings.JOB_AUDIO_DIR, name)
+
+
+def _write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def store_job_audio(payload: Dict) -> Dict:
+    """
+    Move a transcription job's audio out of its payload into JOB_AUDIO_DIR
+    
+    Recordings can be hundreds of MB, so the ``jobs`` table and the in-memory
+    queue only hold the file name.
+    
+    Args:
+        payload: ``{"audio": base64, "format": "webm"}``
+    
+    Returns:
+        ``{"audio_file": name, "format": format}``
+    
+    Raises:
+        ValueError: If the audio is missing, too large, not base64, or in an unsupported format
+    """
+    audio_format = str(payload.get("format", "webm")).lower()
+    if f".{audio_format}" not in settings.ALLOWED_AUDIO_EXTENSIONS:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+    if not payload.get("audio"):
+        raise ValueError("Transcription jobs need base64 audio in payload.audio")
+    
+    audio_bytes = decode_audio(payload["audio"], max_size=settings.MAX_LONG_AUDIO_FILE_SIZE)
+    name = f"{uuid.uuid4().hex}.{audio_format}"
+    await asyncio.to_thread(_write_file, _job_audio_path(name), audio_bytes)
+    return {"audio_file": name, "format": audio_format}
+
+
+async def delete_job_audio(payload: Dict) -> Dict:
+    """Remove a transcription job's stored audio (missing files are ignored)"""
+    if payload.get("audio_file"):
+        try:
+            await asyncio.to_thread(os.remove, _job_audio_path(payload["audio_file"]))
+        except FileNotFoundError:
+            pass
+    return payload
+
+
+def register_job_handlers(job_queue: JobQueue, services: ServiceContainer):
+    """Register the transcription, SOAP, summary, compliance and finalize job kinds"""
+    
+    async def persist(session_id: Optional[str], **fields):
+        if session_id:
+            await update_session_fields_async(session_id, **fields)
+    
+    async def transcription(payload: Dict, session_id: Optional[str], report_progress: ProgressCallback):
+        # payload: {"audio_file": name, "format": "webm"} (see store_job_audio); jobs
+        # queued by older versions still carry the base64 audio inline
+        if "audio_file" in payload:
+            try:
+                audio_bytes = await asyncio.to_thread(_read_file, _job_audio_path(payload["audio_file"]))
+            except FileNotFoundError:
+                raise RuntimeError("Job audio is no longer available")
+        else:
+            audio_bytes = decode_audio(payload["audio"], max_size=settings.MAX_LONG_AUDIO_FILE_SIZE)
+        filename = f"audio.{payload.get('format', 'webm')}"
+        
+        try:
+            result = await transcribe(audio_bytes, filename, report_progress)
+        except Exception:
+            # Not on cancellation: an interrupted job resumes on restart and needs its audio
+            await delete_job_audio(payload)
+            raise
+        await delete_job_audio(payload)
+        
+        if not result or not result["transcript"]:
+            raise RuntimeError("Transcription failed")
+        return result
+    
+    async def transcribe(audio_bytes: bytes, filename: str, report_progress: ProgressCallback) -> Optional[Dict]:
+        # Long recordings report segments that failed, leaving gaps in the text
+        if len(audio_bytes) > settings.LONG_AUDIO_THRESHOLD_BYTES:
+            async def segment_progress(completed: int, total: int):
+                await report_progress({"completed": completed, "total": total})
+            
+            result = await services.transcription_service.transcribe_long_audio(audio_bytes, filename, segment_progress)
+            if not result:
+                return None
+            return {
+                "transcript": result["text"],
+                "incomplete": bool(result.get("incomplete")),
+                "failed_segments": result.get("failed_segments", [])
+            }
+        text = await services.transcription_service.transcribe_bytes(audio_bytes, filename)
+        return {"transcript": text, "incomplete": False, "failed_segments": []}
+    
+    async def soap(payload: Dict, session_id: Optional[str], report_progress: ProgressCallback):
+        # payload: {"transcript": str, "incremental": bool}
+        transcript = payload["transcript"]
+        if session_id and payload.get("incremental"):
+            soap_note, mode = await regenerate_soap_note(services.ai_service, session_id, transcript)
+            if soap_note is None:
+                raise RuntimeError("Session not found")
+        else:
+            soap_note, mode = await services.ai_service.generate_soap_note(transcript), "full"
+            if is_valid_soap_note(soap_note):
+                await persist(session_id, soap_note=soap_note, **soap_coverage(transcript))
+        
+        error = soap_note_error(soap_note)
+        if error:
+            raise RuntimeError(error)
+        return {"soap_note": soap_note, "mode": mode}
+    
+    async def summary(payload: Dict, session_id: Optional[str], report_progress: ProgressCallback):
+        # payload: {"transcript": str}
+        patient_summary = await services.ai_service.generate_patient_summary(payload["transcript"])
+        if not patient_summary or patient_summary.startswith("Error generating summary"):
+            raise RuntimeError(patient_summary or "Summary generation failed")
+        await persist(session_id, patient_summary=patient_summary)
+        return {"patient_summary": patient_summary}
+    
+    async def compliance(payload: Dict, session_id: Optional[str], report_progress: ProgressCallback):
+        # payload: {"soap_note": dict}
+        report = await services.ai_service.check_compliance(payload["soap_note"])
+        if "error" in report:
+            raise RuntimeError(report["error"])
+        await persist(session_id, compliance_report=report)
+        return {"compliance_report": report}
+    
+    async def finalize(payload: Dict, session_id: Optional[str], report_progress: ProgressCallback):
+        # payload: {"transcript": str}
+        async def on_event(event: Dict):
+            await report_progress(event)
+        
+        return await finalize_encounter(services.ai_service, payload["transcript"], session_id, on_event)
+    
+    job_queue.register("transcription", transcription, prepare=store_job_audio, discard=delete_job_audio)
+    job_queue.register("soap", soap)
+    job_queue.register("summary", summary)
+    job_queue.register("compliance", compliance)
+    job_queue.register("finalize", finalize)
@@ -0,0 +1,434 @@
+"""
+In-process background job queue for AI work that must survive client disconnects
+"""
+
+import asyncio
+import itertools
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+
+from ..core.config import settings
+from ..models.database import AsyncSessionLocal, Job
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Accepted job priorities (lower runs first)
+MIN_PRIORITY = 0
+MAX_PRIORITY = 9
+
+ProgressCallback = Callable[[Dict], Awaitable[None]]
+JobHandler = Callable[[Dict, Optional[str], ProgressCallback], Awaitable[Any]]
+JobListener = Callable[[Dict], Awaitable[None]]
+PayloadHook = Callable[[Dict], Awaitable[Dict]]
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its maximum depth"""
+
+
+class UnknownJobKindError(ValueError):
+    """Raised when no handler is registered for a job kind"""
+
+
+class InvalidJobPriorityError(ValueError):
+    """Raised when a submitted priority is not an integer in the accepted range"""
+
+
+class InvalidJobPayloadError(ValueError):
+    """Raised when a job kind's prepare hook rejects the submitted payload"""
+
+
+def _job_to_dict(job: Job, include_payload: bool = False) -> Dict:
+    data = {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": job.priority,
+        "session_id": job.session_id,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+    if include_payload:
+        data["payload"] = job.payload
+    return data
+
+
+async def _insert_job(job_id: str, kind: str, payload: Dict, session_id: Optional[str], priority: int) -> Dict:
+    async with AsyncSessionLocal() as db:
+        job = Job(
+            job_id=job_id,
+            kind=kind,
+            status=JOB_QUEUED,
+            priority=priority,
+            session_id=session_id,
+            payload=payload,
+            created_at=datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        return _job_to_dict(job)
+
+
+async def _update_job(job_id: str, **fields) -> Optional[Dict]:
+    async with AsyncSessionLocal() as db:
+        try:
+            job = await db.scalar(select(Job).where(Job.job_id == job_id))
+            if not job:
+                return None
+            for name, value in fields.items():
+                setattr(job, name, value)
+            await db.commit()
+            return _job_to_dict(job)
+        except Exception as e:
+            print(f"Error updating job {job_id}: {e}")
+            await db.rollback()
+            return None
+
+
+async def _load_job(job_id: str, include_payload: bool = False) -> Optional[Dict]:
+    async with AsyncSessionLocal() as db:
+        job = await db.scalar(select(Job).where(Job.job_id == job_id))
+        return _job_to_dict(job, include_payload) if job else None
+
+
+async def _load_queued_jobs() -> List[Dict]:
+    async with AsyncSessionLocal() as db:
+        jobs = await db.scalars(
+            select(Job)
+            .where(Job.status == JOB_QUEUED)
+            .order_by(Job.created_at)
+        )
+        return [_job_to_dict(job, include_payload=True) for job in jobs]
+
+
+async def _claim_job(job_id: str, owner: str) -> Optional[Dict]:
+    """
+    Atomically move a queued job to running for this process
+
+    Returns:
+        The claimed job, or None if another worker process claimed it first
+    """
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        claimed = await db.execute(
+            update(Job)
+            .where(Job.job_id == job_id, Job.status == JOB_QUEUED)
+            .values(status=JOB_RUNNING, owner=owner, started_at=now, heartbeat_at=now)
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return None
+    return await _load_job(job_id)
+
+
+async def _release_jobs(owner: str, job_id: Optional[str] = None):
+    """Hand an owner's running jobs (or just ``job_id``) back to the queue"""
+    released = (Job.owner == owner) & (Job.status == JOB_RUNNING)
+    if job_id is not None:
+        released &= Job.job_id == job_id
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Job).where(released).values(status=JOB_QUEUED, owner=None))
+        await db.commit()
+
+
+async def _renew_leases(owner: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.owner == owner, Job.status == JOB_RUNNING)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        await db.commit()
+
+
+async def _reclaim_stale_jobs(lease_seconds: float) -> List[Dict]:
+    """
+    Re-queue running jobs whose owner stopped renewing its lease
+
+    Each job is reset with a conditional update, so when several processes
+    sweep at once only one of them gets (and enqueues) it.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=lease_seconds)
+    stale = (Job.status == JOB_RUNNING) & ((Job.heartbeat_at == None) | (Job.heartbeat_at < cutoff))  # noqa: E711
+    reclaimed = []
+    async with AsyncSessionLocal() as db:
+        job_ids = list(await db.scalars(select(Job.job_id).where(stale).order_by(Job.created_at)))
+        for job_id in job_ids:
+            reset = await db.execute(
+                update(Job)
+                .where(Job.job_id == job_id, stale)
+                .values(status=JOB_QUEUED, owner=None)
+            )
+            await db.commit()
+            if reset.rowcount == 1:
+                reclaimed.append(job_id)
+    return [job for job in [await _load_job(job_id, include_payload=True) for job_id in reclaimed] if job]
+
+
+class JobQueue:
+    """
+    Priority queue of AI jobs processed by a pool of asyncio workers
+    
+    Job state is persisted in the ``jobs`` table at every transition, so a
+    result is available from ``GET /api/v1/jobs/{id}`` even if the client
+    that submitted it has disconnected. Lower priority numbers run first;
+    jobs of equal priority run in submission order.
+    
+    Several worker processes can share the table: a job is claimed with a
+    conditional update before it runs, so it runs in one process only, and
+    the claiming process renews a lease on it while it runs. Queued jobs are
+    loaded on startup, and running jobs whose lease has expired (their
+    process crashed or restarted) are re-queued by whichever process sweeps
+    first. A job that cannot be started because the database is unavailable
+    stays queued and is retried after ``retry_delay`` seconds, doubling up
+    to the lease length.
+    """
+    
+    def __init__(self, worker_count: int, max_depth: int, lease_seconds: float, retry_delay: float):
+        self.worker_count = worker_count
+        self.max_depth = max_depth
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._handlers: Dict[str, JobHandler] = {}
+        self._prepare: Dict[str, PayloadHook] = {}
+        self._discard: Dict[str, PayloadHook] = {}
+        self._listeners: Set[JobListener] = set()
+        # Jobs queued or running in this process
+        self._active: Set[str] = set()
+        # Submissions holding a queue slot while their row is inserted
+        self._reserved = 0
+        self._workers: List[asyncio.Task] = []
+        # Jobs waiting to be re-queued after they could not be started
+        self._retrying: Set[asyncio.Task] = set()
+        self._sequence = itertools.count()
+    
+    def register(
+        self,
+        kind: str,
+        handler: JobHandler,
+        prepare: Optional[PayloadHook] = None,
+        discard: Optional[PayloadHook] = None
+    ):
+        """
+        Register the coroutine that runs jobs of one kind
+        
+        The handler is called as ``handler(payload, session_id, report_progress)``
+        and its return value (which must be JSON serializable) becomes the job result.
+        
+        Args:
+            kind: Job kind
+            handler: Coroutine that runs the job
+            prepare: Optional coroutine turning the submitted payload into the
+                one persisted (e.g. moving large data out of the jobs table);
+                it raises ValueError to reject the payload
+            discard: Optional coroutine releasing what ``prepare`` stored when
+                the job could not be persisted
+        """
+        self._handlers[kind] = handler
+        if prepare is not None:
+            self._prepare[kind] = prepare
+        if discard is not None:
+            self._discard[kind] = discard
+    
+    def add_listener(self, listener: JobListener):
+        """Receive a ``job_progress`` event for every job state change"""
+        self._listeners.add(listener)
+    
+    def remove_listener(self, listener: JobListener):
+        self._listeners.discard(listener)
+    
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting to run"""
+        return self._queue.qsize() if self._queue else 0
+    
+    def _enqueue(self, job: Dict):
+        # Unbounded: max_depth is enforced on submit, and persisted jobs are never dropped
+        self._queue.put_nowait((job["priority"], next(self._sequence), job["job_id"], job["kind"], job["session_id"], job["payload"]))
+        self._active.add(job["job_id"])
+    
+    async def start(self):
+        """Start the workers and pick up queued jobs and jobs whose lease expired"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        
+        for job in await _reclaim_stale_jobs(self.lease_seconds) + await _load_queued_jobs():
+            if job["job_id"] not in self._active:
+                self._enqueue(job)
+        
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._workers.append(asyncio.create_task(self._maintain_leases()))
+        print(f"⚙️ Job queue started with {self.worker_count} workers ({self.depth} jobs resumed)")
+    
+    async def stop(self):
+        """Stop the workers; unfinished jobs stay persisted and resume on next start"""
+        tasks = self._workers + list(self._retrying)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._retrying.clear()
+        self._active.clear()
+        try:
+            # Hand interrupted jobs straight back rather than waiting for the lease to expire
+            await _release_jobs(self.owner)
+        except Exception as e:
+            print(f"Error releasing running jobs: {e}")
+    
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict,
+        session_id: Optional[str] = None,
+        priority: Optional[int] = None,
+    ) -> Dict:
+        """
+        Persist and enqueue a job
+        
+        Raises:
+            UnknownJobKindError: If no handler is registered for ``kind``
+            InvalidJobPriorityError: If ``priority`` is not an integer from
+                MIN_PRIORITY to MAX_PRIORITY
+            InvalidJobPayloadError: If the kind's prepare hook rejects ``payload``
+            JobQueueFullError: If the queue is at JOB_QUEUE_MAX_DEPTH
+        """
+        if kind not in self._handlers:
+            raise UnknownJobKindError(f"Unknown job kind: {kind}")
+        priority = settings.JOB_DEFAULT_PRIORITY if priority is None else priority
+        if isinstance(priority, bool) or not isinstance(priority, int) or not MIN_PRIORITY <= priority <= MAX_PRIORITY:
+            raise InvalidJobPriorityError(f"Job priority must be an integer from {MIN_PRIORITY} to {MAX_PRIORITY}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self.depth + self._reserved >= self.max_depth:
+            raise JobQueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+        
+        # Hold the slot across the insert so concurrent submits cannot overfill the queue
+        self._reserved += 1
+        try:
+            if kind in self._prepare:
+                try:
+                    payload = await self._prepare[kind](payload)
+                except ValueError as e:
+                    raise InvalidJobPayloadError(str(e))
+            try:
+                job = await _insert_job(str(uuid.uuid4()), kind, payload, session_id, priority)
+            except Exception:
+                if kind in self._discard:
+                    await self._discard[kind](payload)
+                raise
+        finally:
+            self._reserved -= 1
+        self._enqueue({**job, "payload": payload})
+        await self._emit(job)
+        return job
+    
+    def is_active(self, job_id: str) -> bool:
+        """Whether a job is still queued or running in this process"""
+        return job_id in self._active
+    
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        """Current persisted state of a job"""
+        return await _load_job(job_id)
+    
+    async def _emit(self, job: Optional[Dict]):
+        if not job:
+            return
+        event = {"type": "job_progress", "data": job}
+        for listener in list(self._listeners):
+            try:
+                await listener(event)
+            except Exception as e:
+                print(f"Error delivering job event: {e}")
+    
+    async def _worker(self):
+        while True:
+            entry = await self._queue.get()
+            _, _, job_id, kind, session_id, payload = entry
+            try:
+                await self._run(job_id, kind, session_id, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The job row is still queued (or claimed by us): retry rather than lose it
+                print(f"⚠️ Job {job_id} ({kind}) could not be started: {e}; retrying in {self.retry_delay:.1f}s")
+                self._active.add(job_id)
+                task = asyncio.create_task(self._retry_later(entry))
+                self._retrying.add(task)
+                task.add_done_callback(self._retrying.discard)
+            finally:
+                self._queue.task_done()
+    
+    async def _retry_later(self, entry: tuple):
+        job_id = entry[2]
+        delay = self.retry_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                # The claim may have committed before the error; take it back first
+                await _release_jobs(self.owner, job_id)
+                break
+            except Exception as e:
+                delay = min(delay * 2, self.lease_seconds)
+                print(f"⚠️ Job {job_id} could not be re-queued: {e}; retrying in {delay:.1f}s")
+        self._queue.put_nowait(entry)
+    
+    async def _maintain_leases(self):
+        # Keep this process's running jobs leased and pick up jobs orphaned by other processes
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await _renew_leases(self.owner)
+                for job in await _reclaim_stale_jobs(self.lease_seconds):
+                    if job["job_id"] not in self._active:
+                        self._enqueue(job)
+            except Exception as e:
+                print(f"Error maintaining job leases: {e}")
+    
+    async def _run(self, job_id: str, kind: str, session_id: Optional[str], payload: Dict):
+        try:
+            job = await _claim_job(job_id, self.owner)
+            if job is None:
+                # Another worker process claimed it
+                return
+            await self._emit(job)
+            
+            async def report_progress(progress: Dict):
+                await self._emit(await _update_job(job_id, progress=progress))
+            
+            try:
+                result = await self._handlers[kind](payload, session_id, report_progress)
+                job = await _update_job(job_id, status=JOB_COMPLETED, result=result, finished_at=datetime.utcnow())
+            except asyncio.CancelledError:
+                # Shutting down; stop() hands the job back (or its lease expires if the process dies)
+                raise
+            except Exception as e:
+                print(f"Job {job_id} ({kind}) failed: {e}")
+                job = await _update_job(job_id, status=JOB_FAILED, error=str(e), finished_at=datetime.utcnow())
+        finally:
+            self._active.discard(job_id)
+        await self._emit(job)
+
+
+# Global job queue instance
+job_queue = JobQueue(
+    worker_count=settings.JOB_WORKERS,
+    max_depth=settings.JOB_QUEUE_MAX_DEPTH,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    retry_delay=settings.JOB_RETRY_DELAY
+)
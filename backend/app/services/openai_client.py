@@ -0,0 +1,203 @@
+"""
+Asynchronous OpenAI client construction and rate-governed request helpers
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import openai
+
+from ..core.config import settings
+from .rate_governor import RETRYABLE_ERRORS, backoff_delay, get_governor
+from .transcript_chunker import estimate_tokens
+
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def create_openai_client() -> openai.AsyncOpenAI:
+    """
+    Build an async OpenAI client over a pooled httpx connection set
+    
+    The service container creates one per process and shares it across SOAP,
+    summary and Whisper calls so keep-alive connections are reused.
+    """
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(
+            settings.OPENAI_TIMEOUT,
+            connect=settings.OPENAI_CONNECT_TIMEOUT,
+        ),
+    )
+    # Retries go through the rate governor so they respect the shared budget
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=0,
+        http_client=http_client,
+    )
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Limits the number of OpenAI requests in flight across the process"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENT_REQUESTS)
+    return _semaphore
+
+
+def _total_tokens(usage: Any) -> Optional[int]:
+    # Fields this SDK version does not model (usage on stream chunks) arrive as plain dicts
+    if isinstance(usage, dict):
+        return usage.get("total_tokens")
+    return getattr(usage, "total_tokens", None)
+
+
+class GovernedStream:
+    """
+    Streamed response that keeps its request slot until it is consumed
+    
+    The process-wide slot and the model's in-flight count are held until the
+    stream is exhausted, fails or is closed, and the token estimate is
+    reconciled with the usage reported in the final chunk. Use it as
+    ``async with stream:`` so an abandoned stream is closed too.
+    """
+    
+    def __init__(self, stream: openai.AsyncStream, release: Callable[[], None], governor, estimated_tokens: int):
+        self._stream = stream
+        self._release = release
+        self._governor = governor
+        self._estimated_tokens = estimated_tokens
+        self._used_tokens: Optional[int] = None
+        self._closed = False
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        try:
+            chunk = await self._stream.__anext__()
+        except BaseException:
+            # StopAsyncIteration included: the stream is finished either way
+            await self.close()
+            raise
+        used = _total_tokens(getattr(chunk, "usage", None))
+        if used is not None:
+            self._used_tokens = used
+        return chunk
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def close(self):
+        """Release the request slot and close the HTTP response"""
+        if self._closed:
+            return
+        self._closed = True
+        self._release()
+        if self._estimated_tokens:
+            # Without a usage chunk (e.g. closed early), keep the estimate charged
+            used = self._estimated_tokens if self._used_tokens is None else self._used_tokens
+            self._governor.reconcile(self._estimated_tokens, used)
+        await self._stream.response.aclose()
+
+
+async def openai_request(model: str, create: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+    """
+    Send an OpenAI request through the rate governor
+    
+    Waits for the model's request and token budget, sends the request, and
+    retries rate limits, connection errors and server errors up to
+    OPENAI_MAX_RETRIES times. A 429 pauses every caller of the model for the
+    retry-after period rather than just this one.
+    
+    Args:
+        model: Model the request is billed against
+        create: Zero-argument coroutine function that sends the request
+        estimated_tokens: Prompt plus expected completion tokens
+    
+    Returns:
+        The API response, or a GovernedStream for streamed responses
+    """
+    governor = get_governor(model)
+    semaphore = _get_semaphore()
+    
+    def release():
+        semaphore.release()
+        governor.in_flight -= 1
+    
+    for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+        await governor.acquire(estimated_tokens)
+        governor.in_flight += 1
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            governor.in_flight -= 1
+            raise
+        try:
+            response = await create()
+        except RETRYABLE_ERRORS as e:
+            release()
+            # The request did not run, so give its tokens back
+            governor.reconcile(estimated_tokens, 0)
+            if attempt >= settings.OPENAI_MAX_RETRIES:
+                raise
+            delay = backoff_delay(e, attempt)
+            print(f"⏳ OpenAI {model} {type(e).__name__}; retrying in {delay:.1f}s")
+            if isinstance(e, openai.RateLimitError):
+                governor.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            release()
+            raise
+        
+        if isinstance(response, openai.AsyncStream):
+            # The request is still running until the caller has read the stream
+            return GovernedStream(response, release, governor, estimated_tokens)
+        
+        release()
+        used = _total_tokens(getattr(response, "usage", None))
+        if used is not None and estimated_tokens:
+            governor.reconcile(estimated_tokens, used)
+        return response
+
+
+def estimate_chat_tokens(messages: List[Dict]) -> int:
+    """Prompt tokens for a chat request plus the completion reserve"""
+    prompt_tokens = sum(estimate_tokens(message.get("content") or "") + 4 for message in messages)
+    return prompt_tokens + settings.OPENAI_COMPLETION_TOKEN_RESERVE
+
+
+async def create_chat_completion(client: openai.AsyncOpenAI, **kwargs) -> Any:
+    """
+    ``client.chat.completions.create`` through the rate governor
+    
+    Streamed completions ask for a final usage chunk so the governor can
+    reconcile the token estimate; they are returned as a GovernedStream.
+    """
+    if kwargs.get("stream"):
+        # Passed as extra_body: this SDK version predates the stream_options argument
+        extra_body = dict(kwargs.pop("extra_body", None) or {})
+        extra_body.setdefault("stream_options", {"include_usage": True})
+        kwargs["extra_body"] = extra_body
+    return await openai_request(
+        kwargs["model"],
+        lambda: client.chat.completions.create(**kwargs),
+        estimate_chat_tokens(kwargs["messages"]),
+    )
+
+
+async def create_transcription(client: openai.AsyncOpenAI, **kwargs) -> Any:
+    """``client.audio.transcriptions.create`` through the rate governor"""
+    return await openai_request(
+        kwargs["model"],
+        lambda: client.audio.transcriptions.create(**kwargs),
+    )
@@ -0,0 +1,236 @@
+"""
+Pub/sub backends that fan WebSocket events out across worker processes
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional, Set, Union
+from urllib.parse import unquote, urlparse
+
+from ..core.config import settings
+
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+class PubSubBackend(ABC):
+    """
+    Interface used by WebSocketManager
+
+    Channels are subscribed while a process has at least one socket that
+    wants them; every published message is handed to ``handler(channel,
+    data)`` in each subscribed process, including the publisher's own.
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler):
+        """Begin delivering messages on subscribed channels to ``handler``"""
+
+    @abstractmethod
+    def subscribe(self, channel: str):
+        """Receive messages published on ``channel``"""
+
+    @abstractmethod
+    def unsubscribe(self, channel: str):
+        """Stop receiving messages published on ``channel``"""
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str):
+        """Deliver ``data`` to every process subscribed to ``channel``"""
+
+    async def close(self):
+        pass
+
+
+class InMemoryPubSub(PubSubBackend):
+    """Single-process backend: published messages are delivered directly"""
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+        self._channels: Set[str] = set()
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    def subscribe(self, channel: str):
+        self._channels.add(channel)
+
+    def unsubscribe(self, channel: str):
+        self._channels.discard(channel)
+
+    async def publish(self, channel: str, data: str):
+        if self._handler is not None and channel in self._channels:
+            await self._handler(channel, data)
+
+
+# RESP (REdis Serialization Protocol) helpers
+
+def encode_command(*args: Union[str, bytes]) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg.encode() if isinstance(arg, str) else arg
+        parts.append(f"${len(data)}\r\n".encode())
+        parts.append(data + b"\r\n")
+    return b"".join(parts)
+
+
+class RedisError(Exception):
+    """Error reply from the server"""
+    pass
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one RESP2 reply (bulk strings are returned as bytes)"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    prefix, payload = line[:1], line[1:-2]
+
+    if prefix == b"+":
+        return payload.decode()
+    if prefix == b"-":
+        raise RedisError(payload.decode())
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply from server: {line!r}")
+
+
+class RedisPubSub(PubSubBackend):
+    """
+    Cross-process backend speaking the Redis protocol over asyncio streams
+
+    Uses one connection for PUBLISH and one for subscriptions. The
+    subscriber reconnects with backoff and re-subscribes to every channel;
+    messages published while it is disconnected are not replayed (clients
+    resume from transcript chunk offsets and job state as after any
+    reconnect).
+    """
+
+    def __init__(self, url: str, reconnect_max: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.reconnect_max = reconnect_max
+        self._handler: Optional[MessageHandler] = None
+        self._channels: Set[str] = set()
+        self._subscriber: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._publisher: Optional[tuple] = None
+        self._publish_lock = asyncio.Lock()
+        self._closing = False
+        self.published = 0
+        self.received = 0
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            auth = (self.username, self.password) if self.username else (self.password,)
+            writer.write(encode_command("AUTH", *auth))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+        self._reader_task = asyncio.create_task(self._run_subscriber())
+
+    def _send_subscription(self, command: str, channels: List[str]):
+        # StreamWriter.write only buffers, so this is safe from sync callers
+        if self._subscriber is not None and channels:
+            self._subscriber.write(encode_command(command, *channels))
+
+    def subscribe(self, channel: str):
+        if channel not in self._channels:
+            self._channels.add(channel)
+            self._send_subscription("SUBSCRIBE", [channel])
+
+    def unsubscribe(self, channel: str):
+        if channel in self._channels:
+            self._channels.discard(channel)
+            self._send_subscription("UNSUBSCRIBE", [channel])
+
+    async def _run_subscriber(self):
+        delay = 0.1
+        while not self._closing:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                self._subscriber = writer
+                self._send_subscription("SUBSCRIBE", sorted(self._channels))
+                print(f"📡 Pub/sub connected to {self.host}:{self.port}")
+                delay = 0.1
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and reply and reply[0] == b"message":
+                        self.received += 1
+                        try:
+                            await self._handler(reply[1].decode(), reply[2].decode())
+                        except Exception as e:
+                            print(f"Error handling pub/sub message: {e}")
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ConnectionError, RedisError, asyncio.IncompleteReadError) as e:
+                if self._closing:
+                    break
+                print(f"Pub/sub connection lost ({e or type(e).__name__}); retrying in {delay:.1f}s")
+            finally:
+                self._subscriber = None
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def publish(self, channel: str, data: str):
+        async with self._publish_lock:
+            # One retry on a fresh connection if the cached one went away
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = await self._open()
+                    reader, writer = self._publisher
+                    writer.write(encode_command("PUBLISH", channel, data))
+                    await writer.drain()
+                    await read_reply(reader)
+                    self.published += 1
+                    return
+                except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+                    if self._publisher is not None:
+                        self._publisher[1].close()
+                        self._publisher = None
+                    if attempt:
+                        print(f"Error publishing to {channel}: {e or type(e).__name__}")
+                        raise
+
+    async def close(self):
+        self._closing = True
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+
+def create_pubsub() -> PubSubBackend:
+    """Backend selected by ``PUBSUB_BACKEND`` ("memory" or "redis")"""
+    if settings.PUBSUB_BACKEND == "redis":
+        return RedisPubSub(settings.REDIS_URL)
+    if settings.PUBSUB_BACKEND == "memory":
+        return InMemoryPubSub()
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {settings.PUBSUB_BACKEND}")
@@ -0,0 +1,164 @@
+"""
+QR code rendering with a two-tier cache and an off-loop worker pool
+"""
+
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import qrcode
+import qrcode.image.svg
+from PIL import Image, ImageDraw
+
+from ..core.config import settings
+from .cache import TieredCache, make_key
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def render_qr(data: str, fmt: str = "png", box_size: int = 10, border: int = 4) -> bytes:
+    """
+    Encode ``data`` as a QR code image
+
+    Runs in a worker process, so it only depends on its arguments.
+
+    Args:
+        data: Text to encode (the patient summary URL)
+        fmt: "png" or "svg"
+        box_size: Pixels per module (PNG only; SVG scales freely)
+        border: Quiet zone width in modules
+
+    Returns:
+        Encoded image bytes
+    """
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+        image_factory=qrcode.image.svg.SvgPathImage if fmt == "svg" else None,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        qr.make_image().save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def compose_pdf(pages: List[Tuple[bytes, str]]) -> bytes:
+    """
+    Lay out PNG QR codes as a printable PDF, one page per code
+
+    Runs in a worker process, so it only depends on its arguments.
+
+    Args:
+        pages: (PNG bytes, caption) per page
+
+    Returns:
+        PDF bytes
+    """
+    rendered = []
+    for png, caption in pages:
+        qr_image = Image.open(io.BytesIO(png)).convert("RGB")
+        page = Image.new("RGB", (qr_image.width, qr_image.height + 40), "white")
+        page.paste(qr_image, (0, 0))
+        ImageDraw.Draw(page).text((qr_image.width // 2, qr_image.height + 10), caption, fill="black", anchor="mt")
+        rendered.append(page)
+
+    buffer = io.BytesIO()
+    rendered[0].save(buffer, format="PDF", save_all=True, append_images=rendered[1:], resolution=150.0)
+    return buffer.getvalue()
+
+
+class QRRenderer:
+    """
+    Renders QR images in a process pool and caches the encoded bytes
+
+    Images are keyed by the encoded data and render parameters, so a QR code
+    is rendered once and every later fetch (any worker, after a restart via
+    the disk tier) returns the cached bytes without touching PIL.
+    """
+
+    def __init__(self, workers: int, memory_entries: int, max_disk_bytes: int):
+        self.workers = workers
+        self.cache = TieredCache("qr_codes", memory_entries, max_disk_bytes, raw=True)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.renders = 0
+
+    def executor(self) -> ProcessPoolExecutor:
+        """Worker pool, started on first use"""
+        if self._pool is None:
+            # spawn: forking a process that runs event loop and database threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def start(self):
+        """Launch the worker processes in the background so the first render does not wait for them"""
+        pool = self.executor()
+        for _ in range(self.workers):
+            pool.submit(int)
+
+    async def render(self, data: str, fmt: str = "png", box_size: int = 10, border: int = 4) -> bytes:
+        """
+        Cached QR image for ``data``
+
+        Args:
+            data: Text to encode
+            fmt: "png" or "svg"
+            box_size: Pixels per module
+            border: Quiet zone width in modules
+
+        Returns:
+            Encoded image bytes
+        """
+        async def compute() -> bytes:
+            self.renders += 1
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self.executor(), render_qr, data, fmt, box_size, border)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool next time and render this one on a thread
+                print("⚠️ QR render pool broken, restarting")
+                self._pool = None
+                return await asyncio.to_thread(render_qr, data, fmt, box_size, border)
+
+        return await self.cache.get_or_compute(make_key(data, fmt, box_size, border), compute)
+
+    async def render_pdf(self, pages: List[Tuple[bytes, str]]) -> bytes:
+        """Compose a multi-page PDF of rendered PNG codes in the worker pool (not cached)"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor(), compose_pdf, pages)
+        except BrokenProcessPool:
+            print("⚠️ QR render pool broken, restarting")
+            self._pool = None
+            return await asyncio.to_thread(compose_pdf, pages)
+
+    def close(self):
+        """Stop worker processes and close the disk tier (called on shutdown)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self.cache.disk is not None:
+            self.cache.disk.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "renders": self.renders}
+
+
+# Global QR renderer instance
+qr_renderer = QRRenderer(
+    workers=settings.QR_RENDER_WORKERS,
+    memory_entries=settings.QR_CACHE_MEMORY_ENTRIES,
+    max_disk_bytes=settings.QR_CACHE_MAX_DISK_BYTES
+)
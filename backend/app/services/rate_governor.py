@@ -0,0 +1,205 @@
+"""
+Process-wide rate governor that keeps OpenAI usage inside per-model quotas
+"""
+
+import asyncio
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+import openai
+
+from ..core.config import settings
+
+
+# Errors worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Budget of ``per_minute`` units that refills continuously; 0 means unlimited"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: int, now: float) -> float:
+        """Seconds until ``amount`` units can be taken"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole budget runs once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount: int, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.available -= min(amount, self.capacity)
+
+    def adjust(self, amount: int):
+        """Charge (positive) or refund (negative) units after the fact"""
+        if not self.unlimited:
+            self.available = min(self.capacity, self.available - amount)
+
+
+class ModelGovernor:
+    """
+    Admission control for one model
+
+    Callers are admitted strictly in arrival order once both the
+    requests-per-minute and tokens-per-minute buckets have room. A 429 pauses
+    admission for everyone waiting on the model, so the whole process backs
+    off together instead of each caller retrying on its own.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # asyncio.Lock hands off to waiters in FIFO order
+        self._lock = asyncio.Lock()
+        self._paused_until = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+        self.rate_limited = 0
+
+    async def acquire(self, tokens: int):
+        """Wait until a request estimated at ``tokens`` tokens may be sent"""
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    delay = max(
+                        self._paused_until - now,
+                        self.requests.wait_time(1, now),
+                        self.tokens.wait_time(tokens, now),
+                    )
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.requests.consume(1, now)
+                self.tokens.consume(tokens, now)
+        finally:
+            self.waiting -= 1
+
+    def reconcile(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage is known"""
+        self.tokens.adjust(actual - estimated)
+
+    def pause(self, seconds: float):
+        """Stop admitting requests for ``seconds`` (after a 429)"""
+        self.rate_limited += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "model": self.model,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "rate_limited": self.rate_limited,
+            "paused_for": round(max(0.0, self._paused_until - now), 2),
+            "requests_available": None if self.requests.unlimited else int(self.requests.available),
+            "tokens_available": None if self.tokens.unlimited else int(self.tokens.available)
+        }
+
+
+_governors: Dict[str, ModelGovernor] = {}
+
+
+def get_governor(model: str) -> ModelGovernor:
+    """Get the governor for a model, creating it from OPENAI_RATE_LIMITS on first use"""
+    governor = _governors.get(model)
+    if governor is None:
+        limits = settings.OPENAI_RATE_LIMITS.get(model, {})
+        governor = ModelGovernor(
+            model,
+            rpm=limits.get("rpm", settings.OPENAI_DEFAULT_RPM),
+            tpm=limits.get("tpm", settings.OPENAI_DEFAULT_TPM),
+        )
+        _governors[model] = governor
+    return governor
+
+
+def governor_stats() -> List[Dict]:
+    """Queue depth and remaining budget for every model used so far"""
+    return [governor.stats() for governor in _governors.values()]
+
+
+# Units of the x-ratelimit-reset-* durations, e.g. "20ms", "1s", "6m0s"
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Seconds in a duration such as "1m30.5s", or None if it does not parse"""
+    value = value.strip()
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the API asked us to wait
+
+    Uses retry-after(-ms) when present, otherwise the x-ratelimit-reset-*
+    header of each exhausted budget (requests or tokens).
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # retry-after may also be an HTTP date; try the reset headers instead
+        pass
+
+    resets = []
+    for budget in ("requests", "tokens"):
+        reset = headers.get(f"x-ratelimit-reset-{budget}")
+        if reset and headers.get(f"x-ratelimit-remaining-{budget}") == "0":
+            seconds = _parse_duration(reset)
+            if seconds is not None:
+                resets.append(seconds)
+    return max(resets) if resets else None
+
+
+def backoff_delay(error: Exception, attempt: int) -> float:
+    """
+    Delay before retrying after ``error`` on the given (zero-based) attempt
+
+    Honors retry-after (or the reset time of the exhausted rate limit) when
+    present, otherwise backs off exponentially. Up to
+    50% jitter is added so callers in different processes do not retry in
+    lockstep; the result is never shorter than what the server asked for.
+    """
+    delay = _retry_after(error)
+    if delay is None:
+        delay = settings.OPENAI_BACKOFF_BASE * (2 ** attempt)
+    delay = min(delay, settings.OPENAI_BACKOFF_MAX)
+    return delay + random.uniform(0, delay * 0.5)
@@ -0,0 +1,207 @@
+"""
+Read-through cache of serialized session reads, invalidated on writes
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+from ..core.config import settings
+from ..models.database import Session
+from .cache import LRUCache
+
+
+@dataclass(frozen=True)
+class CachedRead:
+    """A serialized response body and the validators derived from updated_at"""
+    body: bytes
+    etag: str
+    last_modified: datetime
+    stored_at: float
+
+
+def make_etag(view: str, session_id: str, updated_at: datetime) -> str:
+    """Strong ETag for one representation of a session at a given updated_at"""
+    digest = hashlib.sha1(f"{view}:{session_id}:{updated_at.isoformat()}".encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def encode_body(payload: Dict[str, Any]) -> bytes:
+    """Serialize a payload the same way FastAPI's JSONResponse does"""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class SessionReadCache:
+    """
+    Serialized session reads keyed by view and session ID
+
+    Each view (the full session, the public patient summary) is cached
+    separately. Entries are dropped when a write to the session commits,
+    and a read that was loading while any write committed is served but not
+    stored. Once ``share_invalidations`` is set up, the session IDs are also
+    published so other worker processes drop their entries. ``ttl`` bounds
+    how stale an entry can get from writes nobody announces (seed scripts,
+    messages lost while the pub/sub backend reconnects).
+    """
+
+    VIEWS = ("session", "patient_summary")
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.ttl = ttl
+        self.entries = LRUCache(max_entries)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._publish: Optional[Callable[[str], Awaitable[Any]]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._publishing: Set[asyncio.Task] = set()
+
+    def get(self, view: str, session_id: str) -> Optional[CachedRead]:
+        key = f"{view}:{session_id}"
+        cached = self.entries.get(key)
+        if cached is not None and time.monotonic() - cached.stored_at > self.ttl:
+            self.entries.delete(key)
+            cached = None
+
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def put(
+        self,
+        view: str,
+        session_id: str,
+        payload: Dict[str, Any],
+        updated_at: datetime,
+        store: bool = True
+    ) -> CachedRead:
+        cached = CachedRead(
+            body=encode_body(payload),
+            etag=make_etag(view, session_id, updated_at),
+            last_modified=updated_at,
+            stored_at=time.monotonic()
+        )
+        if store:
+            self.entries.set(f"{view}:{session_id}", cached)
+        return cached
+
+    async def get_or_load(
+        self,
+        view: str,
+        session_id: str,
+        load: Callable[[], Awaitable[Tuple[Dict[str, Any], datetime]]]
+    ) -> CachedRead:
+        """
+        Return the cached read or load, serialize and cache it
+
+        Args:
+            view: Representation name (one of VIEWS)
+            session_id: Session the representation belongs to
+            load: Coroutine factory returning ``(payload, updated_at)``; it
+                raises HTTPException when the resource does not exist, and
+                errors are never cached
+        """
+        cached = self.get(view, session_id)
+        if cached is None:
+            generation = self.generation
+            payload, updated_at = await load()
+            # A write committed while loading: the row read may predate it
+            cached = self.put(view, session_id, payload, updated_at, store=self.generation == generation)
+        return cached
+
+    def invalidate(self, session_ids: Iterable[str]):
+        """Drop a session's entries here and, when shared, in every other worker"""
+        session_ids = list(session_ids)
+        self._drop(session_ids)
+        if self._publish is not None and session_ids:
+            # Writes can commit on a threadpool thread (sync ORM sessions)
+            self._loop.call_soon_threadsafe(self._start_publish, session_ids)
+
+    def _drop(self, session_ids: List[str]):
+        self.generation += 1
+        for session_id in session_ids:
+            for view in self.VIEWS:
+                self.entries.delete(f"{view}:{session_id}")
+
+    def share_invalidations(self, publish: Callable[[str], Awaitable[Any]]):
+        """
+        Announce invalidations to the other worker processes
+
+        Must be called from the event loop. Each worker should pass the
+        messages it receives to ``receive_invalidation``.
+
+        Args:
+            publish: Coroutine function delivering a message to every worker
+        """
+        self._loop = asyncio.get_running_loop()
+        self._publish = publish
+
+    def _start_publish(self, session_ids: List[str]):
+        task = self._loop.create_task(self._publish(json.dumps(session_ids)))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def receive_invalidation(self, data: str):
+        """Drop entries invalidated by a write in any worker (including this one)"""
+        self._drop(json.loads(data))
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "namespace": "session_reads",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.entries)
+        }
+
+
+# Global session read cache instance
+session_read_cache = SessionReadCache(
+    max_entries=settings.SESSION_READ_CACHE_ENTRIES,
+    ttl=settings.SESSION_READ_CACHE_TTL
+)
+
+
+# ORM writes (endpoints, update_session_fields_async, QR generation) are tracked per
+# unit of work and invalidated once they commit, so a concurrent read cannot
+# re-cache the old row between flush and commit. Bulk Core updates (write
+# coalescer, transcript chunk writer) invalidate explicitly after committing.
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_written_sessions(db: OrmSession, flush_context):
+    written = db.info.setdefault("written_session_ids", set())
+    for instance in (*db.new, *db.dirty, *db.deleted):
+        if isinstance(instance, Session) and instance.session_id:
+            written.add(instance.session_id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_committed(db: OrmSession):
+    written = db.info.pop("written_session_ids", None)
+    if written:
+        session_read_cache.invalidate(written)
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _discard_rolled_back(db: OrmSession, previous_transaction):
+    db.info.pop("written_session_ids", None)
@@ -0,0 +1,100 @@
+"""
+Full-text search over session transcripts, SOAP notes and patient summaries
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import Session
+
+
+# Relative weight of a match in each indexed column (transcript, soap_note, patient_summary)
+COLUMN_WEIGHTS = (1.0, 2.0, 1.5)
+
+SNIPPET_TOKENS = 16
+
+_fts = table("sessions_fts", column("rowid"))
+_fts_ref = literal_column("sessions_fts")
+
+_TERM = re.compile(r"[\w']+\*?")
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression
+
+    Every word is quoted so FTS5 operators and punctuation in user input
+    cannot cause syntax errors; all words must match. A trailing ``*`` on a
+    word keeps prefix matching (``albut*``).
+
+    Returns:
+        MATCH expression, or None if the query has no searchable words
+    """
+    terms = []
+    for term in _TERM.findall(query):
+        prefix = term.endswith("*")
+        word = term.rstrip("*").replace('"', "")
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+async def search_sessions(
+    db: AsyncSession,
+    query: str,
+    doctor_name: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Dict]:
+    """
+    Rank sessions matching ``query`` with BM25 and return highlighted snippets
+
+    Args:
+        db: Async database session
+        query: Free-text search query
+        doctor_name: Only return this doctor's sessions
+        limit: Maximum number of results
+        offset: Number of ranked results to skip
+
+    Returns:
+        Results ordered best match first
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    score = func.bm25(_fts_ref, *COLUMN_WEIGHTS).label("score")
+    snippet = func.snippet(_fts_ref, -1, "<mark>", "</mark>", "…", SNIPPET_TOKENS).label("snippet")
+
+    statement = (
+        select(
+            Session.session_id,
+            Session.doctor_name,
+            Session.patient_name,
+            Session.created_at,
+            score,
+            snippet,
+        )
+        .select_from(_fts.join(Session, Session.id == _fts.c.rowid))
+        .where(_fts_ref.op("MATCH")(match))
+    )
+    if doctor_name:
+        statement = statement.where(Session.doctor_name == doctor_name)
+    statement = statement.order_by(score).limit(limit).offset(offset)
+
+    rows = (await db.execute(statement)).all()
+    return [
+        {
+            "session_id": row.session_id,
+            "doctor_name": row.doctor_name,
+            "patient_name": row.patient_name,
+            "created_at": row.created_at,
+            # bm25() is lower-is-better; report higher-is-better
+            "score": round(-row.score, 4),
+            "snippet": row.snippet
+        }
+        for row in rows
+    ]
@@ -0,0 +1,157 @@
+"""
+Rolling-chunk streaming transcription with overlap stitching
+"""
+
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from .transcription_service import TranscriptionService
+
+
+# Number of trailing words considered when looking for the overlap between chunks
+OVERLAP_WINDOW_WORDS = 25
+
+# Minimum number of matching words before an overlap is trusted
+MIN_OVERLAP_WORDS = 2
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch_overlap(previous: str, current: str) -> str:
+    """
+    Remove the text at the start of a chunk that repeats the end of the transcript so far
+
+    Consecutive chunks are recorded with a short audio overlap so no words are
+    cut in half at chunk boundaries. Whisper therefore transcribes the overlap
+    twice; this finds the longest run of words that ends ``previous`` and starts
+    ``current`` and drops it from ``current``.
+
+    Args:
+        previous: Transcript stitched so far
+        current: Transcript of the newly arrived chunk
+
+    Returns:
+        The part of ``current`` that is not already in ``previous``
+    """
+    current_words = current.split()
+    previous_words = previous.split()[-OVERLAP_WINDOW_WORDS:]
+    if not current_words or not previous_words:
+        return current.strip()
+
+    previous_norm = [_normalize_word(w) for w in previous_words]
+    current_norm = [_normalize_word(w) for w in current_words[:OVERLAP_WINDOW_WORDS]]
+
+    for size in range(min(len(previous_norm), len(current_norm)), MIN_OVERLAP_WORDS - 1, -1):
+        if previous_norm[-size:] == current_norm[:size]:
+            return " ".join(current_words[size:])
+
+    return " ".join(current_words)
+
+
+class TranscriptStream:
+    """
+    Transcribes audio chunks as they arrive and emits stitched partial transcripts
+
+    Chunks are transcribed concurrently, but partial results are always emitted
+    in sequence order so the transcript only ever grows at the end. A chunk
+    resent after a reconnect or retry is ignored if its seq was already
+    received or emitted.
+    """
+
+    def __init__(
+        self,
+        transcription_service: TranscriptionService,
+        on_partial: Callable[[Dict], Awaitable[None]],
+    ):
+        self.transcription_service = transcription_service
+        self.on_partial = on_partial
+        self._segments: List[str] = []
+        self._results: Dict[int, str] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # Seqs received and not yet emitted
+        self._scheduled: Set[int] = set()
+        self._next_seq = 0
+        self._received = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def text(self) -> str:
+        """Transcript stitched so far"""
+        return " ".join(self._segments)
+
+    @property
+    def pending(self) -> int:
+        """Chunks still being transcribed"""
+        return len(self._tasks)
+
+    def add_chunk(self, audio_bytes: bytes, seq: Optional[int] = None, filename: str = "audio.webm") -> bool:
+        """
+        Schedule transcription of one audio chunk
+
+        Args:
+            audio_bytes: Raw audio file contents of the chunk
+            seq: Position of the chunk in the recording (defaults to arrival order)
+            filename: Name sent to Whisper; its extension tells the API the audio format
+
+        Returns:
+            False if the chunk is a duplicate of one already received
+        """
+        if seq is None:
+            seq = self._received
+        if seq < self._next_seq or seq in self._scheduled:
+            return False
+        self._scheduled.add(seq)
+        self._received = max(self._received, seq + 1)
+
+        task = asyncio.create_task(self._transcribe(seq, audio_bytes, filename))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _transcribe(self, seq: int, audio_bytes: bytes, filename: str):
+        text = await self.transcription_service.transcribe_bytes(audio_bytes, filename)
+        if seq < self._next_seq:
+            # The stream skipped past this chunk while it was transcribed
+            return
+        self._results[seq] = text or ""
+        await self._emit_ready()
+
+    async def _emit_ready(self, force: bool = False):
+        async with self._lock:
+            while self._results:
+                if self._next_seq not in self._results:
+                    if not force:
+                        break
+                    # A chunk never arrived; skip the gap once the stream is finished
+                    # (results are never below _next_seq, so this only moves forward)
+                    self._next_seq = max(self._next_seq, min(self._results))
+
+                seq = self._next_seq
+                self._scheduled.discard(seq)
+                chunk_text = stitch_overlap(self.text, self._results.pop(seq))
+                if chunk_text:
+                    self._segments.append(chunk_text)
+                self._next_seq += 1
+
+                await self.on_partial({
+                    "seq": seq,
+                    "text": chunk_text,
+                    "transcript": self.text
+                })
+
+    async def finish(self) -> str:
+        """
+        Wait for all outstanding chunks and return the complete transcript
+        """
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        await self._emit_ready(force=True)
+        return self.text
+
+    def cancel(self):
+        """Stop transcribing outstanding chunks (e.g. when the client disconnects)"""
+        for task in list(self._tasks):
+            task.cancel()
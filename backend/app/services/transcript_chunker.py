@@ -0,0 +1,102 @@
+"""
+Token-budgeted splitting of long transcripts into speaker-turn-aligned windows
+"""
+
+import re
+from typing import List
+
+
+# Rough average for English clinical conversation; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# A line starting a new speaker turn, e.g. "Doctor:", "Patient:", "Dr. Smith:"
+_SPEAKER_TURN = re.compile(r"^\s*[A-Z][\w .'\-]{0,40}:\s", re.MULTILINE)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of model tokens in a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_turns(transcript: str) -> List[str]:
+    """
+    Split a transcript into speaker turns
+
+    Transcripts with "Speaker:" prefixes are split at each new speaker;
+    otherwise paragraphs (blank-line separated) are used as turns.
+    """
+    starts = [match.start() for match in _SPEAKER_TURN.finditer(transcript)]
+    if len(starts) > 1:
+        if starts[0] != 0:
+            starts.insert(0, 0)
+        bounds = starts + [len(transcript)]
+        turns = [transcript[a:b].strip() for a, b in zip(bounds, bounds[1:])]
+    else:
+        turns = [paragraph.strip() for paragraph in re.split(r"\n\s*\n", transcript)]
+    return [turn for turn in turns if turn]
+
+
+def _split_oversized(turn: str, max_tokens: int) -> List[str]:
+    """Break a single turn that exceeds the budget at sentence boundaries"""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(turn):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+
+    # A single run-on sentence can still be too long; fall back to hard cuts
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    result = []
+    for piece in pieces:
+        result.extend(piece[i:i + max_chars] for i in range(0, len(piece), max_chars))
+    return result
+
+
+def chunk_transcript(transcript: str, max_tokens: int, overlap_turns: int = 0) -> List[str]:
+    """
+    Pack speaker turns into windows that each fit within ``max_tokens``
+
+    Windows never split a turn unless the turn alone is over budget. The last
+    ``overlap_turns`` turns of each window are repeated at the start of the next
+    so context carried across a boundary (e.g. a question and its answer) is
+    not lost.
+
+    Returns:
+        List of transcript windows, in order
+    """
+    turns: List[str] = []
+    for turn in split_turns(transcript):
+        if estimate_tokens(turn) > max_tokens:
+            turns.extend(_split_oversized(turn, max_tokens))
+        else:
+            turns.append(turn)
+
+    windows: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    new_turns = 0
+    for turn in turns:
+        turn_tokens = estimate_tokens(turn) + 1
+        if current and new_turns and current_tokens + turn_tokens > max_tokens:
+            windows.append("\n\n".join(current))
+            current = current[-overlap_turns:] if overlap_turns else []
+            current_tokens = sum(estimate_tokens(t) + 1 for t in current)
+            new_turns = 0
+            # Drop overlap that would not leave room for the next turn
+            while current and current_tokens + turn_tokens > max_tokens:
+                current_tokens -= estimate_tokens(current.pop(0)) + 1
+        current.append(turn)
+        current_tokens += turn_tokens
+        new_turns += 1
+
+    if current and new_turns:
+        windows.append("\n\n".join(current))
+    return windows
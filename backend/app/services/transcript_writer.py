@@ -0,0 +1,212 @@
+"""
+Batched writer that persists live transcript chunks
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import case, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..core.config import settings
+from ..models.database import AsyncSessionLocal, Session, TranscriptChunk
+from .session_cache import session_read_cache
+
+
+# Attempts at a flush transaction that collided with another process's chunks
+FLUSH_ATTEMPTS = 3
+
+
+def join_chunks(texts: List[str]) -> str:
+    """Reassemble chunk texts into transcript text"""
+    return " ".join(text.strip() for text in texts if text and text.strip())
+
+
+class TranscriptChunkWriter:
+    """
+    Appends transcript chunks to ``transcript_chunks`` in batches
+
+    Buffered chunks are written in one transaction once ``flush_size`` are
+    waiting or the oldest has waited ``flush_interval`` seconds; the same
+    transaction appends the text to ``sessions.transcript`` so the full
+    transcript stays current without clients re-uploading it.
+
+    Each chunk's ``seq`` (the offset clients resume from) is allocated by the
+    database as the row is inserted, so worker processes writing to the same
+    session never hand out the same number. A caller that needs the ``seq``
+    waits for the chunk to be committed; waiting chunks are flushed right away
+    together with whatever else is buffered.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict] = []
+        self._waiters: List[Optional[asyncio.Future]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[asyncio.Task] = None
+        # Flushes started by append; the loop only keeps weak references to tasks
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def append(
+        self,
+        session_id: str,
+        text: str,
+        confidence: Optional[str] = None,
+        wait: bool = False
+    ) -> Optional[int]:
+        """
+        Buffer a chunk for a session
+
+        Args:
+            session_id: Session the chunk belongs to
+            text: Newly transcribed text
+            confidence: Optional Whisper confidence
+            wait: Flush now and return only after the chunk has been committed
+
+        Returns:
+            The chunk's sequence number within the session when ``wait`` is
+            set, otherwise None
+
+        Raises:
+            Exception: The database error, if the chunk could not be written (``wait`` only)
+        """
+        self._buffer.append({
+            "session_id": session_id,
+            "chunk_text": text,
+            "confidence": confidence,
+            "timestamp": datetime.utcnow()
+        })
+
+        future = None
+        if wait:
+            future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+
+        if wait or len(self._buffer) >= self.flush_size:
+            flush = asyncio.create_task(self.flush())
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flush_done)
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+        if future is None:
+            return None
+        return await asyncio.shield(future)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error flushing transcript chunks: {task.exception()}")
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Write every buffered chunk now"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            rows, waiters = self._buffer, self._waiters
+            self._buffer, self._waiters = [], []
+            if not rows:
+                return
+
+            appended: Dict[str, List[str]] = {}
+            for row in rows:
+                appended.setdefault(row["session_id"], []).append(row["chunk_text"])
+
+            seqs: List[int] = []
+            error = None
+            for _ in range(FLUSH_ATTEMPTS):
+                try:
+                    seqs = await self._write(rows, appended)
+                    error = None
+                    break
+                except IntegrityError as e:
+                    # Another process took the same seq between our read and insert; retry
+                    error = e
+                except Exception as e:
+                    error = e
+                    break
+
+            if error is None:
+                session_read_cache.invalidate(appended)
+            else:
+                print(f"Error writing {len(rows)} transcript chunks: {error}")
+
+            for future, seq in zip(waiters, seqs or [None] * len(waiters)):
+                if future is None or future.done():
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(seq)
+
+    @staticmethod
+    async def _write(rows: List[Dict], appended: Dict[str, List[str]]) -> List[int]:
+        seqs = []
+        async with AsyncSessionLocal() as db:
+            async with db.begin():
+                # Each insert reads the session's highest seq in the same
+                # statement, and the first one takes the write lock for the
+                # rest of the transaction
+                for row in rows:
+                    next_seq = select(
+                        literal(row["session_id"]),
+                        func.coalesce(func.max(TranscriptChunk.seq), -1) + 1,
+                        literal(row["chunk_text"]),
+                        literal(row["confidence"]),
+                        literal(row["timestamp"])
+                    ).where(TranscriptChunk.session_id == row["session_id"])
+                    seq = await db.scalar(
+                        insert(TranscriptChunk)
+                        .from_select(["session_id", "seq", "chunk_text", "confidence", "timestamp"], next_seq)
+                        .returning(TranscriptChunk.seq)
+                    )
+                    seqs.append(seq)
+
+                now = datetime.utcnow()
+                for session_id, texts in appended.items():
+                    text = join_chunks(texts)
+                    await db.execute(
+                        update(Session)
+                        .where(Session.session_id == session_id)
+                        .values(
+                            transcript=case(
+                                (func.coalesce(Session.transcript, "") == "", text),
+                                else_=Session.transcript + " " + text
+                            ),
+                            updated_at=now
+                        )
+                    )
+        return seqs
+
+    async def close(self):
+        """Flush outstanding chunks (called on shutdown)"""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+
+
+async def load_chunks(session_id: str, offset: int = 0) -> List[TranscriptChunk]:
+    """Chunks for a session with ``seq >= offset``, in order"""
+    async with AsyncSessionLocal() as db:
+        chunks = await db.scalars(
+            select(TranscriptChunk)
+            .where(TranscriptChunk.session_id == session_id, TranscriptChunk.seq >= offset)
+            .order_by(TranscriptChunk.seq)
+        )
+        return list(chunks)
+
+
+# Global transcript chunk writer instance
+transcript_writer = TranscriptChunkWriter(
+    flush_size=settings.TRANSCRIPT_CHUNK_FLUSH_SIZE,
+    flush_interval=settings.TRANSCRIPT_CHUNK_FLUSH_INTERVAL
+)
@@ -2,21 +2,78 @@
 OpenAI Whisper integration for audio transcription
 """
 
-import openai
+import asyncio
 import base64
-import io
-import tempfile
 import os
-from typing import Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 from ..core.config import settings
+from openai import AsyncOpenAI
+from .openai_client import create_transcription
+from .audio_segmenter import AudioDecodeError, AudioSegment, segment_audio
+from .cache import TieredCache, hash_bytes, make_key
+
+
+def _api_key_configured() -> bool:
+    return bool(settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "your_openai_api_key_here")
+
+
+def _segment_field(segment, key: str):
+    """Read a field from a Whisper segment, which may be a dict or an object"""
+    if isinstance(segment, dict):
+        return segment.get(key)
+    return getattr(segment, key, None)
+
+
+def decode_audio(audio_data: str, max_size: Optional[int] = None) -> bytes:
+    """
+    Decode base64 audio, enforcing a size limit before decoding
+    
+    Args:
+        audio_data: Base64 encoded audio
+        max_size: Limit in decoded bytes (defaults to MAX_AUDIO_FILE_SIZE)
+    
+    Raises:
+        ValueError: If the decoded audio would exceed the limit, or the data is not valid base64
+    """
+    max_size = max_size or settings.MAX_AUDIO_FILE_SIZE
+    if len(audio_data) * 3 // 4 > max_size:
+        raise ValueError(f"Audio exceeds maximum size of {max_size} bytes")
+    return base64.b64decode(audio_data)
 
 
 class TranscriptionService:
     """Service for handling audio transcription with OpenAI Whisper"""
     
-    def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+        self.cache = TieredCache(
+            "transcription",
+            memory_entries=settings.TRANSCRIPTION_CACHE_MEMORY_ENTRIES,
+            max_disk_bytes=settings.TRANSCRIPTION_CACHE_MAX_DISK_BYTES
+        ) if settings.TRANSCRIPTION_CACHE_ENABLED else None
+    
+    def close(self):
+        """Release the transcription cache's disk tier"""
+        if self.cache is not None:
+            self.cache.close()
+    
+    async def _cached(
+        self,
+        kind: str,
+        audio_bytes: bytes,
+        compute: Callable[[], Awaitable],
+        should_cache: Callable[[object], bool] = lambda result: result is not None
+    ):
+        """
+        Serve a transcription from the cache, keyed by audio content and model
+        
+        Identical audio re-sent after a reconnect or retry is answered without
+        another Whisper call; failed transcriptions (None) are never cached.
+        """
+        if self.cache is None:
+            return await compute()
+        key = make_key(kind, settings.WHISPER_MODEL, hash_bytes(audio_bytes))
+        return await self.cache.get_or_compute(key, compute, should_cache)
     
     async def transcribe_chunk(self, audio_data: str) -> Optional[str]:
         """
@@ -25,45 +82,60 @@ class TranscriptionService:
         Args:
             audio_data: Base64 encoded audio data
             
+        Returns:
+            Transcribed text or None if transcription fails
+        """
+        try:
+            audio_bytes = decode_audio(audio_data)
+        except Exception as e:
+            print(f"Error decoding audio chunk: {e}")
+            print(f"Audio data length: {len(audio_data) if audio_data else 0}")
+            return None
+        
+        return await self.transcribe_bytes(audio_bytes)
+    
+    async def transcribe_bytes(self, audio_bytes: bytes, filename: str = "audio.webm") -> Optional[str]:
+        """
+        Transcribe raw audio bytes held in memory
+        
+        Args:
+            audio_bytes: Raw audio file contents
+            filename: Name sent to Whisper; its extension tells the API the audio format
+        
         Returns:
             Transcribed text or None if transcription fails
         """
         try:
             # Check if API key is set
-            if not settings.OPENAI_API_KEY or settings.OPENAI_API_KEY == "your_openai_api_key_here":
+            if not _api_key_configured():
                 print("Error: OpenAI API key not set properly")
                 return None
             
-            # Decode base64 audio data
-            audio_bytes = base64.b64decode(audio_data)
-            
             # Check audio size (minimum 1KB for meaningful audio)
             if len(audio_bytes) < 1024:
                 print(f"Audio chunk too small: {len(audio_bytes)} bytes")
                 return None
             
-            # Create temporary file for Whisper API
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_file:
-                temp_file.write(audio_bytes)
-                temp_file.flush()
-                
-                # Transcribe using Whisper
-                with open(temp_file.name, 'rb') as audio_file:
-                    transcript = self.client.audio.transcriptions.create(
-                        model=settings.WHISPER_MODEL,
-                        file=audio_file,
-                        response_format="text"
-                    )
-                
-                # Clean up temporary file
-                os.unlink(temp_file.name)
+            if len(audio_bytes) > settings.MAX_AUDIO_FILE_SIZE:
+                print(f"Audio too large: {len(audio_bytes)} bytes")
+                return None
                 
+            async def transcribe() -> Optional[str]:
+                # Transcribe using Whisper straight from memory
+                transcript = await create_transcription(
+                    self.client,
+                    model=settings.WHISPER_MODEL,
+                    file=(filename, audio_bytes),
+                    response_format="text"
+                )
                 return transcript.strip() if transcript else None
                 
+            return await self._cached("text", audio_bytes, transcribe)
+                
         except Exception as e:
             print(f"Error transcribing audio chunk: {e}")
-            print(f"Audio data length: {len(audio_data) if audio_data else 0}")
-            print(f"API key present: {bool(settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != 'your_openai_api_key_here')}")
+            print(f"Audio data length: {len(audio_bytes) if audio_bytes else 0}")
+            print(f"API key present: {_api_key_configured()}")
             return None
     
     async def transcribe_file(self, file_path: str) -> Optional[str]:
@@ -77,12 +149,16 @@ class TranscriptionService:
             Complete transcription or None if transcription fails
         """
         try:
+            # Read up front so a retried request re-sends the whole file
             with open(file_path, 'rb') as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model=settings.WHISPER_MODEL,
-                    file=audio_file,
-                    response_format="text"
-                )
+                audio_bytes = audio_file.read()
+            
+            transcript = await create_transcription(
+                self.client,
+                model=settings.WHISPER_MODEL,
+                file=(os.path.basename(file_path), audio_bytes),
+                response_format="text"
+            )
             
             return transcript.strip() if transcript else None
             
@@ -101,24 +177,37 @@ class TranscriptionService:
             Dict with transcription and timing info
         """
         try:
-            # Decode base64 audio data
-            audio_bytes = base64.b64decode(audio_data)
+            audio_bytes = decode_audio(audio_data)
+        except Exception as e:
+            print(f"Error decoding audio: {e}")
+            return None
             
-            # Create temporary file for Whisper API
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_file:
-                temp_file.write(audio_bytes)
-                temp_file.flush()
+        return await self.transcribe_bytes_with_timestamps(audio_bytes)
                 
+    async def transcribe_bytes_with_timestamps(self, audio_bytes: bytes, filename: str = "audio.webm") -> Optional[dict]:
+        """
+        Transcribe raw audio bytes with timestamp information
+        
+        Args:
+            audio_bytes: Raw audio file contents
+            filename: Name sent to Whisper; its extension tells the API the audio format
+        
+        Returns:
+            Dict with transcription and timing info
+        """
+        if len(audio_bytes) > settings.MAX_AUDIO_FILE_SIZE:
+            print(f"Audio too large for one request: {len(audio_bytes)} bytes")
+            return None
+        
+        try:
+            async def transcribe() -> dict:
                 # Transcribe with verbose JSON response
-                with open(temp_file.name, 'rb') as audio_file:
-                    response = self.client.audio.transcriptions.create(
-                        model=settings.WHISPER_MODEL,
-                        file=audio_file,
-                        response_format="verbose_json"
-                    )
-                
-                # Clean up temporary file
-                os.unlink(temp_file.name)
+                response = await create_transcription(
+                    self.client,
+                    model=settings.WHISPER_MODEL,
+                    file=(filename, audio_bytes),
+                    response_format="verbose_json"
+                )
                 
                 return {
                     "text": response.text,
@@ -126,6 +215,132 @@ class TranscriptionService:
                     "language": response.language if hasattr(response, 'language') else "en"
                 }
                 
+            return await self._cached("verbose_json", audio_bytes, transcribe)
+        
         except Exception as e:
             print(f"Error transcribing with timestamps: {e}")
             return None
+
+    async def transcribe_long_audio(
+        self,
+        audio_bytes: bytes,
+        filename: str = "audio.webm",
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> Optional[dict]:
+        """
+        Transcribe a long recording by splitting it into segments transcribed in parallel
+        
+        The recording is cut at quiet points into overlapping segments, each
+        segment is sent to Whisper concurrently (up to LONG_AUDIO_MAX_CONCURRENCY),
+        and the results are stitched back together on the segment timestamps so
+        words heard in two overlapping segments are only kept once.
+        
+        Args:
+            audio_bytes: Raw audio file contents
+            filename: Name sent to Whisper; its extension tells the API the audio format
+            on_progress: Optional callback receiving (completed segments, total segments)
+        
+        Returns:
+            Dict with transcription and timing info, or None if transcription fails.
+            If some segments failed, ``incomplete`` is True and ``failed_segments``
+            lists their index and time range; the text has gaps there
+        """
+        return await self._cached(
+            "long",
+            audio_bytes,
+            lambda: self._transcribe_segmented(audio_bytes, filename, on_progress),
+            should_cache=lambda result: result is not None and not result.get("incomplete")
+        )
+    
+    async def _transcribe_segmented(
+        self,
+        audio_bytes: bytes,
+        filename: str,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]]
+    ) -> Optional[dict]:
+        try:
+            segments = await segment_audio(
+                audio_bytes,
+                segment_seconds=settings.LONG_AUDIO_SEGMENT_SECONDS,
+                overlap_seconds=settings.LONG_AUDIO_OVERLAP_SECONDS,
+                search_seconds=settings.LONG_AUDIO_SILENCE_SEARCH_SECONDS,
+                max_segment_bytes=min(settings.LONG_AUDIO_MAX_SEGMENT_BYTES, settings.MAX_AUDIO_FILE_SIZE)
+            )
+        except AudioDecodeError as e:
+            if len(audio_bytes) > settings.MAX_AUDIO_FILE_SIZE:
+                print(f"Could not segment audio too large for a single request: {e}")
+                return None
+            print(f"Could not segment audio, transcribing in one request: {e}")
+            return await self.transcribe_bytes_with_timestamps(audio_bytes, filename)
+        
+        semaphore = asyncio.Semaphore(settings.LONG_AUDIO_MAX_CONCURRENCY)
+        completed = 0
+        
+        async def transcribe_segment(segment: AudioSegment) -> Optional[dict]:
+            nonlocal completed
+            async with semaphore:
+                result = await self.transcribe_bytes_with_timestamps(
+                    segment.wav_bytes, f"segment_{segment.index}.wav"
+                )
+            completed += 1
+            if on_progress:
+                await on_progress(completed, len(segments))
+            return result
+        
+        results = await asyncio.gather(*(transcribe_segment(segment) for segment in segments))
+        
+        if not any(results):
+            return None
+        
+        return self._stitch_segments(segments, results)
+    
+    @staticmethod
+    def _stitch_segments(segments: List[AudioSegment], results: List[Optional[dict]]) -> dict:
+        """
+        Merge per-segment Whisper results into one timeline
+        
+        Whisper segment times are shifted by the segment's offset in the
+        recording. Each Whisper segment is kept only by the audio segment that
+        owns its midpoint, which drops the copy transcribed in the overlap.
+        """
+        from .streaming_transcription import stitch_overlap
+        
+        texts: List[str] = []
+        timeline: List[Dict] = []
+        failed: List[Dict] = []
+        language = "en"
+        
+        for segment, result in zip(segments, results):
+            if not result:
+                print(f"Segment {segment.index} ({segment.start:.0f}s-{segment.end:.0f}s) failed to transcribe")
+                failed.append({"index": segment.index, "start": segment.start, "end": segment.end})
+                continue
+            language = result.get("language") or language
+            
+            whisper_segments = result.get("segments") or []
+            if not whisper_segments:
+                # No timing info; fall back to removing repeated words at the boundary
+                text = stitch_overlap(" ".join(texts), result.get("text") or "")
+                if text:
+                    texts.append(text)
+                continue
+            
+            for whisper_segment in whisper_segments:
+                start = (_segment_field(whisper_segment, "start") or 0.0) + segment.offset
+                end = (_segment_field(whisper_segment, "end") or 0.0) + segment.offset
+                midpoint = (start + end) / 2
+                is_last = segment.index == segments[-1].index
+                if midpoint < segment.start or (midpoint >= segment.end and not is_last):
+                    continue
+                text = (_segment_field(whisper_segment, "text") or "").strip()
+                if text:
+                    texts.append(text)
+                    timeline.append({"start": start, "end": end, "text": text})
+        
+        return {
+            "text": " ".join(texts),
+            "segments": timeline,
+            "language": language,
+            "incomplete": bool(failed),
+            "failed_segments": failed
+        }
@@ -3,80 +3,477 @@ WebSocket connection manager for real-time communication
 """
 
 from fastapi import WebSocket
-from typing import List, Dict
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+import asyncio
 import json
+import time
+
+from ..core.config import settings
+from .pubsub import PubSubBackend, create_pubsub
+
+SLOW_CONSUMER_POLICIES = ("drop", "coalesce", "disconnect")
+
+# Close code sent to clients that cannot keep up ("Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Close code sent when a connection limit is reached
+CONNECTION_LIMIT_CLOSE_CODE = 1013
+
+# Close code for sockets that stopped answering heartbeats (application range, after HTTP 408)
+IDLE_TIMEOUT_CLOSE_CODE = 4408
+
+
+def error_message(code: str, message: str, **details) -> str:
+    """Serialized ``error`` message with a machine-readable code"""
+    return json.dumps({"type": "error", "code": code, "message": message, **details})
+
+
+class Connection:
+    """
+    One WebSocket and its outbound queue
+    
+    Messages are queued without awaiting the network and sent by a dedicated
+    writer task, so a slow client only delays itself. When the queue is full
+    the slow-consumer policy decides what happens:
+        
+        drop        the new message is discarded
+        coalesce    a queued message with the same coalesce key is replaced
+                    in place (e.g. progress updates); if none exists the
+                    client is disconnected, since it can resume from the
+                    transcript chunk offsets and job subscriptions
+        disconnect  the client is closed with code 1013
+    """
+    
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str, send_timeout: float):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.session_ids: Set[str] = set()
+        # Last message from the client; busy while one of its requests is handled
+        self.last_seen = time.monotonic()
+        self.busy = False
+        # Entries are [coalesce_key, message] so a queued message can be replaced in place
+        self._queue: Deque[List] = deque()
+        self._keyed: Dict[str, List] = {}
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+    
+    def start(self, on_failure):
+        """Start the writer task; ``on_failure`` is called if a send fails or times out"""
+        self._writer = asyncio.create_task(self._run_writer(on_failure))
+    
+    def enqueue(self, message: str, coalesce_key: Optional[str] = None) -> bool:
+        """
+        Queue a message for this connection
+        
+        Args:
+            message: Serialized message
+            coalesce_key: Messages with the same key supersede each other
+                while queued (only the latest is sent)
+        
+        Returns:
+            False if the connection is closed or must be closed as a slow consumer
+        """
+        if self.closed:
+            return False
+        
+        if coalesce_key is not None and coalesce_key in self._keyed:
+            self._keyed[coalesce_key][1] = message
+            self.coalesced += 1
+            return True
+        
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "drop":
+                self.dropped += 1
+                return True
+            return False
+        
+        entry = [coalesce_key, message]
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._keyed[coalesce_key] = entry
+        self._ready.set()
+        return True
+    
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+    
+    def touch(self, busy: bool = False):
+        """Record client activity; a busy connection is never reaped as idle"""
+        self.last_seen = time.monotonic()
+        self.busy = busy
+    
+    def idle_for(self, now: float) -> float:
+        """Seconds since the client was last heard from (0 while busy)"""
+        return 0.0 if self.busy else now - self.last_seen
+    
+    async def _run_writer(self, on_failure):
+        try:
+            # stop() also sets closed: wait_for() can swallow a cancel that
+            # arrives just as a send completes
+            while not self.closed:
+                await self._ready.wait()
+                while self._queue and not self.closed:
+                    coalesce_key, message = self._queue.popleft()
+                    if coalesce_key is not None:
+                        self._keyed.pop(coalesce_key, None)
+                    await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+                    self.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending to WebSocket: {e or type(e).__name__}")
+            on_failure(self)
+    
+    async def drain(self, timeout: float):
+        """Wait (up to ``timeout`` seconds) for queued messages to be sent"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._queue and not self.closed and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+    
+    def stop(self):
+        """Stop accepting messages and stop the writer"""
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+    
+    async def close(self, code: int = 1000, reason: Optional[str] = None):
+        """Stop the writer and close the socket"""
+        self.stop()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), self.send_timeout)
+        except Exception:
+            # Already closed by the client, or not reading at all
+            pass
 
 
 class WebSocketManager:
-    """Manages WebSocket connections for real-time transcription"""
+    """
+    Manages WebSocket connections for real-time transcription
+    
+    Session and broadcast messages go through a pub/sub backend so every
+    worker process delivers them to its own sockets. Each process only
+    subscribes to the session channels it has sockets for.
+    
+    A heartbeat task pings every socket and closes those the client has not
+    sent anything on (pongs included) within the idle timeout, so dead
+    sockets are reclaimed without waiting for a send to fail. Connections
+    per process and per session, and AI requests in flight per connection,
+    are capped; rejected clients receive an ``error`` message saying why.
+    """
+    
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        policy: Optional[str] = None,
+        send_timeout: Optional[float] = None,
+        pubsub: Optional[PubSubBackend] = None,
+        heartbeat_interval: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_connections_per_session: Optional[int] = None,
+        max_inflight: Optional[int] = None
+    ):
+        self.pubsub = pubsub or create_pubsub()
+        self.channel_prefix = settings.PUBSUB_CHANNEL_PREFIX
+        self._started = False
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.policy = policy or settings.WS_SLOW_CONSUMER_POLICY
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {self.policy}")
+        self.heartbeat_interval = settings.WS_HEARTBEAT_INTERVAL if heartbeat_interval is None else heartbeat_interval
+        self.idle_timeout = settings.WS_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_connections = max_connections or settings.WS_MAX_CONNECTIONS
+        self.max_connections_per_session = max_connections_per_session or settings.WS_MAX_CONNECTIONS_PER_SESSION
+        self.max_inflight = max_inflight or settings.WS_MAX_INFLIGHT_PER_CONNECTION
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._channel_handlers: Dict[str, Callable[[str], Awaitable[None]]] = {}
+        
+        self.active_connections: Dict[WebSocket, Connection] = {}
+        self.session_connections: Dict[str, Set[Connection]] = {}
+        self.slow_consumers = 0
+        self.idle_closed = 0
+        self.rejected_connections = 0
+        self.rejected_joins = 0
+        self.rejected_requests = 0
+    
+    async def start(self):
+        """Start receiving messages published by other workers (called on startup)"""
+        self.pubsub.subscribe(self._broadcast_channel())
+        await self.pubsub.start(self._on_published)
+        self._started = True
+        if self.heartbeat_interval > 0:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+    
+    async def close(self):
+        """Stop heartbeats and the pub/sub backend (called on shutdown)"""
+        self._started = False
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        await self.pubsub.close()
     
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.session_connections: Dict[str, List[WebSocket]] = {}
+    def add_channel_handler(self, name: str, handler: Callable[[str], Awaitable[None]]):
+        """
+        Receive application messages (not meant for sockets) published by any worker
+        
+        Args:
+            name: Channel name, prefixed with PUBSUB_CHANNEL_PREFIX
+            handler: Coroutine called with each message's data, in every
+                process including the publisher's
+        """
+        channel = f"{self.channel_prefix}{name}"
+        self._channel_handlers[channel] = handler
+        self.pubsub.subscribe(channel)
+    
+    async def publish(self, name: str, data: str) -> bool:
+        """
+        Publish data to the handlers registered for ``name`` on every worker
+        
+        Returns:
+            False if the pub/sub backend is not running or the publish failed
+        """
+        if not self._started:
+            return False
+        try:
+            await self.pubsub.publish(f"{self.channel_prefix}{name}", data)
+            return True
+        except Exception as e:
+            print(f"Error publishing to {name}: {e}")
+            return False
     
-    async def connect(self, websocket: WebSocket, session_id: str = None):
-        """Accept new WebSocket connection"""
+    def _session_channel(self, session_id: str) -> str:
+        return f"{self.channel_prefix}session:{session_id}"
+    
+    def _broadcast_channel(self) -> str:
+        return f"{self.channel_prefix}broadcast"
+    
+    async def connect(self, websocket: WebSocket, session_id: str = None) -> Optional[Connection]:
+        """
+        Accept new WebSocket connection and join its session room
+        
+        Args:
+            websocket: Incoming WebSocket
+            session_id: Session room to join straight away
+        
+        Returns:
+            The connection, or None if a connection limit was reached (the
+            client is sent an error and the socket is closed with code 1013)
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        
+        if len(self.active_connections) >= self.max_connections:
+            await self._reject(
+                websocket,
+                "too_many_connections",
+                f"Server is at its limit of {self.max_connections} connections, try again later"
+            )
+            return None
+        if session_id and len(self.session_connections.get(session_id, ())) >= self.max_connections_per_session:
+            await self._reject(
+                websocket,
+                "session_connection_limit",
+                f"Session already has {self.max_connections_per_session} open connections"
+            )
+            return None
+        
+        connection = Connection(websocket, self.max_queue, self.policy, self.send_timeout)
+        self.active_connections[websocket] = connection
+        connection.start(self._on_send_failure)
         
         if session_id:
-            if session_id not in self.session_connections:
-                self.session_connections[session_id] = []
-            self.session_connections[session_id].append(websocket)
+            self.bind(websocket, session_id)
         
         print(f"✅ WebSocket connected. Total connections: {len(self.active_connections)}")
+        return connection
     
-    def disconnect(self, websocket: WebSocket, session_id: str = None):
-        """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+    async def _reject(self, websocket: WebSocket, code: str, message: str):
+        self.rejected_connections += 1
+        print(f"⚠️ Rejected WebSocket connection: {message}")
+        try:
+            await asyncio.wait_for(websocket.send_text(error_message(code, message)), self.send_timeout)
+            await asyncio.wait_for(websocket.close(code=CONNECTION_LIMIT_CLOSE_CODE, reason=code), self.send_timeout)
+        except Exception:
+            pass
+        
+    def bind(self, websocket: WebSocket, session_id: str) -> bool:
+        """
+        Add a connection to a session room (a connection may join several)
+        
+        Returns:
+            False if the room is full; the client is sent an error and stays
+            connected without that session's updates
+        """
+        connection = self.active_connections.get(websocket)
+        if connection is None or not session_id:
+            return False
+        if session_id in connection.session_ids:
+            return True
+        if len(self.session_connections.get(session_id, ())) >= self.max_connections_per_session:
+            self.rejected_joins += 1
+            self._deliver(connection, error_message(
+                "session_connection_limit",
+                f"Session already has {self.max_connections_per_session} open connections",
+                session_id=session_id
+            ), None)
+            return False
+        connection.session_ids.add(session_id)
+        if session_id not in self.session_connections:
+            self.session_connections[session_id] = set()
+            self.pubsub.subscribe(self._session_channel(session_id))
+        self.session_connections[session_id].add(connection)
+        return True
         
-        if session_id and session_id in self.session_connections:
-            if websocket in self.session_connections[session_id]:
-                self.session_connections[session_id].remove(websocket)
+    def disconnect(self, websocket: WebSocket):
+        """Remove WebSocket connection from every room it joined"""
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
             
-            # Clean up empty session
-            if not self.session_connections[session_id]:
-                del self.session_connections[session_id]
+        for joined in connection.session_ids:
+            room = self.session_connections.get(joined)
+            if room is not None:
+                room.discard(connection)
+                # Clean up empty session
+                if not room:
+                    del self.session_connections[joined]
+                    self.pubsub.unsubscribe(self._session_channel(joined))
+        
+        connection.stop()
         
         print(f"❌ WebSocket disconnected. Total connections: {len(self.active_connections)}")
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send message to specific WebSocket connection"""
+    async def close_connection(self, websocket: WebSocket, code: int = 1000, drain_timeout: float = 1.0):
+        """Send what is still queued (briefly), then disconnect and close the socket"""
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return
+        await connection.drain(drain_timeout)
+        self.disconnect(websocket)
+        await connection.close(code=code)
+    
+    def admit_request(self, websocket: WebSocket, inflight: int, request: Dict) -> bool:
+        """
+        Check a connection's in-flight AI work before it starts more
+        
+        Args:
+            websocket: Connection the request arrived on
+            inflight: Requests of this connection still queued or running
+            request: The incoming message; its type and seq are echoed back on rejection
+        
+        Returns:
+            False if the connection is at its in-flight limit (the client is sent an error)
+        """
+        if inflight < self.max_inflight:
+            return True
+        
+        self.rejected_requests += 1
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            details = {"request": request.get("type")}
+            if request.get("seq") is not None:
+                details["seq"] = request["seq"]
+            self._deliver(connection, error_message(
+                "too_many_requests",
+                f"{inflight} requests are already in flight (limit {self.max_inflight}); wait for results before sending more",
+                **details
+            ), None)
+        return False
+    
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self._sweep()
+            except Exception as e:
+                print(f"Error in WebSocket heartbeat: {e}")
+    
+    def _sweep(self):
+        # Ping live connections and close those the client stopped talking on
+        now = time.monotonic()
+        ping = json.dumps({"type": "ping", "ts": time.time()})
+        for connection in list(self.active_connections.values()):
+            idle = connection.idle_for(now)
+            if self.idle_timeout > 0 and idle > self.idle_timeout:
+                self.idle_closed += 1
+                print(f"⚠️ Closing idle WebSocket (nothing received for {idle:.0f}s)")
+                self.disconnect(connection.websocket)
+                asyncio.create_task(connection.close(code=IDLE_TIMEOUT_CLOSE_CODE, reason="idle_timeout"))
+            else:
+                # An unsent ping is replaced rather than queued twice
+                self._deliver(connection, ping, "ping")
+    
+    def _on_send_failure(self, connection: Connection):
+        self.disconnect(connection.websocket)
+        asyncio.create_task(connection.close(code=SLOW_CONSUMER_CLOSE_CODE))
+    
+    def _deliver(self, connection: Connection, message: str, coalesce_key: Optional[str]):
+        if connection.enqueue(message, coalesce_key):
+            return
+        if connection.closed:
+            return
+        # Slow consumer: disconnect it rather than buffer without bound
+        self.slow_consumers += 1
+        print(f"⚠️ Disconnecting slow WebSocket consumer ({connection.queued} messages queued)")
+        self.disconnect(connection.websocket)
+        asyncio.create_task(connection.close(code=SLOW_CONSUMER_CLOSE_CODE))
+    
+    async def send_personal_message(self, message: str, websocket: WebSocket, coalesce_key: Optional[str] = None):
+        """Queue a message for a specific WebSocket connection"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            self._deliver(connection, message, coalesce_key)
+    
+    def _deliver_to_session(self, message: str, session_id: str, coalesce_key: Optional[str]):
+        for connection in list(self.session_connections.get(session_id, ())):
+            self._deliver(connection, message, coalesce_key)
+    
+    def _deliver_to_all(self, message: str, coalesce_key: Optional[str]):
+        for connection in list(self.active_connections.values()):
+            self._deliver(connection, message, coalesce_key)
+    
+    async def _publish(self, channel: str, message: str, coalesce_key: Optional[str]) -> bool:
+        if not self._started:
+            return False
         try:
-            await websocket.send_text(message)
+            await self.pubsub.publish(channel, json.dumps({"message": message, "coalesce_key": coalesce_key}))
+            return True
         except Exception as e:
-            print(f"Error sending message to WebSocket: {e}")
-            self.disconnect(websocket)
-    
-    async def send_to_session(self, message: str, session_id: str):
-        """Send message to all connections in a session"""
-        if session_id in self.session_connections:
-            disconnected = []
-            for websocket in self.session_connections[session_id]:
-                try:
-                    await websocket.send_text(message)
-                except Exception as e:
-                    print(f"Error sending to session {session_id}: {e}")
-                    disconnected.append(websocket)
+            # Backend unavailable: local sockets still get the message
+            print(f"Error publishing WebSocket message: {e}")
+            return False
+    
+    async def _on_published(self, channel: str, data: str):
+        handler = self._channel_handlers.get(channel)
+        if handler is not None:
+            await handler(data)
+            return
+        envelope = json.loads(data)
+        if channel == self._broadcast_channel():
+            self._deliver_to_all(envelope["message"], envelope["coalesce_key"])
+        elif channel.startswith(f"{self.channel_prefix}session:"):
+            session_id = channel[len(f"{self.channel_prefix}session:"):]
+            self._deliver_to_session(envelope["message"], session_id, envelope["coalesce_key"])
             
-            # Clean up disconnected websockets
-            for ws in disconnected:
-                self.disconnect(ws, session_id)
-    
-    async def broadcast(self, message: str):
-        """Broadcast message to all active connections"""
-        disconnected = []
-        for websocket in self.active_connections:
-            try:
-                await websocket.send_text(message)
-            except Exception as e:
-                print(f"Error broadcasting message: {e}")
-                disconnected.append(websocket)
-        
-        # Clean up disconnected websockets
-        for ws in disconnected:
-            self.disconnect(ws)
+    async def send_to_session(self, message: str, session_id: str, coalesce_key: Optional[str] = None):
+        """Queue a message for all connections in a session, on every worker"""
+        if not await self._publish(self._session_channel(session_id), message, coalesce_key):
+            self._deliver_to_session(message, session_id, coalesce_key)
+    
+    async def broadcast(self, message: str, coalesce_key: Optional[str] = None):
+        """Queue a message for all active connections, on every worker"""
+        if not await self._publish(self._broadcast_channel(), message, coalesce_key):
+            self._deliver_to_all(message, coalesce_key)
     
     def get_connection_count(self) -> int:
         """Get total number of active connections"""
@@ -85,3 +482,24 @@ class WebSocketManager:
     def get_session_count(self) -> int:
         """Get number of active sessions"""
         return len(self.session_connections)
+
+    def stats(self) -> Dict:
+        """Connection and outbound queue counters for monitoring"""
+        connections = self.active_connections.values()
+        return {
+            "connections": len(self.active_connections),
+            "sessions": len(self.session_connections),
+            "queued_messages": sum(connection.queued for connection in connections),
+            "dropped_messages": sum(connection.dropped for connection in connections),
+            "coalesced_messages": sum(connection.coalesced for connection in connections),
+            "slow_consumers_disconnected": self.slow_consumers,
+            "idle_closed": self.idle_closed,
+            "rejected_connections": self.rejected_connections,
+            "rejected_joins": self.rejected_joins,
+            "rejected_requests": self.rejected_requests,
+            "max_connections": self.max_connections,
+            "max_connections_per_session": self.max_connections_per_session,
+            "max_inflight_per_connection": self.max_inflight,
+            "policy": self.policy,
+            "pubsub_backend": type(self.pubsub).__name__
+        }
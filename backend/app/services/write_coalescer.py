@@ -0,0 +1,131 @@
+"""
+Batches high-frequency session writes into a single transaction
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import update
+
+from ..core.config import settings
+from ..models.database import AsyncSessionLocal, Session
+from .session_cache import session_read_cache
+
+
+class WriteCoalescer:
+    """
+    Merges frequent session updates (transcript saves, updated_at touches)
+
+    Works as a group commit: pending updates are collected per session, with
+    later values for a field replacing earlier ones, and written in one
+    transaction. Writes that arrive while a batch is committing go into the
+    next batch, so under load many exam rooms share each commit (and fsync)
+    while an idle database still writes after at most ``interval`` seconds.
+    The linger is skipped once ``max_batch`` sessions are pending. Callers
+    wait for the commit that includes their write, so a returned update is
+    durable.
+    """
+
+    def __init__(self, interval: float, max_batch: int):
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: Dict[str, Dict] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.batches = 0
+        self.writes = 0
+
+    async def update(self, session_id: str, **fields) -> bool:
+        """
+        Queue field updates for a session and wait until they are committed
+
+        Returns:
+            True if the session exists and was updated
+
+        Raises:
+            Exception: The database error, if the batch could not be committed
+        """
+        pending = self._pending.setdefault(session_id, {})
+        pending.update(fields)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(session_id, []).append(future)
+        self.writes += 1
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+        # Shielded so a cancelled caller does not cancel a shared result
+        return await asyncio.shield(future)
+
+    async def touch(self, session_id: str) -> bool:
+        """Stamp updated_at on a session"""
+        return await self.update(session_id)
+
+    async def _run_flusher(self):
+        while self._pending:
+            # Linger briefly so concurrent writers land in the same batch
+            if self.interval and len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        """Commit everything pending now"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            pending, waiters = self._pending, self._waiters
+            self._pending, self._waiters = {}, {}
+            if not pending:
+                return
+
+            results: Dict[str, bool] = {}
+            error = None
+            now = datetime.utcnow()
+            try:
+                async with AsyncSessionLocal() as db:
+                    async with db.begin():
+                        for session_id, fields in pending.items():
+                            result = await db.execute(
+                                update(Session)
+                                .where(Session.session_id == session_id)
+                                .values(**fields, updated_at=now)
+                            )
+                            results[session_id] = result.rowcount > 0
+                self.batches += 1
+                session_read_cache.invalidate(pending)
+            except Exception as e:
+                print(f"Error flushing {len(pending)} coalesced session writes: {e}")
+                error = e
+
+            for session_id, futures in waiters.items():
+                for future in futures:
+                    if future.done():
+                        continue
+                    # A failed commit is an error, not "session not found"
+                    if error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(results.get(session_id, False))
+
+    async def close(self):
+        """Flush outstanding writes (called on shutdown)"""
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "writes": self.writes,
+            "batches": self.batches,
+            "pending_sessions": len(self._pending)
+        }
+
+
+# Global write coalescer instance
+write_coalescer = WriteCoalescer(
+    interval=settings.WRITE_COALESCE_INTERVAL,
+    max_batch=settings.WRITE_COALESCE_MAX_BATCH
+)
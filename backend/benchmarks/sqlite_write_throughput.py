@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Concurrent write throughput of the SQLite storage profiles
+
+Simulates several exam rooms autosaving transcripts at once (one writer task
+per room) while other tasks read sessions, and compares:
+
+    baseline   rollback journal, synchronous=FULL, one commit per write
+    wal        WAL, synchronous=NORMAL, one commit per write
+    coalesced  WAL, synchronous=NORMAL, writes batched by the write coalescer
+
+Each profile runs in a fresh subprocess against its own temporary database,
+because the storage profile is read from Settings when the engines are built.
+
+Usage (from backend/):
+    python benchmarks/sqlite_write_throughput.py --writers 20 --writes 50 --readers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    "baseline": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "wal": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+    "coalesced": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+}
+
+
+async def run_profile(profile: str, writers: int, writes: int, readers: int) -> dict:
+    """Run one profile in this process (settings come from the environment)"""
+    sys.path.insert(0, BACKEND_DIR)
+    from app.models.database import (
+        AsyncSessionLocal, Session, async_engine, create_tables,
+        load_session_async, update_session_fields_async,
+    )
+    from app.services.write_coalescer import write_coalescer
+
+    await create_tables()
+    session_ids = [str(uuid.uuid4()) for _ in range(writers)]
+    async with AsyncSessionLocal() as db:
+        db.add_all(Session(session_id=session_id, doctor_name="Bench", patient_name="Bench", transcript="")
+                   for session_id in session_ids)
+        await db.commit()
+
+    latencies = []
+    reads = 0
+    done = asyncio.Event()
+
+    async def writer(session_id: str):
+        transcript = ""
+        for i in range(writes):
+            transcript += f"Doctor: line {i} of the visit.\n"
+            started = time.perf_counter()
+            if profile == "coalesced":
+                await write_coalescer.update(session_id, transcript=transcript)
+            else:
+                await update_session_fields_async(session_id, transcript=transcript)
+            latencies.append(time.perf_counter() - started)
+
+    async def reader():
+        nonlocal reads
+        while not done.is_set():
+            await load_session_async(session_ids[reads % len(session_ids)])
+            reads += 1
+
+    reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(session_id) for session_id in session_ids))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*reader_tasks)
+    await write_coalescer.close()
+    await async_engine.dispose()
+
+    latencies.sort()
+    return {
+        "profile": profile,
+        "writes": len(latencies),
+        "seconds": round(elapsed, 3),
+        "writes_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "reads_per_second": round(reads / elapsed, 1),
+        "commits": write_coalescer.batches if profile == "coalesced" else len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=20, help="concurrent writer tasks (exam rooms)")
+    parser.add_argument("--writes", type=int, default=50, help="writes per writer")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent reader tasks")
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        # Child process: run a single profile and report JSON on stdout
+        result = asyncio.run(run_profile(args.profile, args.writers, args.writes, args.readers))
+        print(json.dumps(result))
+        return
+
+    print(f"📊 {args.writers} writers x {args.writes} writes, {args.readers} readers\n")
+    print(f"{'profile':<10} {'writes/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'commits':>8} {'reads/s':>10}")
+    for profile, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, **overrides)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            env["CACHE_DB_PATH"] = os.path.join(tmp, "cache.db")
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--profile", profile,
+                 "--writers", str(args.writers), "--writes", str(args.writes), "--readers", str(args.readers)],
+                env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<10} {result['writes_per_second']:>10} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+              f"{result['commits']:>8} {result['reads_per_second']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,27 +9,68 @@ from fastapi.staticfiles import StaticFiles
 import os
 import json
 import asyncio
-from typing import Dict, List
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 import uvicorn
 from dotenv import load_dotenv
 
 from app.core.config import settings
 from app.api import router as api_router
-from app.services.websocket_manager import WebSocketManager
-from app.services.transcription_service import TranscriptionService
-from app.services.ai_service import AIService
-from app.models.database import create_tables
+from app.services.container import services
+from app.services.ai_service import PROMPT_VERSIONS
+from app.services.rate_governor import governor_stats
+from app.services.streaming_transcription import TranscriptStream
+from app.services.transcription_service import decode_audio
+from app.services.audio_buffer import AudioBuffer, AudioTooLargeError
+from app.services.encounter_pipeline import finalize_encounter, is_valid_soap_note, regenerate_soap_note, soap_coverage
+from app.services.job_queue import job_queue, InvalidJobPayloadError, InvalidJobPriorityError, JobQueueFullError, UnknownJobKindError
+from app.services.job_handlers import register_job_handlers
+from app.services.write_coalescer import write_coalescer
+from app.services.transcript_writer import transcript_writer
+from app.services.session_cache import session_read_cache
+from app.services.qr_renderer import qr_renderer
+from app.models.database import create_tables, update_session_fields_async
 
 # Load environment variables
 load_dotenv(dotenv_path='.env')
 
 # Environment variables loaded via load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables and start background workers on startup
+    await create_tables()
+    register_job_handlers(job_queue, services)
+    job_queue.add_listener(publish_job_event)
+    await job_queue.start()
+    # Writes in any worker drop every worker's cached session reads
+    websocket_manager.add_channel_handler("session_reads:invalidate", session_read_cache.receive_invalidation)
+    session_read_cache.share_invalidations(
+        lambda data: websocket_manager.publish("session_reads:invalidate", data)
+    )
+    await websocket_manager.start()
+    qr_renderer.start()
+    print("🚀 Skribe backend started successfully!")
+    print(f"📡 WebSocket endpoint: ws://localhost:8000/ws/transcription")
+    print(f"🔗 API docs: http://localhost:8000/docs")
+    
+    yield
+    
+    # Let workers stop before the shared clients they use are closed
+    await job_queue.stop()
+    job_queue.remove_listener(publish_job_event)
+    await websocket_manager.close()
+    await transcript_writer.close()
+    await write_coalescer.close()
+    qr_renderer.close()
+    await services.close()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Skribe API",
     description="Smart Ambient Healthcare Dictation Service",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -39,24 +80,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified"],
 )
 
-# Initialize services
-websocket_manager = WebSocketManager()
-transcription_service = TranscriptionService()
-ai_service = AIService()
+# Services are built lazily by the shared container
+websocket_manager = services.websocket_manager
+
+async def publish_job_event(event: Dict):
+    # Session jobs reach every socket in the session's room, on any worker
+    job = event["data"]
+    if job["session_id"]:
+        await websocket_manager.send_to_session(json.dumps(event), job["session_id"], coalesce_key=f"job:{job['job_id']}")
 
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
-# Create database tables on startup
-@app.on_event("startup")
-async def startup_event():
-    await create_tables()
-    print("🚀 Skribe backend started successfully!")
-    print(f"📡 WebSocket endpoint: ws://localhost:8000/ws/transcription")
-    print(f"🔗 API docs: http://localhost:8000/docs")
-
 @app.get("/")
 async def root():
     return {
@@ -70,53 +108,283 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "skribe-backend"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the transcription and AI result caches"""
+    caches = services.ai_service.cache_stats()
+    if services.transcription_service.cache:
+        caches.append(services.transcription_service.cache.stats())
+    caches.append(session_read_cache.stats())
+    caches.append(qr_renderer.stats())
+    return {"caches": caches}
+
+@app.get("/openai/stats")
+async def openai_stats():
+    """Queue depth, in-flight requests and remaining rate budget per OpenAI model"""
+    return {"models": governor_stats()}
+
+@app.get("/ws/stats")
+async def websocket_stats():
+    """Connections, session rooms and outbound queue counters"""
+    return websocket_manager.stats()
+
+@app.delete("/cache/ai")
+async def invalidate_ai_cache(operation: Optional[str] = None):
+    """Drop cached AI results (all operations, or one of soap/summary/compliance/edit_summary)"""
+    if operation and operation not in PROMPT_VERSIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation: {operation}")
+    await services.ai_service.invalidate_cache(operation)
+    return {"message": "AI result cache cleared", "operation": operation or "all"}
+
 # WebSocket endpoint for real-time transcription
 @app.websocket("/ws/transcription")
 async def websocket_transcription(websocket: WebSocket):
-    await websocket_manager.connect(websocket)
+    # Clients may bind to their session up front: /ws/transcription?session_id=...
+    connection = await websocket_manager.connect(websocket, websocket.query_params.get("session_id"))
+    if connection is None:
+        # Over a connection limit; the client has been told why
+        return
+    ai_service = services.ai_service
+    transcription_service = services.transcription_service
+    transcript_stream = None
+    audio_buffer = None
+    transcript_session_id = None
+    job_ids = set()
+    
+    def join_session(session_id: Optional[str]) -> Optional[str]:
+        # Any session named in a message joins this socket to that session's room
+        if session_id:
+            websocket_manager.bind(websocket, session_id)
+        return session_id
+    
+    async def send_partial(partial: Dict):
+        if transcript_session_id and partial["text"]:
+            # Persist so a reconnecting client can resume from chunk_seq
+            try:
+                partial["chunk_seq"] = await transcript_writer.append(transcript_session_id, partial["text"], wait=True)
+            except Exception as e:
+                print(f"⚠️ Could not save transcript chunk: {e}")
+        await websocket_manager.send_personal_message(
+            json.dumps({
+                "type": "transcript_partial",
+                "data": partial
+            }),
+            websocket
+        )
+    
+    async def send_progress(completed: int, total: int):
+        await websocket_manager.send_personal_message(
+            json.dumps({
+                "type": "transcription_progress",
+                "data": {"completed": completed, "total": total}
+            }),
+            websocket,
+            coalesce_key="transcription_progress"
+        )
+    
+    async def transcribe_recording(audio_bytes: bytes, filename: str = "audio.webm", long: bool = False) -> Optional[Dict]:
+        # Recordings over the threshold are split at silence and transcribed in parallel
+        if long or len(audio_bytes) > settings.LONG_AUDIO_THRESHOLD_BYTES:
+            result = await transcription_service.transcribe_long_audio(audio_bytes, filename, on_progress=send_progress)
+            if not result:
+                return None
+            return {"text": result["text"], "failed_segments": result.get("failed_segments", [])}
+        text = await transcription_service.transcribe_bytes(audio_bytes, filename)
+        return {"text": text, "failed_segments": []} if text else None
+    
+    async def send_transcript_complete(result: Optional[Dict], session_id: Optional[str]):
+        if not result or not result["text"]:
+            return
+        message = {"type": "transcript_complete", "data": result["text"]}
+        if result["failed_segments"]:
+            # Some segments failed: the text has gaps, so it is not saved to the session
+            message["incomplete"] = True
+            message["failed_segments"] = result["failed_segments"]
+        elif session_id:
+            await transcript_writer.append(session_id, result["text"])
+        await websocket_manager.send_personal_message(json.dumps(message), websocket)
+    
+    async def forward_job_event(event: Dict):
+        # Jobs without a session that this socket submitted; session jobs go
+        # to the session's room through publish_job_event
+        job = event["data"]
+        if job["job_id"] in job_ids and not job["session_id"]:
+            # A queued update for the same job is superseded by the newer state
+            await websocket_manager.send_personal_message(json.dumps(event), websocket, coalesce_key=f"job:{job['job_id']}")
+    
+    job_queue.add_listener(forward_job_event)
+    
+    def inflight() -> int:
+        # AI work this socket started that is still running in the background
+        running_jobs = sum(1 for job_id in job_ids if job_queue.is_active(job_id))
+        return running_jobs + (transcript_stream.pending if transcript_stream else 0)
+    
+    async def send_error(error_message: str):
+        await websocket_manager.send_personal_message(
+            json.dumps({
+                "type": "error",
+                "message": error_message
+            }),
+            websocket
+        )
+    
     try:
         while True:
-            # Receive audio data or commands from client
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            if message["type"] == "transcribe_complete_audio":
-                # Process complete audio file with Whisper
-                audio_data = message["data"]
-                transcript = await transcription_service.transcribe_chunk(audio_data)
-                
-                if transcript:
-                    # Send complete transcript back to client
-                    await websocket_manager.send_personal_message(
-                        json.dumps({
-                            "type": "transcript_complete",
-                            "data": transcript
-                        }),
-                        websocket
+            # Receive audio data or commands from client; the socket counts as
+            # idle only while waiting here
+            connection.touch()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            connection.touch(busy=True)
+            
+            if frame.get("bytes") is not None:
+                # Raw audio frame following an audio_start header
+                if audio_buffer is None:
+                    await send_error("Received audio bytes without an audio_start header")
+                    continue
+                try:
+                    audio_buffer.append(frame["bytes"])
+                except AudioTooLargeError as e:
+                    await send_error(str(e))
+                continue
+            
+            message = json.loads(frame["text"])
+            
+            if message["type"] == "audio_start":
+                # Header for a binary upload: {"type": "audio_start", "format": "webm", "mode": "complete" | "stream" | "long", "seq": 0}
+                # "long" uploads may exceed Whisper's request limit; they are segmented server-side
+                mode = message.get("mode", "complete")
+                transcript_session_id = join_session(message.get("session_id", transcript_session_id))
+                try:
+                    audio_buffer = AudioBuffer(
+                        audio_format=message.get("format", "webm"),
+                        mode=mode,
+                        seq=message.get("seq"),
+                        max_size=settings.MAX_LONG_AUDIO_FILE_SIZE if mode == "long" else None
                     )
+                except ValueError as e:
+                    audio_buffer = None
+                    await send_error(str(e))
+            
+            elif message["type"] == "audio_end":
+                # Binary upload finished; hand the in-memory audio to Whisper
+                if audio_buffer is None:
+                    await send_error("Received audio_end without a complete audio upload")
+                    continue
+                buffer, audio_buffer = audio_buffer, None
+                if buffer.rejected:
+                    continue
+                
+                if buffer.mode == "stream":
+                    if not websocket_manager.admit_request(websocket, inflight(), {"type": "audio_end", "seq": buffer.seq}):
+                        continue
+                    if not transcript_stream:
+                        transcript_stream = TranscriptStream(transcription_service, send_partial)
+                    transcript_stream.add_chunk(buffer.getvalue(), buffer.seq, buffer.filename)
+                    continue
+                
+                result = await transcribe_recording(buffer.getvalue(), buffer.filename, long=buffer.mode == "long")
+                await send_transcript_complete(result, transcript_session_id)
+            
+            elif message["type"] == "transcribe_complete_audio":
+                # Process complete audio file with Whisper; long recordings are segmented
+                try:
+                    audio_bytes = decode_audio(message["data"], max_size=settings.MAX_LONG_AUDIO_FILE_SIZE)
+                except ValueError as e:
+                    await send_error(str(e))
+                    continue
+                result = await transcribe_recording(audio_bytes)
+                # Send complete transcript back to client
+                await send_transcript_complete(result, join_session(message.get("session_id")))
+            
+            elif message["type"] == "start_stream":
+                # Begin a streaming transcription; audio arrives in rolling chunks
+                if transcript_stream:
+                    transcript_stream.cancel()
+                # Partials are persisted as transcript chunks when a session is given
+                transcript_session_id = join_session(message.get("session_id"))
+                transcript_stream = TranscriptStream(transcription_service, send_partial)
+                await websocket_manager.send_personal_message(
+                    json.dumps({"type": "stream_started"}),
+                    websocket
+                )
+            
+            elif message["type"] == "audio_chunk":
+                # Transcribe each chunk as it arrives; partials are pushed back in order
+                if not websocket_manager.admit_request(websocket, inflight(), message):
+                    continue
+                try:
+                    audio_bytes = decode_audio(message["data"])
+                except ValueError as e:
+                    await send_error(str(e))
+                    continue
+                transcript_session_id = join_session(message.get("session_id", transcript_session_id))
+                if not transcript_stream:
+                    transcript_stream = TranscriptStream(transcription_service, send_partial)
+                transcript_stream.add_chunk(audio_bytes, message.get("seq"))
+            
+            elif message["type"] == "end_stream":
+                # Wait for outstanding chunks and send the stitched transcript
+                transcript = await transcript_stream.finish() if transcript_stream else ""
+                transcript_stream = None
+                await websocket_manager.send_personal_message(
+                    json.dumps({
+                        "type": "transcript_complete",
+                        "data": transcript
+                    }),
+                    websocket
+                )
             
             elif message["type"] == "generate_soap":
                 # Generate SOAP note from complete transcript
                 transcript = message["transcript"]
-                session_id = message.get("session_id")
-                soap_note = await ai_service.generate_soap_note(transcript)
+                session_id = join_session(message.get("session_id"))
+                
+                if session_id and message.get("incremental"):
+                    # Merge only the transcript added since the stored note was generated
+                    soap_note, _ = await regenerate_soap_note(ai_service, session_id, transcript)
+                else:
+                    soap_note = await ai_service.generate_soap_note(transcript)
+                
+                    # Save SOAP note to database if session_id provided
+                    if session_id and is_valid_soap_note(soap_note):
+                        await update_session_fields_async(session_id, soap_note=soap_note, **soap_coverage(transcript))
+                
+                await websocket_manager.send_personal_message(
+                    json.dumps({
+                        "type": "soap_generated",
+                        "data": soap_note
+                    }),
+                    websocket
+                )
+            
+            elif message["type"] == "generate_soap_stream":
+                # Stream the SOAP note: raw tokens, then each section as soon as it is complete
+                transcript = message["transcript"]
+                session_id = join_session(message.get("session_id"))
+                soap_note = None
+                
+                async for event in ai_service.stream_soap_note(transcript):
+                    if event["type"] == "token":
+                        await websocket_manager.send_personal_message(
+                            json.dumps({"type": "soap_token", "data": event["data"]}),
+                            websocket
+                        )
+                    elif event["type"] == "section":
+                        await websocket_manager.send_personal_message(
+                            json.dumps({
+                                "type": "soap_section",
+                                "section": event["section"],
+                                "data": event["data"]
+                            }),
+                            websocket
+                        )
+                    else:
+                        soap_note = event["data"]
                 
-                # Save SOAP note to database if session_id provided
-                if session_id and soap_note:
-                    from app.models.database import SessionLocal, Session as SessionModel
-                    from datetime import datetime
-                    db = SessionLocal()
-                    try:
-                        session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
-                        if session:
-                            session.soap_note = soap_note
-                            session.updated_at = datetime.utcnow()
-                            db.commit()
-                    except Exception as e:
-                        print(f"Error saving SOAP note to database: {e}")
-                        db.rollback()
-                    finally:
-                        db.close()
+                if session_id and is_valid_soap_note(soap_note):
+                    await update_session_fields_async(session_id, soap_note=soap_note, **soap_coverage(transcript))
                 
                 await websocket_manager.send_personal_message(
                     json.dumps({
@@ -129,25 +397,12 @@ async def websocket_transcription(websocket: WebSocket):
             elif message["type"] == "generate_summary":
                 # Generate patient summary
                 transcript = message["transcript"]
-                session_id = message.get("session_id")
+                session_id = join_session(message.get("session_id"))
                 summary = await ai_service.generate_patient_summary(transcript)
                 
                 # Save summary to database if session_id provided
                 if session_id and summary:
-                    from app.models.database import SessionLocal, Session as SessionModel
-                    from datetime import datetime
-                    db = SessionLocal()
-                    try:
-                        session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
-                        if session:
-                            session.patient_summary = summary
-                            session.updated_at = datetime.utcnow()
-                            db.commit()
-                    except Exception as e:
-                        print(f"Error saving summary to database: {e}")
-                        db.rollback()
-                    finally:
-                        db.close()
+                    await update_session_fields_async(session_id, patient_summary=summary)
                 
                 await websocket_manager.send_personal_message(
                     json.dumps({
@@ -157,6 +412,18 @@ async def websocket_transcription(websocket: WebSocket):
                     websocket
                 )
             
+            elif message["type"] == "finalize_session":
+                # SOAP and summary run concurrently; compliance follows the SOAP note
+                async def send_event(event: Dict):
+                    await websocket_manager.send_personal_message(json.dumps(event), websocket)
+                
+                await finalize_encounter(
+                    ai_service,
+                    message["transcript"],
+                    session_id=join_session(message.get("session_id")),
+                    on_event=send_event
+                )
+            
             elif message["type"] == "compliance_check":
                 # Run compliance check
                 soap_note = message["soap_note"]
@@ -170,17 +437,53 @@ async def websocket_transcription(websocket: WebSocket):
                     websocket
                 )
                 
+            elif message["type"] == "submit_job":
+                # Queue AI work that keeps running if this socket disconnects
+                if not websocket_manager.admit_request(websocket, inflight(), message):
+                    continue
+                try:
+                    job = await job_queue.submit(
+                        message["kind"],
+                        message.get("payload", {}),
+                        session_id=join_session(message.get("session_id")),
+                        priority=message.get("priority")
+                    )
+                except (UnknownJobKindError, InvalidJobPriorityError, InvalidJobPayloadError, JobQueueFullError) as e:
+                    await send_error(str(e))
+                    continue
+                
+                job_ids.add(job["job_id"])
+                await websocket_manager.send_personal_message(
+                    json.dumps({
+                        "type": "job_submitted",
+                        "data": job
+                    }),
+                    websocket
+                )
+            
+            elif message["type"] == "subscribe_jobs":
+                # Receive job_progress events for a session's jobs (e.g. after reconnecting)
+                join_session(message["session_id"])
+            
+            elif message["type"] == "ping":
+                # Client-side heartbeat
+                await websocket_manager.send_personal_message(json.dumps({"type": "pong"}), websocket)
+            
+            elif message["type"] == "pong":
+                # Reply to the server heartbeat; receiving it already marked the socket alive
+                pass
+    
     except WebSocketDisconnect:
-        websocket_manager.disconnect(websocket)
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        await websocket_manager.send_personal_message(
-            json.dumps({
-                "type": "error",
-                "message": str(e)
-            }),
-            websocket
-        )
+        await send_error(str(e))
+        await websocket_manager.close_connection(websocket, code=1011)
+    finally:
+        websocket_manager.disconnect(websocket)
+        job_queue.remove_listener(forward_job_event)
+        if transcript_stream:
+            transcript_stream.cancel()
 
 if __name__ == "__main__":
     uvicorn.run(
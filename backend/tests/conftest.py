@@ -0,0 +1,38 @@
+"""
+Shared test setup
+
+Settings are read when the app modules are first imported, so throwaway
+storage is configured here before any test imports them.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_storage = tempfile.mkdtemp(prefix="skribe-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_storage}/skribe.db"
+os.environ["CACHE_DB_PATH"] = os.path.join(_storage, "cache.db")
+os.environ["JOB_AUDIO_DIR"] = os.path.join(_storage, "job_audio")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a fresh event loop, closing pooled DB connections afterwards"""
+    from app.models.database import async_engine
+
+    def run_coroutine(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+
+    return run_coroutine
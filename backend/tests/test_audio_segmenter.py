@@ -0,0 +1,119 @@
+"""
+Tests for silence-aware segmentation of long recordings
+"""
+
+import array
+import io
+import wave
+
+import pytest
+
+from app.services import audio_segmenter
+from app.services.audio_segmenter import (
+    SAMPLE_WIDTH,
+    TARGET_SAMPLE_RATE,
+    WAV_HEADER_BYTES,
+    max_segment_seconds,
+    split_pcm,
+)
+
+RATE = TARGET_SAMPLE_RATE
+BYTES_PER_SECOND = RATE * SAMPLE_WIDTH
+
+
+def loud(seconds: float) -> bytes:
+    samples = int(seconds * RATE)
+    return array.array("h", [8000, -8000] * (samples // 2)).tobytes()
+
+
+def silence(seconds: float) -> bytes:
+    return bytes(int(seconds * RATE) * SAMPLE_WIDTH)
+
+
+def wav_duration(wav_bytes: bytes) -> float:
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+        assert wav_file.getframerate() == RATE
+        assert wav_file.getnchannels() == 1
+        return wav_file.getnframes() / RATE
+
+
+def test_short_audio_is_a_single_segment():
+    pcm = loud(10)
+
+    segments = split_pcm(pcm, RATE, segment_seconds=30, overlap_seconds=1, search_seconds=5)
+
+    assert len(segments) == 1
+    assert (segments[0].start, segments[0].end, segments[0].offset) == (0.0, 10.0, 0.0)
+    assert wav_duration(segments[0].wav_bytes) == pytest.approx(10.0)
+
+
+def test_cuts_snap_to_silence_near_the_target():
+    # Quiet stretches at 27-28s and 56-57s; targets are every 30s
+    pcm = loud(27) + silence(1) + loud(28) + silence(1) + loud(13)
+
+    segments = split_pcm(pcm, RATE, segment_seconds=30, overlap_seconds=1, search_seconds=5)
+
+    assert len(segments) == 3
+    assert 27.0 <= segments[0].end < 28.0
+    assert 56.0 <= segments[1].end < 57.0
+    # Owned spans tile the recording with no gaps
+    assert segments[0].start == 0.0
+    assert segments[-1].end == pytest.approx(70.0)
+    for previous, current in zip(segments, segments[1:]):
+        assert current.start == previous.end
+
+
+def test_segments_are_padded_with_overlap():
+    pcm = loud(27) + silence(1) + loud(28) + silence(1) + loud(13)
+
+    segments = split_pcm(pcm, RATE, segment_seconds=30, overlap_seconds=1, search_seconds=5)
+
+    for segment in segments:
+        assert segment.offset == pytest.approx(max(0.0, segment.start - 1), abs=1e-3)
+        expected = min(70.0, segment.end + 1) - segment.offset
+        assert wav_duration(segment.wav_bytes) == pytest.approx(expected, abs=1e-3)
+
+
+def test_cut_stays_within_the_search_window_without_silence():
+    pcm = loud(100)
+
+    segments = split_pcm(pcm, RATE, segment_seconds=30, overlap_seconds=1, search_seconds=5)
+
+    for segment in segments[:-1]:
+        assert 25.0 <= segment.end - segment.start <= 35.0
+
+
+def test_segment_bytes_never_exceed_the_budget():
+    pcm = loud(300)
+    max_bytes = 20 * BYTES_PER_SECOND
+
+    segments = split_pcm(pcm, RATE, segment_seconds=120, overlap_seconds=1, search_seconds=5, max_segment_bytes=max_bytes)
+
+    assert len(segments) > 1
+    assert all(len(segment.wav_bytes) <= max_bytes for segment in segments)
+
+
+def test_max_segment_seconds_budgets_overlap_and_search():
+    seconds = max_segment_seconds(RATE, WAV_HEADER_BYTES + 60 * BYTES_PER_SECOND, overlap_seconds=2, search_seconds=10)
+
+    assert seconds == pytest.approx(60 - 4 - 10)
+
+
+def test_max_segment_seconds_rejects_budget_smaller_than_padding():
+    with pytest.raises(ValueError):
+        max_segment_seconds(RATE, 5 * BYTES_PER_SECOND, overlap_seconds=2, search_seconds=10)
+
+
+@pytest.mark.skipif(audio_segmenter.audioop is None, reason="audioop is not available")
+def test_wav_input_is_converted_to_16khz_mono():
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(48000)
+        wav_file.writeframes(bytes(48000 * 2 * SAMPLE_WIDTH * 3))
+
+    pcm, sample_rate = audio_segmenter._wav_to_mono16(buffer.getvalue())
+
+    assert sample_rate == RATE
+    assert len(pcm) == pytest.approx(3 * BYTES_PER_SECOND, abs=SAMPLE_WIDTH * 4)
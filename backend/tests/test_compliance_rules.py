@@ -0,0 +1,261 @@
+"""
+Tests for the rule-based SOAP compliance engine
+"""
+
+import copy
+
+import pytest
+
+from app.core.config import settings
+from app.services.ai_service import AIService
+from app.services.compliance_rules import RULES, SEVERITY_WEIGHTS, build_report, evaluate_soap_note, is_missing
+
+REPORT_KEYS = {"compliance_score", "missing_items", "recommendations", "overall_assessment", "engine"}
+
+COMPLETE_NOTE = {
+    "subjective": {
+        "chief_complaint": "Cough for one week",
+        "history_present_illness": "Dry cough, worse at night, no fever",
+        "review_of_systems": "Negative for chest pain and dyspnea",
+        "past_medical_history": "Asthma as a child",
+        "medications": ["Cetirizine 10 mg daily"],
+        "allergies": "No known drug allergies",
+        "social_history": "Non-smoker, teacher",
+    },
+    "objective": {
+        "vital_signs": {
+            "blood_pressure": "122/78",
+            "heart_rate": "72",
+            "temperature": "36.8 C",
+            "respiratory_rate": "14",
+            "oxygen_saturation": "98%",
+        },
+        "physical_exam": "Lungs clear to auscultation bilaterally",
+    },
+    "assessment": {
+        "primary_diagnosis": "Post-viral cough",
+        "clinical_impression": "Likely self-limiting",
+    },
+    "plan": {
+        "treatment": "Honey and fluids; inhaled steroid if persists",
+        "follow_up": "Return in two weeks if not improved",
+        "patient_education": "Discussed red-flag symptoms",
+    },
+}
+
+
+def without(path, marker="Not discussed"):
+    note = copy.deepcopy(COMPLETE_NOTE)
+    target = note
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = marker
+    return note
+
+
+@pytest.mark.parametrize("value, missing", [
+    (None, True),
+    ("", True),
+    ("   ", True),
+    ("Not discussed.", True),
+    ("N/A", True),
+    ("None documented", True),
+    ("Allergies if mentioned", True),
+    ([], True),
+    (["", "unknown"], True),
+    ({"a": None, "b": "not recorded"}, True),
+    ("No known drug allergies", False),
+    ("0", False),
+    (0, False),
+    (["Aspirin 81 mg"], False),
+    ({"a": None, "b": "120/80"}, False),
+])
+def test_is_missing(value, missing):
+    assert is_missing(value) is missing
+
+
+def test_complete_note_passes_every_rule():
+    report = evaluate_soap_note(COMPLETE_NOTE)
+
+    assert set(report) == REPORT_KEYS
+    assert report["compliance_score"] == 100
+    assert report["missing_items"] == []
+    assert report["recommendations"] == []
+    assert report["engine"] == "rules"
+    assert report["overall_assessment"] == "Complete documentation with minimal gaps"
+
+
+@pytest.mark.parametrize("rule", RULES, ids=lambda rule: ".".join(rule.path))
+def test_each_rule_fails_when_its_field_is_missing(rule):
+    report = evaluate_soap_note(without(rule.path))
+
+    assert [item["item"] for item in report["missing_items"]] == [rule.item]
+    item = report["missing_items"][0]
+    # The complete note documents an exam, which raises low-severity vitals to medium
+    expected_severity = "medium" if rule.category == "Vital Signs" and rule.severity == "low" else rule.severity
+    assert item == {
+        "category": rule.category,
+        "item": rule.item,
+        "severity": expected_severity,
+        "suggestion": rule.suggestion,
+    }
+    assert report["compliance_score"] == 100 - SEVERITY_WEIGHTS[expected_severity]
+    assert (rule.suggestion in report["recommendations"]) is (expected_severity == "high")
+
+
+@pytest.mark.parametrize("rule", RULES, ids=lambda rule: ".".join(rule.path))
+def test_each_rule_fails_when_its_section_is_absent(rule):
+    note = copy.deepcopy(COMPLETE_NOTE)
+    del note[rule.path[0]]
+
+    assert rule.item in [item["item"] for item in evaluate_soap_note(note)["missing_items"]]
+
+
+def test_low_severity_vitals_stay_low_without_an_exam():
+    note = without(("objective", "physical_exam"))
+    note["objective"]["vital_signs"]["oxygen_saturation"] = None
+
+    severities = {item["item"]: item["severity"] for item in evaluate_soap_note(note)["missing_items"]}
+
+    assert severities["Oxygen saturation not recorded"] == "low"
+
+
+def test_empty_note_scores_zero_but_is_evaluated():
+    report = evaluate_soap_note({})
+
+    assert report["compliance_score"] == 0
+    assert len(report["missing_items"]) == len(RULES)
+    assert "invalid_input" not in report
+    assert report["overall_assessment"] == "Documentation is substantially incomplete"
+
+
+@pytest.mark.parametrize("note", [
+    {"parsing_error": "Expecting value", "raw_response": "{not json"},
+    {"error": "OpenAI request failed"},
+    None,
+    "not a note",
+], ids=["parsing_error", "error", "none", "string"])
+def test_unusable_notes_are_flagged_invalid(note):
+    report = evaluate_soap_note(note)
+
+    assert report["invalid_input"] is True
+    assert report["compliance_score"] == 0
+    assert report["missing_items"] == []
+    assert set(report) == REPORT_KEYS | {"invalid_input"}
+
+
+def finding(severity, name="Finding"):
+    return {"category": "Test", "item": name, "severity": severity, "suggestion": f"Fix {name}"}
+
+
+@pytest.mark.parametrize("severities, score, assessment", [
+    ([], 100, "Complete documentation with minimal gaps"),
+    (["high"], 90, "Complete documentation with minimal gaps"),
+    (["high", "low"], 88, "Good documentation with minor gaps"),
+    (["high", "high", "medium"], 75, "Good documentation with minor gaps"),
+    (["high", "high", "high", "low"], 68, "Documentation has several gaps that should be addressed"),
+    (["high"] * 5, 50, "Documentation has several gaps that should be addressed"),
+    (["high"] * 5 + ["low"], 48, "Documentation is substantially incomplete"),
+    (["high"] * 12, 0, "Documentation is substantially incomplete"),
+])
+def test_build_report_scores_and_assessment(severities, score, assessment):
+    report = build_report([finding(s, f"Finding {i}") for i, s in enumerate(severities)], engine="rules")
+
+    assert report["compliance_score"] == score
+    assert report["overall_assessment"] == assessment
+
+
+def test_build_report_recommends_high_severity_fixes_once():
+    items = [finding("high", "A"), finding("medium", "B"), finding("high", "A")]
+
+    report = build_report(items, engine="hybrid", recommendations=["Fix A", "Expand the HPI"])
+
+    assert report["recommendations"] == ["Fix A", "Expand the HPI"]
+    assert report["engine"] == "hybrid"
+
+
+class NarrativeReviewer(AIService):
+    """AIService whose narrative review is canned instead of sent to the model"""
+
+    def __init__(self, review):
+        super().__init__(client=None)
+        self.review = review
+        self.reviews = 0
+
+    async def _review_narrative_quality(self, soap_note):
+        self.reviews += 1
+        return self.review
+
+
+@pytest.fixture
+def compliance_mode(monkeypatch):
+    monkeypatch.setattr(settings, "AI_CACHE_ENABLED", False)
+
+    def set_mode(mode):
+        monkeypatch.setattr(settings, "COMPLIANCE_MODE", mode)
+
+    return set_mode
+
+
+def test_check_compliance_rules_mode_returns_the_rule_report(run, compliance_mode):
+    compliance_mode("rules")
+    service = NarrativeReviewer({"issues": [], "recommendations": []})
+
+    report = run(service.check_compliance(without(("plan", "follow_up"))))
+
+    assert set(report) == REPORT_KEYS
+    assert report["engine"] == "rules"
+    assert report["compliance_score"] == 90
+    assert service.reviews == 0
+
+
+def test_check_compliance_hybrid_merges_the_narrative_review(run, compliance_mode):
+    compliance_mode("hybrid")
+    issue = {
+        "category": "Narrative",
+        "item": "Assessment does not justify the diagnosis",
+        "severity": "medium",
+        "suggestion": "Link the diagnosis to the exam findings",
+    }
+    service = NarrativeReviewer({"issues": [issue], "recommendations": ["Expand the HPI"]})
+
+    report = run(service.check_compliance(without(("plan", "follow_up"))))
+
+    assert set(report) == REPORT_KEYS
+    assert report["engine"] == "hybrid"
+    assert [item["item"] for item in report["missing_items"]] == ["Follow-up instructions missing", issue["item"]]
+    assert report["compliance_score"] == 85
+    assert report["recommendations"][0] == "Expand the HPI"
+    assert service.reviews == 1
+
+
+def test_check_compliance_hybrid_reviews_a_zero_score_note(run, compliance_mode):
+    compliance_mode("hybrid")
+    service = NarrativeReviewer({"issues": [], "recommendations": []})
+
+    report = run(service.check_compliance({}))
+
+    assert report["compliance_score"] == 0
+    assert report["engine"] == "hybrid"
+    assert service.reviews == 1
+
+
+def test_check_compliance_hybrid_skips_review_of_invalid_notes(run, compliance_mode):
+    compliance_mode("hybrid")
+    service = NarrativeReviewer({"issues": [], "recommendations": []})
+
+    report = run(service.check_compliance({"parsing_error": "Expecting value"}))
+
+    assert report["invalid_input"] is True
+    assert report["engine"] == "rules"
+    assert service.reviews == 0
+
+
+def test_check_compliance_hybrid_falls_back_to_rules_when_review_fails(run, compliance_mode):
+    compliance_mode("hybrid")
+    service = NarrativeReviewer({"error": "timeout"})
+
+    report = run(service.check_compliance(COMPLETE_NOTE))
+
+    assert report["engine"] == "rules"
+    assert report["compliance_score"] == 100
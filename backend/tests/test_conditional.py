@@ -0,0 +1,95 @@
+"""
+Tests for conditional GET handling (ETag / Last-Modified / 304)
+"""
+
+from datetime import datetime
+
+from fastapi import Request
+
+from app.api.conditional import _etag_matches, _http_date, _not_modified_since, conditional_response
+from app.services.session_cache import CachedRead, make_etag
+
+UPDATED_AT = datetime(2024, 3, 1, 12, 30, 15, 250000)
+ETAG = make_etag("session", "abc", UPDATED_AT)
+CACHED = CachedRead(body=b'{"session_id":"abc"}', etag=ETAG, last_modified=UPDATED_AT, stored_at=0.0)
+
+
+def make_request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/sessions/abc",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_etag_changes_with_updated_at_and_view():
+    assert make_etag("session", "abc", UPDATED_AT) == ETAG
+    assert make_etag("session", "abc", datetime(2024, 3, 1, 12, 30, 16)) != ETAG
+    assert make_etag("patient_summary", "abc", UPDATED_AT) != ETAG
+
+
+def test_etag_matching():
+    assert _etag_matches(ETAG, ETAG)
+    assert _etag_matches(f'"other", {ETAG}', ETAG)
+    assert _etag_matches(f"W/{ETAG}", ETAG)
+    assert _etag_matches(" * ", ETAG)
+    assert not _etag_matches('"other"', ETAG)
+    assert not _etag_matches(ETAG.strip('"'), ETAG)
+
+
+def test_not_modified_since_ignores_subsecond_precision():
+    assert _http_date(UPDATED_AT) == "Fri, 01 Mar 2024 12:30:15 GMT"
+    assert _not_modified_since("Fri, 01 Mar 2024 12:30:15 GMT", UPDATED_AT)
+    assert _not_modified_since("Fri, 01 Mar 2024 13:00:00 GMT", UPDATED_AT)
+    assert not _not_modified_since("Fri, 01 Mar 2024 12:30:14 GMT", UPDATED_AT)
+    assert not _not_modified_since("not a date", UPDATED_AT)
+
+
+def test_unconditional_request_gets_body_and_validators():
+    response = conditional_response(make_request(), CACHED, "private, no-cache")
+
+    assert response.status_code == 200
+    assert response.body == CACHED.body
+    assert response.media_type == "application/json"
+    assert response.headers["etag"] == ETAG
+    assert response.headers["last-modified"] == "Fri, 01 Mar 2024 12:30:15 GMT"
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_matching_if_none_match_returns_304():
+    response = conditional_response(make_request(if_none_match=ETAG), CACHED, "private, no-cache")
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == ETAG
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_stale_if_none_match_returns_200():
+    response = conditional_response(make_request(if_none_match='"stale"'), CACHED, "private, no-cache")
+
+    assert response.status_code == 200
+    assert response.body == CACHED.body
+
+
+def test_if_modified_since_returns_304_when_current():
+    current = conditional_response(
+        make_request(if_modified_since="Fri, 01 Mar 2024 12:30:15 GMT"), CACHED, "private, max-age=60"
+    )
+    stale = conditional_response(
+        make_request(if_modified_since="Fri, 01 Mar 2024 12:00:00 GMT"), CACHED, "private, max-age=60"
+    )
+
+    assert current.status_code == 304
+    assert stale.status_code == 200
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    response = conditional_response(
+        make_request(if_none_match='"stale"', if_modified_since="Fri, 01 Mar 2024 13:00:00 GMT"),
+        CACHED,
+        "private, no-cache"
+    )
+
+    assert response.status_code == 200
@@ -0,0 +1,84 @@
+"""
+Tests for the streamed JSON object parser
+"""
+
+import json
+
+from app.services.incremental_json import IncrementalObjectParser
+
+
+def feed_all(parser, chunks):
+    completed = []
+    for chunk in chunks:
+        completed.extend(parser.feed(chunk))
+    return completed
+
+
+def test_fields_complete_as_soon_as_their_value_closes():
+    parser = IncrementalObjectParser()
+
+    assert parser.feed('{"subjective": {"chief_complaint": "cou') == []
+    assert parser.feed('gh"}, "objec') == [("subjective", {"chief_complaint": "cough"})]
+    assert parser.feed('tive": {"vitals": [120, 80]}') == []
+    assert parser.feed(', "plan": "rest"}') == [
+        ("objective", {"vitals": [120, 80]}),
+        ("plan", "rest"),
+    ]
+    assert parser.done
+
+
+def test_token_by_token_feed_matches_whole_object():
+    note = {
+        "subjective": {"history": "Pain for 3 days, worse at night"},
+        "objective": {"exam": ["lungs clear", "no edema"]},
+        "assessment": "Viral URI",
+        "plan": {"follow_up": None, "tests": []},
+    }
+    text = json.dumps(note)
+
+    completed = feed_all(IncrementalObjectParser(), text)
+
+    assert dict(completed) == note
+    assert [key for key, _ in completed] == list(note)
+
+
+def test_escaped_quotes_and_brackets_inside_strings():
+    parser = IncrementalObjectParser()
+    text = r'{"subjective": "He said \"it hurts }]\" \\", "plan": "x, y: {z}"}'
+
+    completed = feed_all(parser, [text[i:i + 3] for i in range(0, len(text), 3)])
+
+    assert completed == [("subjective", 'He said "it hurts }]" \\'), ("plan", "x, y: {z}")]
+
+
+def test_escape_split_across_chunks():
+    parser = IncrementalObjectParser()
+
+    assert parser.feed('{"a": "one \\') == []
+    assert parser.feed('"quoted\\"", "b": 2}') == [("a", 'one "quoted"'), ("b", 2)]
+
+
+def test_text_before_the_object_is_ignored():
+    parser = IncrementalObjectParser()
+
+    completed = feed_all(parser, ["```json\n", '{"plan": "rest"}', "\n```"])
+
+    assert completed == [("plan", "rest")]
+    assert parser.text.startswith("```json")
+
+
+def test_malformed_field_is_skipped():
+    parser = IncrementalObjectParser()
+
+    completed = parser.feed('{"a": nope, "b": true}')
+
+    assert completed == [("b", True)]
+
+
+def test_incomplete_object_emits_only_closed_fields():
+    parser = IncrementalObjectParser()
+
+    completed = parser.feed('{"a": 1, "b": {"c": [1, 2')
+
+    assert completed == [("a", 1)]
+    assert not parser.done
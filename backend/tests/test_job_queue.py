@@ -0,0 +1,322 @@
+"""
+Tests for the persisted job queue: claiming, leases and recovery
+"""
+
+import asyncio
+import base64
+import os
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.database import AsyncSessionLocal, Job, create_tables
+from app.services import job_queue as job_queue_module
+from app.services.job_handlers import register_job_handlers
+from app.services.job_queue import JOB_COMPLETED, JOB_QUEUED, JOB_RUNNING, InvalidJobPayloadError, JobQueue
+
+
+def make_queue(**options) -> JobQueue:
+    options.setdefault("worker_count", 1)
+    options.setdefault("max_depth", 10)
+    options.setdefault("lease_seconds", 30.0)
+    options.setdefault("retry_delay", 0.01)
+    return JobQueue(**options)
+
+
+def unique_kind() -> str:
+    # Rows outlive each test, so every test uses kinds no other queue handles
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+async def load_row(job_id: str) -> Job:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Job).where(Job.job_id == job_id))
+
+
+async def wait_for_status(job_id: str, status: str, timeout: float = 2.0) -> Job:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        job = await load_row(job_id)
+        if job.status == status or loop.time() > deadline:
+            return job
+        await asyncio.sleep(0.01)
+
+
+def test_jobs_run_and_store_their_result(run):
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        kind = unique_kind()
+
+        async def handler(payload, session_id, report_progress):
+            await report_progress({"step": 1})
+            return {"echo": payload["value"]}
+
+        queue.register(kind, handler)
+        await queue.start()
+        try:
+            job = await queue.submit(kind, {"value": 42})
+            row = await wait_for_status(job["job_id"], JOB_COMPLETED)
+
+            assert row.result == {"echo": 42}
+            assert row.progress == {"step": 1}
+            assert row.owner == queue.owner
+            assert not queue.is_active(job["job_id"])
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_claim_error_keeps_the_worker_and_retries_the_job(run, monkeypatch):
+    claim_job = job_queue_module._claim_job
+    failures = []
+
+    async def flaky_claim(job_id, owner):
+        if not failures:
+            failures.append(job_id)
+            raise RuntimeError("database is locked")
+        return await claim_job(job_id, owner)
+
+    monkeypatch.setattr(job_queue_module, "_claim_job", flaky_claim)
+
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        kind = unique_kind()
+        ran = []
+
+        async def handler(payload, session_id, report_progress):
+            ran.append(payload["n"])
+            return {}
+
+        queue.register(kind, handler)
+        await queue.start()
+        try:
+            first = await queue.submit(kind, {"n": 1})
+            second = await queue.submit(kind, {"n": 2})
+
+            assert (await wait_for_status(first["job_id"], JOB_COMPLETED)).status == JOB_COMPLETED
+            assert (await wait_for_status(second["job_id"], JOB_COMPLETED)).status == JOB_COMPLETED
+            assert failures == [first["job_id"]]
+            assert sorted(ran) == [1, 2]
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_job_claimed_by_another_owner_is_skipped(run):
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        kind = unique_kind()
+        ran = []
+
+        async def handler(payload, session_id, report_progress):
+            ran.append(payload)
+            return {}
+
+        queue.register(kind, handler)
+        await queue.start()
+        try:
+            # Hold the only worker so the job is still queued when the other process claims it
+            blocker_kind = unique_kind()
+            release = asyncio.Event()
+
+            async def blocker(payload, session_id, report_progress):
+                await release.wait()
+                return {}
+
+            queue.register(blocker_kind, blocker)
+            await queue.submit(blocker_kind, {})
+            await asyncio.sleep(0.05)
+
+            job = await queue.submit(kind, {})
+            assert await job_queue_module._claim_job(job["job_id"], "other-host:1:abc") is not None
+            release.set()
+            await asyncio.sleep(0.1)
+
+            row = await load_row(job["job_id"])
+            assert ran == []
+            assert (row.status, row.owner) == (JOB_RUNNING, "other-host:1:abc")
+            assert not queue.is_active(job["job_id"])
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_expired_lease_is_reclaimed_and_run(run):
+    async def scenario():
+        await create_tables()
+        kind = unique_kind()
+        job_id = str(uuid.uuid4())
+        stale = datetime.utcnow() - timedelta(seconds=60)
+        async with AsyncSessionLocal() as db:
+            db.add(Job(
+                job_id=job_id, kind=kind, status=JOB_RUNNING, priority=5, payload={},
+                owner="crashed-host:1:abc", heartbeat_at=stale, created_at=stale, started_at=stale
+            ))
+            await db.commit()
+
+        queue = make_queue(lease_seconds=0.3)
+
+        async def handler(payload, session_id, report_progress):
+            return {"recovered": True}
+
+        queue.register(kind, handler)
+        await queue.start()
+        try:
+            row = await wait_for_status(job_id, JOB_COMPLETED)
+            assert row.result == {"recovered": True}
+            assert row.owner == queue.owner
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_live_lease_is_not_reclaimed(run):
+    async def scenario():
+        await create_tables()
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            db.add(Job(
+                job_id=job_id, kind=unique_kind(), status=JOB_RUNNING, priority=5, payload={},
+                owner="live-host:1:abc", heartbeat_at=now, created_at=now, started_at=now
+            ))
+            await db.commit()
+
+        assert job_id not in [job["job_id"] for job in await job_queue_module._reclaim_stale_jobs(30.0)]
+        assert (await load_row(job_id)).owner == "live-host:1:abc"
+
+    run(scenario())
+
+
+def test_stop_hands_running_jobs_back(run):
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        kind = unique_kind()
+        started = asyncio.Event()
+
+        async def handler(payload, session_id, report_progress):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue.register(kind, handler)
+        await queue.start()
+        job = await queue.submit(kind, {})
+        await asyncio.wait_for(started.wait(), 2.0)
+        assert (await load_row(job["job_id"])).status == JOB_RUNNING
+
+        await queue.stop()
+
+        row = await load_row(job["job_id"])
+        assert (row.status, row.owner) == (JOB_QUEUED, None)
+
+        # The next start picks it up again
+        resumed = make_queue()
+
+        async def finish(payload, session_id, report_progress):
+            return {"resumed": True}
+
+        resumed.register(kind, finish)
+        await resumed.start()
+        try:
+            assert (await wait_for_status(job["job_id"], JOB_COMPLETED)).result == {"resumed": True}
+        finally:
+            await resumed.stop()
+
+    run(scenario())
+
+
+class FakeTranscriptionService:
+    def __init__(self):
+        self.received = []
+
+    async def transcribe_bytes(self, audio_bytes, filename):
+        self.received.append((audio_bytes, filename))
+        return "Patient reports a mild headache."
+
+
+def test_transcription_audio_is_kept_out_of_the_jobs_table(run):
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        services = SimpleNamespace(transcription_service=FakeTranscriptionService(), ai_service=None)
+        register_job_handlers(queue, services)
+        await queue.start()
+        try:
+            job = await queue.submit("transcription", {"audio": base64.b64encode(b"RIFF-audio").decode(), "format": "wav"})
+            row = await wait_for_status(job["job_id"], JOB_COMPLETED)
+
+            assert set(row.payload) == {"audio_file", "format"}
+            assert row.result == {"transcript": "Patient reports a mild headache.", "incomplete": False, "failed_segments": []}
+            assert services.transcription_service.received == [(b"RIFF-audio", "audio.wav")]
+            # The stored audio is removed once the job has finished
+            assert not os.path.exists(os.path.join(settings.JOB_AUDIO_DIR, row.payload["audio_file"]))
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_invalid_transcription_payload_is_rejected(run):
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        register_job_handlers(queue, SimpleNamespace(transcription_service=FakeTranscriptionService(), ai_service=None))
+        await queue.start()
+        try:
+            for payload in (
+                {"format": "wav"},
+                {"audio": "bm90IGF1ZGlv", "format": "../../etc/passwd"},
+                {"audio": "not base64!", "format": "wav"},
+            ):
+                with pytest.raises(InvalidJobPayloadError):
+                    await queue.submit("transcription", payload)
+            assert queue.depth == 0
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_transcription_job_reports_failed_segments(run, monkeypatch):
+    monkeypatch.setattr(settings, "LONG_AUDIO_THRESHOLD_BYTES", 0)
+
+    class PartialLongTranscription(FakeTranscriptionService):
+        async def transcribe_long_audio(self, audio_bytes, filename, on_progress=None):
+            await on_progress(2, 2)
+            return {
+                "text": "First half only.",
+                "incomplete": True,
+                "failed_segments": [{"index": 1, "start": 300.0, "end": 600.0}],
+            }
+
+    async def scenario():
+        await create_tables()
+        queue = make_queue()
+        register_job_handlers(queue, SimpleNamespace(transcription_service=PartialLongTranscription(), ai_service=None))
+        await queue.start()
+        try:
+            job = await queue.submit("transcription", {"audio": base64.b64encode(b"long-audio").decode(), "format": "wav"})
+            row = await wait_for_status(job["job_id"], JOB_COMPLETED)
+
+            assert row.result == {
+                "transcript": "First half only.",
+                "incomplete": True,
+                "failed_segments": [{"index": 1, "start": 300.0, "end": 600.0}],
+            }
+        finally:
+            await queue.stop()
+
+    run(scenario())
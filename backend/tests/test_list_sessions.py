@@ -0,0 +1,89 @@
+"""
+Tests for session list pagination (cursor, and the deprecated offset)
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.api.sessions import list_sessions
+from app.models.database import AsyncSessionLocal, Session, create_tables
+
+
+async def create_doctor_sessions(count: int) -> str:
+    # A doctor name of its own keeps other tests' sessions out of the listing
+    doctor = f"Dr. {uuid.uuid4().hex[:8]}"
+    start = datetime(2024, 1, 1)
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            Session(session_id=f"{doctor}-{i}", doctor_name=doctor, patient_name="Pat", created_at=start + timedelta(minutes=i))
+            for i in range(count)
+        ])
+        await db.commit()
+    return doctor
+
+
+async def list_page(doctor: str, **params):
+    response = Response()
+    async with AsyncSessionLocal() as db:
+        sessions = await list_sessions(
+            response,
+            limit=params.get("limit", 50),
+            cursor=params.get("cursor"),
+            offset=params.get("offset", 0),
+            doctor_name=doctor,
+            patient_name=None,
+            created_from=None,
+            created_to=None,
+            include_total=params.get("include_total", False),
+            db=db
+        )
+    return [session["session_id"] for session in sessions], response.headers
+
+
+def test_cursor_pages_cover_every_session_once(run):
+    async def scenario():
+        await create_tables()
+        doctor = await create_doctor_sessions(5)
+
+        first, headers = await list_page(doctor, limit=2, include_total=True)
+        assert first == [f"{doctor}-4", f"{doctor}-3"]
+        assert headers["x-total-count"] == "5"
+
+        seen, cursor = list(first), headers["x-next-cursor"]
+        while cursor:
+            page, headers = await list_page(doctor, limit=2, cursor=cursor)
+            seen += page
+            cursor = headers.get("x-next-cursor")
+        assert seen == [f"{doctor}-{i}" for i in reversed(range(5))]
+
+    run(scenario())
+
+
+def test_deprecated_offset_still_pages(run):
+    async def scenario():
+        await create_tables()
+        doctor = await create_doctor_sessions(5)
+
+        page, headers = await list_page(doctor, limit=2, offset=2)
+
+        assert page == [f"{doctor}-2", f"{doctor}-1"]
+        assert headers["deprecation"] == "true"
+        assert "x-next-cursor" in headers
+
+    run(scenario())
+
+
+def test_cursor_and_offset_together_are_rejected(run):
+    async def scenario():
+        await create_tables()
+        doctor = await create_doctor_sessions(3)
+        _, headers = await list_page(doctor, limit=1)
+
+        with pytest.raises(HTTPException) as error:
+            await list_page(doctor, cursor=headers["x-next-cursor"], offset=1)
+        assert error.value.status_code == 400
+
+    run(scenario())
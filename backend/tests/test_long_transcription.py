@@ -0,0 +1,47 @@
+"""
+Tests for stitching per-segment Whisper results of long recordings
+"""
+
+from app.services.audio_segmenter import AudioSegment
+from app.services.transcription_service import TranscriptionService
+
+SEGMENTS = [
+    AudioSegment(index=0, start=0.0, end=10.0, offset=0.0, wav_bytes=b""),
+    AudioSegment(index=1, start=10.0, end=20.0, offset=8.0, wav_bytes=b""),
+    AudioSegment(index=2, start=20.0, end=30.0, offset=18.0, wav_bytes=b""),
+]
+
+
+def whisper(*segments):
+    return {
+        "text": " ".join(text for _, _, text in segments),
+        "language": "en",
+        "segments": [{"start": start, "end": end, "text": text} for start, end, text in segments],
+    }
+
+
+RESULTS = [
+    whisper((0.0, 4.0, "Good morning."), (4.0, 9.5, "What brings you in?")),
+    # The first Whisper segment lies in the overlap already owned by segment 0
+    whisper((0.0, 1.5, "brings you in?"), (2.5, 8.0, "I have had a cough.")),
+    whisper((3.0, 9.0, "For about a week.")),
+]
+
+
+def test_overlap_is_kept_once_and_times_are_shifted():
+    stitched = TranscriptionService._stitch_segments(SEGMENTS, RESULTS)
+
+    assert stitched["text"] == "Good morning. What brings you in? I have had a cough. For about a week."
+    assert [(item["start"], item["end"]) for item in stitched["segments"]] == [
+        (0.0, 4.0), (4.0, 9.5), (10.5, 16.0), (21.0, 27.0)
+    ]
+    assert stitched["incomplete"] is False
+    assert stitched["failed_segments"] == []
+
+
+def test_failed_segments_are_reported():
+    stitched = TranscriptionService._stitch_segments(SEGMENTS, [RESULTS[0], None, RESULTS[2]])
+
+    assert stitched["text"] == "Good morning. What brings you in? For about a week."
+    assert stitched["incomplete"] is True
+    assert stitched["failed_segments"] == [{"index": 1, "start": 10.0, "end": 20.0}]
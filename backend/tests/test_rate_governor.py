@@ -0,0 +1,343 @@
+"""
+Tests for the OpenAI rate governor and governed requests
+"""
+
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.core.config import settings
+from app.services import openai_client, rate_governor
+from app.services.openai_client import GovernedStream, openai_request
+from app.services.rate_governor import ModelGovernor, TokenBucket, backoff_delay, get_governor
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def rate_limit_error(**headers) -> openai.RateLimitError:
+    response = httpx.Response(429, headers=headers, request=REQUEST)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def unique_model() -> str:
+    # Governors are per process; each test gets a model of its own
+    return f"test-model-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture(autouse=True)
+def fresh_semaphore(monkeypatch):
+    # The process-wide request semaphore is bound to the loop that first waits on it
+    monkeypatch.setattr(openai_client, "_semaphore", None)
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(rate_governor.random, "uniform", lambda low, high: 0.0)
+
+
+# TokenBucket
+
+def test_bucket_starts_full_and_debits():
+    bucket = TokenBucket(60)
+    now = bucket._updated
+
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.consume(45, now)
+    assert bucket.available == 15
+    # 1 unit per second refills the 15 missing units over 15 seconds
+    assert bucket.wait_time(30, now) == pytest.approx(15.0)
+
+
+def test_bucket_refills_continuously_up_to_capacity():
+    bucket = TokenBucket(60)
+    now = bucket._updated
+    bucket.consume(60, now)
+
+    assert bucket.wait_time(10, now + 4) == pytest.approx(6.0)
+    assert bucket.wait_time(10, now + 10) == 0.0
+    assert bucket.wait_time(1, now + 600) == 0.0
+    assert bucket.available == 60
+
+
+def test_request_larger_than_the_budget_waits_for_a_full_bucket():
+    bucket = TokenBucket(60)
+    now = bucket._updated
+
+    assert bucket.wait_time(500, now) == 0.0
+    bucket.consume(500, now)
+    assert bucket.available == 0
+    assert bucket.wait_time(500, now) == pytest.approx(60.0)
+
+
+def test_adjust_charges_and_refunds_without_overfilling():
+    bucket = TokenBucket(100)
+    now = bucket._updated
+    bucket.consume(50, now)
+
+    bucket.adjust(20)
+    assert bucket.available == 30
+    bucket.adjust(-500)
+    assert bucket.available == 100
+
+
+def test_zero_budget_is_unlimited():
+    bucket = TokenBucket(0)
+
+    assert bucket.unlimited
+    bucket.consume(10 ** 9, time.monotonic())
+    assert bucket.wait_time(10 ** 9, time.monotonic()) == 0.0
+
+
+# ModelGovernor
+
+def test_pause_holds_every_waiter(run):
+    async def scenario():
+        governor = ModelGovernor("m", rpm=0, tpm=0)
+        governor.pause(0.1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        await asyncio.gather(governor.acquire(10), governor.acquire(10))
+
+        assert loop.time() - started >= 0.1
+        assert governor.rate_limited == 1
+        assert governor.waiting == 0
+
+    run(scenario())
+
+
+def test_waiters_are_admitted_in_arrival_order(run):
+    async def scenario():
+        governor = ModelGovernor("m", rpm=600, tpm=0)
+        # Leave one request in the bucket; the rest refill at 10 per second
+        governor.requests.available = 1
+        admitted = []
+
+        async def caller(name):
+            await governor.acquire(0)
+            admitted.append(name)
+
+        await asyncio.gather(*(caller(name) for name in "abc"))
+
+        assert admitted == ["a", "b", "c"]
+
+    run(scenario())
+
+
+def test_reconcile_corrects_the_token_estimate():
+    governor = ModelGovernor("m", rpm=0, tpm=1000)
+    governor.tokens.consume(400, governor.tokens._updated)
+
+    governor.reconcile(400, 150)
+
+    assert governor.tokens.available == 850
+
+
+def test_governor_limits_come_from_settings(monkeypatch):
+    model = unique_model()
+    monkeypatch.setitem(settings.OPENAI_RATE_LIMITS, model, {"rpm": 7, "tpm": 900})
+
+    governor = get_governor(model)
+
+    assert (governor.requests.capacity, governor.tokens.capacity) == (7, 900)
+    assert get_governor(model) is governor
+
+
+# Backoff
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after": "3"}, 3.0),
+    ({"retry-after-ms": "250", "retry-after": "3"}, 0.25),
+    ({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "20ms"}, 0.02),
+    ({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1m30s"}, 90.0),
+    # Only budgets that are exhausted count; the longest reset wins
+    ({
+        "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s",
+        "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "6.5s",
+    }, 6.5),
+    ({"x-ratelimit-remaining-tokens": "12", "x-ratelimit-reset-tokens": "10s"}, None),
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+    ({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "soon"}, None),
+    ({}, None),
+])
+def test_retry_after_headers(headers, expected):
+    assert rate_governor._retry_after(rate_limit_error(**headers)) == expected
+
+
+def test_backoff_honors_retry_after(no_jitter):
+    assert backoff_delay(rate_limit_error(**{"retry-after": "4"}), attempt=0) == 4.0
+
+
+def test_backoff_is_exponential_and_capped(no_jitter, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(settings, "OPENAI_BACKOFF_MAX", 5.0)
+    error = openai.APIConnectionError(request=REQUEST)
+
+    assert [backoff_delay(error, attempt) for attempt in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_backoff_jitter_never_shortens_the_delay():
+    error = rate_limit_error(**{"retry-after": "2"})
+
+    delays = [backoff_delay(error, 0) for _ in range(50)]
+
+    assert all(2.0 <= delay <= 3.0 for delay in delays)
+
+
+# Governed requests
+
+def test_rate_limit_pauses_the_model_and_retries(run, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_MAX_RETRIES", 2)
+    model = unique_model()
+    attempts = []
+
+    async def create():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise rate_limit_error(**{"retry-after-ms": "50"})
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+    async def scenario():
+        response = await openai_request(model, create, estimated_tokens=100)
+
+        governor = get_governor(model)
+        assert response.usage.total_tokens == 10
+        assert len(attempts) == 2
+        assert attempts[1] - attempts[0] >= 0.05
+        assert governor.rate_limited == 1
+        assert governor.in_flight == 0
+        assert openai_client._get_semaphore()._value == settings.OPENAI_MAX_CONCURRENT_REQUESTS
+
+    run(scenario())
+
+
+def test_non_retryable_errors_fail_immediately(run):
+    model = unique_model()
+    attempts = []
+
+    async def create():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await openai_request(model, create)
+        assert attempts == [1]
+        assert get_governor(model).in_flight == 0
+
+    run(scenario())
+
+
+# Streams
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = 0
+
+    async def aclose(self):
+        self.closed += 1
+
+
+class FakeStream:
+    """Stands in for openai.AsyncStream"""
+
+    def __init__(self, chunks, error=None):
+        self._chunks = list(chunks)
+        self._error = error
+        self.response = FakeResponse()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._chunks:
+            return self._chunks.pop(0)
+        if self._error is not None:
+            raise self._error
+        raise StopAsyncIteration
+
+
+def chunk(text, usage=None):
+    return SimpleNamespace(text=text, usage=usage)
+
+
+def governed(stream, estimated_tokens=100):
+    governor = ModelGovernor("m", rpm=0, tpm=1000)
+    governor.tokens.consume(estimated_tokens, governor.tokens._updated)
+    releases = []
+    return GovernedStream(stream, lambda: releases.append(1), governor, estimated_tokens), governor, releases
+
+
+def test_stream_releases_its_slot_and_reconciles_usage_when_exhausted(run):
+    async def scenario():
+        stream = FakeStream([chunk("a"), chunk("b"), chunk("", usage={"total_tokens": 30})])
+        governed_stream, governor, releases = governed(stream)
+
+        texts = [item.text async for item in governed_stream]
+
+        assert texts == ["a", "b", ""]
+        assert releases == [1]
+        assert governor.tokens.available == 970
+        assert stream.response.closed == 1
+
+    run(scenario())
+
+
+def test_stream_closed_early_releases_once_and_keeps_the_estimate(run):
+    async def scenario():
+        stream = FakeStream([chunk("a"), chunk("b")])
+        governed_stream, governor, releases = governed(stream)
+
+        async with governed_stream:
+            async for _ in governed_stream:
+                break
+        await governed_stream.close()
+
+        assert releases == [1]
+        assert governor.tokens.available == 900
+        assert stream.response.closed == 1
+
+    run(scenario())
+
+
+def test_stream_error_releases_the_slot(run):
+    async def scenario():
+        stream = FakeStream([chunk("a")], error=openai.APIConnectionError(request=REQUEST))
+        governed_stream, _, releases = governed(stream)
+
+        with pytest.raises(openai.APIConnectionError):
+            async for _ in governed_stream:
+                pass
+
+        assert releases == [1]
+        assert stream.response.closed == 1
+
+    run(scenario())
+
+
+def test_streamed_request_holds_the_semaphore_until_closed(run, monkeypatch):
+    monkeypatch.setattr(openai, "AsyncStream", FakeStream)
+    model = unique_model()
+
+    async def scenario():
+        semaphore = openai_client._get_semaphore()
+        limit = semaphore._value
+
+        stream = await openai_request(model, lambda: asyncio.sleep(0, FakeStream([chunk("a")])), estimated_tokens=50)
+        assert isinstance(stream, GovernedStream)
+        assert semaphore._value == limit - 1
+        assert get_governor(model).in_flight == 1
+
+        async with stream:
+            pass
+
+        assert semaphore._value == limit
+        assert get_governor(model).in_flight == 0
+
+    run(scenario())
@@ -0,0 +1,92 @@
+"""
+Tests for stitching overlapping streaming transcription chunks
+"""
+
+import asyncio
+
+from app.services.streaming_transcription import TranscriptStream, stitch_overlap
+
+
+def test_repeated_words_at_the_boundary_are_dropped():
+    previous = "the patient reports chest pain since last night"
+
+    assert stitch_overlap(previous, "since last night and some nausea") == "and some nausea"
+
+
+def test_matching_ignores_case_and_punctuation():
+    previous = "She has had a cough, mostly at night."
+
+    assert stitch_overlap(previous, "Mostly at night. No fever though") == "No fever though"
+
+
+def test_no_overlap_keeps_the_whole_chunk():
+    assert stitch_overlap("first chunk of speech", "completely new words") == "completely new words"
+
+
+def test_single_repeated_word_is_not_treated_as_overlap():
+    # One common word is too weak a signal to drop
+    assert stitch_overlap("take it with water", "water every morning") == "water every morning"
+
+
+def test_empty_inputs():
+    assert stitch_overlap("", "  hello there ") == "hello there"
+    assert stitch_overlap("something said", "") == ""
+
+
+def test_fully_repeated_chunk_becomes_empty():
+    assert stitch_overlap("follow up in two weeks", "in two weeks") == ""
+
+
+class FakeTranscriptionService:
+    def __init__(self, texts):
+        self.texts = texts
+        self.calls = []
+
+    async def transcribe_bytes(self, audio_bytes, filename):
+        self.calls.append(audio_bytes)
+        await asyncio.sleep(0)
+        return self.texts[audio_bytes]
+
+
+def test_resent_chunks_are_not_emitted_twice(run):
+    async def scenario():
+        service = FakeTranscriptionService({b"a": "good morning doctor", b"b": "I have a cough"})
+        partials = []
+
+        async def on_partial(partial):
+            partials.append(partial)
+
+        stream = TranscriptStream(service, on_partial)
+        assert stream.add_chunk(b"a", seq=0)
+        await asyncio.sleep(0.01)
+        # Resent after a reconnect: already emitted, then still pending
+        assert not stream.add_chunk(b"a", seq=0)
+        assert stream.add_chunk(b"b", seq=1)
+        assert not stream.add_chunk(b"b", seq=1)
+
+        assert await stream.finish() == "good morning doctor I have a cough"
+        assert [partial["seq"] for partial in partials] == [0, 1]
+        assert service.calls == [b"a", b"b"]
+
+    run(scenario())
+
+
+def test_finishing_skips_a_missing_chunk_and_ignores_it_later(run):
+    async def scenario():
+        service = FakeTranscriptionService({b"a": "first part", b"c": "third part", b"b": "second part"})
+        partials = []
+
+        async def on_partial(partial):
+            partials.append(partial)
+
+        stream = TranscriptStream(service, on_partial)
+        stream.add_chunk(b"a", seq=0)
+        stream.add_chunk(b"c", seq=2)
+
+        assert await stream.finish() == "first part third part"
+        # The gap was skipped, so the late chunk cannot rewind the stream
+        assert not stream.add_chunk(b"b", seq=1)
+        assert await stream.finish() == "first part third part"
+        assert [partial["seq"] for partial in partials] == [0, 2]
+
+    run(scenario())
@@ -0,0 +1,73 @@
+"""
+Tests for token-budgeted transcript windows
+"""
+
+from app.services.transcript_chunker import chunk_transcript, estimate_tokens, split_turns
+
+
+def make_transcript(turns: int) -> str:
+    speakers = ("Doctor", "Patient")
+    return "\n".join(f"{speakers[i % 2]}: turn {i} " + "word " * 10 for i in range(turns))
+
+
+def test_split_turns_at_speaker_prefixes():
+    transcript = "Doctor: How are you?\nPatient: Tired.\nDr. Smith: Any fever?"
+
+    assert split_turns(transcript) == ["Doctor: How are you?", "Patient: Tired.", "Dr. Smith: Any fever?"]
+
+
+def test_split_turns_falls_back_to_paragraphs():
+    assert split_turns("first part\nstill first\n\n second part ") == ["first part\nstill first", "second part"]
+
+
+def test_short_transcript_is_one_window():
+    transcript = make_transcript(3)
+
+    assert chunk_transcript(transcript, max_tokens=1000, overlap_turns=2) == ["\n\n".join(split_turns(transcript))]
+
+
+def test_windows_fit_budget_and_keep_turns_whole():
+    transcript = make_transcript(40)
+    turns = split_turns(transcript)
+
+    windows = chunk_transcript(transcript, max_tokens=60)
+
+    assert len(windows) > 1
+    for window in windows:
+        assert estimate_tokens(window) <= 60
+        assert all(turn in turns for turn in window.split("\n\n"))
+    # Without overlap every turn appears exactly once, in order
+    assert [turn for window in windows for turn in window.split("\n\n")] == turns
+
+
+def test_overlap_repeats_last_turns_of_previous_window():
+    transcript = make_transcript(40)
+    turns = split_turns(transcript)
+
+    windows = [window.split("\n\n") for window in chunk_transcript(transcript, max_tokens=80, overlap_turns=1)]
+
+    assert len(windows) > 1
+    for previous, current in zip(windows, windows[1:]):
+        assert current[0] == previous[-1]
+    # Apart from the repeated turn, the windows still cover the transcript once
+    stitched = windows[0] + [turn for window in windows[1:] for turn in window[1:]]
+    assert stitched == turns
+
+
+def test_overlap_dropped_when_it_would_not_fit():
+    long_turn = "Patient: " + "word " * 60
+    transcript = f"Doctor: short\n{long_turn}"
+
+    windows = chunk_transcript(transcript, max_tokens=80, overlap_turns=1)
+
+    assert windows == ["Doctor: short", long_turn.strip()]
+
+
+def test_oversized_turn_is_split_at_sentences():
+    turn = "Patient: " + " ".join(f"Sentence number {i} is here." for i in range(30))
+
+    windows = chunk_transcript(turn, max_tokens=40)
+
+    assert len(windows) > 1
+    assert all(estimate_tokens(window) <= 40 for window in windows)
+    assert " ".join(windows) == turn
@@ -0,0 +1,161 @@
+"""
+Tests for the batched transcript chunk writer
+"""
+
+import asyncio
+import uuid
+
+from sqlalchemy import select
+
+from app.models.database import AsyncSessionLocal, Session, TranscriptChunk, create_tables
+from app.services.transcript_writer import TranscriptChunkWriter, join_chunks, load_chunks
+
+
+async def create_session(**fields) -> str:
+    session_id = str(uuid.uuid4())
+    async with AsyncSessionLocal() as db:
+        db.add(Session(session_id=session_id, doctor_name="Dr. Test", patient_name="Pat", **fields))
+        await db.commit()
+    return session_id
+
+
+async def load_transcript(session_id: str) -> str:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Session.transcript).where(Session.session_id == session_id))
+
+
+def test_join_chunks_skips_blank_text():
+    assert join_chunks([" hello ", "", "  ", "world"]) == "hello world"
+
+
+def test_seqs_are_allocated_in_order(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        writer = TranscriptChunkWriter(flush_size=100, flush_interval=60)
+
+        seqs = await asyncio.gather(*(
+            writer.append(session_id, f"word{i}", wait=True) for i in range(5)
+        ))
+
+        assert sorted(seqs) == [0, 1, 2, 3, 4]
+        chunks = await load_chunks(session_id)
+        assert [chunk.seq for chunk in chunks] == [0, 1, 2, 3, 4]
+        assert [chunk.chunk_text for chunk in chunks] == [f"word{seq}" for seq in sorted(seqs)]
+
+    run(scenario())
+
+
+def test_seqs_continue_after_existing_chunks(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        async with AsyncSessionLocal() as db:
+            db.add_all([
+                TranscriptChunk(session_id=session_id, seq=seq, chunk_text=f"old{seq}")
+                for seq in range(3)
+            ])
+            await db.commit()
+        writer = TranscriptChunkWriter(flush_size=100, flush_interval=60)
+
+        assert await writer.append(session_id, "new", wait=True) == 3
+
+    run(scenario())
+
+
+def test_writers_sharing_a_session_never_reuse_a_seq(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        # Stand-ins for two worker processes appending to the same session
+        writers = [TranscriptChunkWriter(flush_size=100, flush_interval=60) for _ in range(2)]
+
+        seqs = await asyncio.gather(*(
+            writers[i % 2].append(session_id, f"word{i}", wait=True) for i in range(20)
+        ))
+
+        assert sorted(seqs) == list(range(20))
+        assert [chunk.seq for chunk in await load_chunks(session_id)] == list(range(20))
+
+    run(scenario())
+
+
+def test_append_without_wait_is_buffered_until_flush(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        writer = TranscriptChunkWriter(flush_size=100, flush_interval=60)
+
+        assert await writer.append(session_id, "buffered") is None
+        assert await load_chunks(session_id) == []
+
+        await writer.close()
+        assert [chunk.chunk_text for chunk in await load_chunks(session_id)] == ["buffered"]
+
+    run(scenario())
+
+
+def test_flush_size_triggers_a_write(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        writer = TranscriptChunkWriter(flush_size=2, flush_interval=60)
+
+        await writer.append(session_id, "one")
+        await writer.append(session_id, "two")
+        await asyncio.sleep(0.1)
+
+        assert len(await load_chunks(session_id)) == 2
+
+    run(scenario())
+
+
+def test_chunks_are_appended_to_the_session_transcript(run):
+    async def scenario():
+        await create_tables()
+        empty = await create_session()
+        existing = await create_session(transcript="Doctor: hello.")
+        writer = TranscriptChunkWriter(flush_size=100, flush_interval=60)
+
+        await writer.append(empty, "first")
+        await writer.append(existing, "Patient: hi.")
+        await writer.append(empty, "second", wait=True)
+
+        assert await load_transcript(empty) == "first second"
+        assert await load_transcript(existing) == "Doctor: hello. Patient: hi."
+
+    run(scenario())
+
+
+def test_load_chunks_from_offset(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        writer = TranscriptChunkWriter(flush_size=100, flush_interval=60)
+        for i in range(4):
+            await writer.append(session_id, f"word{i}")
+        await writer.flush()
+
+        chunks = await load_chunks(session_id, offset=2)
+
+        assert [(chunk.seq, chunk.chunk_text) for chunk in chunks] == [(2, "word2"), (3, "word3")]
+
+    run(scenario())
+
+
+def test_size_triggered_flushes_are_tracked_until_done(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session()
+        writer = TranscriptChunkWriter(flush_size=2, flush_interval=60)
+
+        await writer.append(session_id, "one")
+        await writer.append(session_id, "two")
+        assert len(writer._flushes) == 1
+
+        # close() waits for flushes already started
+        await writer.close()
+        assert writer._flushes == set()
+        assert [chunk.chunk_text for chunk in await load_chunks(session_id)] == ["one", "two"]
+
+    run(scenario())
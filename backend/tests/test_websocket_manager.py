@@ -0,0 +1,378 @@
+"""
+Tests for WebSocketManager send queues, slow-consumer policies, heartbeats and limits
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from app.services.pubsub import InMemoryPubSub
+from app.services.websocket_manager import (
+    CONNECTION_LIMIT_CLOSE_CODE,
+    IDLE_TIMEOUT_CLOSE_CODE,
+    SLOW_CONSUMER_CLOSE_CODE,
+    Connection,
+    WebSocketManager,
+)
+
+
+class FakeWebSocket:
+    """Records what the server sends; sends block while ``paused`` is set"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.accepted = False
+        self.paused = False
+        self._resumed = asyncio.Event()
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, message: str):
+        while self.paused:
+            await self._resumed.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason=None):
+        self.closed_with = code
+
+    def pause(self):
+        self.paused = True
+        self._resumed.clear()
+
+    def resume(self):
+        self.paused = False
+        self._resumed.set()
+
+
+def make_manager(**options) -> WebSocketManager:
+    options.setdefault("max_queue", 2)
+    options.setdefault("send_timeout", 1.0)
+    options.setdefault("heartbeat_interval", 0)
+    return WebSocketManager(pubsub=InMemoryPubSub(), **options)
+
+
+@asynccontextmanager
+async def managed(**options):
+    """A manager whose connections are stopped when the test ends"""
+    manager = make_manager(**options)
+    try:
+        yield manager
+    finally:
+        for websocket in list(manager.active_connections):
+            manager.disconnect(websocket)
+        await manager.close()
+
+
+async def settle():
+    """Let writer tasks send whatever they can"""
+    await asyncio.sleep(0.01)
+
+
+async def connect_paused(manager: WebSocketManager, session_id: str = "s1") -> FakeWebSocket:
+    """Connect a client whose writer is stuck on its first send"""
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, session_id)
+    websocket.pause()
+    await manager.send_personal_message("in flight", websocket)
+    await settle()
+    return websocket
+
+
+def test_messages_are_sent_in_order(run):
+    async def scenario():
+        async with managed(max_queue=10) as manager:
+            websocket = FakeWebSocket()
+            await manager.connect(websocket, "s1")
+
+            for i in range(3):
+                await manager.send_to_session(f"m{i}", "s1")
+            await settle()
+
+            assert websocket.accepted
+            assert websocket.sent == ["m0", "m1", "m2"]
+
+    run(scenario())
+
+
+def test_session_messages_reach_only_that_room(run):
+    async def scenario():
+        async with managed(max_queue=10) as manager:
+            await manager.start()
+            in_room, elsewhere = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(in_room, "s1")
+            await manager.connect(elsewhere, "s2")
+
+            await manager.send_to_session("update", "s1")
+            await manager.broadcast("everyone")
+            await settle()
+
+            assert in_room.sent == ["update", "everyone"]
+            assert elsewhere.sent == ["everyone"]
+
+    run(scenario())
+
+
+def test_drop_policy_discards_new_messages(run):
+    async def scenario():
+        async with managed(policy="drop") as manager:
+            websocket = await connect_paused(manager)
+
+            for i in range(4):
+                await manager.send_to_session(f"m{i}", "s1")
+            websocket.resume()
+            await settle()
+
+            assert websocket.sent == ["in flight", "m0", "m1"]
+            assert websocket.closed_with is None
+            assert manager.stats()["dropped_messages"] == 2
+
+    run(scenario())
+
+
+def test_coalesce_policy_replaces_queued_message_in_place(run):
+    async def scenario():
+        async with managed(policy="coalesce") as manager:
+            websocket = await connect_paused(manager)
+
+            await manager.send_to_session("progress 1", "s1", coalesce_key="job:1")
+            await manager.send_to_session("chunk", "s1")
+            await manager.send_to_session("progress 2", "s1", coalesce_key="job:1")
+            await manager.send_to_session("progress 3", "s1", coalesce_key="job:1")
+            websocket.resume()
+            await settle()
+
+            assert websocket.sent == ["in flight", "progress 3", "chunk"]
+            assert manager.stats()["coalesced_messages"] == 2
+            assert manager.get_connection_count() == 1
+
+    run(scenario())
+
+
+def test_coalesce_policy_disconnects_when_nothing_can_be_replaced(run):
+    async def scenario():
+        async with managed(policy="coalesce") as manager:
+            websocket = await connect_paused(manager)
+
+            for i in range(3):
+                await manager.send_to_session(f"chunk {i}", "s1")
+            await settle()
+
+            assert websocket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+            assert manager.get_connection_count() == 0
+            assert manager.get_session_count() == 0
+            assert manager.slow_consumers == 1
+
+    run(scenario())
+
+
+def test_disconnect_policy_closes_slow_consumer(run):
+    async def scenario():
+        async with managed(policy="disconnect") as manager:
+            slow = await connect_paused(manager)
+            fast = FakeWebSocket()
+            await manager.connect(fast, "s1")
+
+            # The fast client keeps up; the stuck one overflows on the third message
+            for message in ("m0", "m1", "m2", "after"):
+                await manager.send_to_session(message, "s1")
+                await settle()
+
+            assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+            assert fast.sent == ["m0", "m1", "m2", "after"]
+            assert manager.get_connection_count() == 1
+            assert manager.slow_consumers == 1
+
+    run(scenario())
+
+
+def test_send_timeout_disconnects_the_client(run):
+    async def scenario():
+        async with managed(send_timeout=0.05) as manager:
+            websocket = await connect_paused(manager)
+
+            await asyncio.sleep(0.1)
+            await settle()
+
+            assert websocket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+            assert manager.get_connection_count() == 0
+
+    run(scenario())
+
+
+def test_stop_ends_writer_even_when_a_send_completes_at_the_same_time(run):
+    async def scenario():
+        websocket = FakeWebSocket()
+        connection = Connection(websocket, max_queue=5, policy="drop", send_timeout=1.0)
+        connection.start(lambda connection: None)
+        websocket.pause()
+        connection.enqueue("last")
+        await settle()
+
+        # The send finishes in the same loop iteration the writer is cancelled
+        websocket.resume()
+        await asyncio.sleep(0)
+        connection.stop()
+        await settle()
+
+        assert websocket.sent == ["last"]
+        assert connection._writer.done()
+
+    run(scenario())
+
+
+def test_unknown_policy_is_rejected():
+    try:
+        make_manager(policy="buffer")
+    except ValueError as e:
+        assert "buffer" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_stats_report_queue_depth(run):
+    async def scenario():
+        async with managed(policy="drop", max_queue=5) as manager:
+            await connect_paused(manager)
+
+            await manager.send_to_session(json.dumps({"type": "transcript"}), "s1")
+
+            stats = manager.stats()
+            assert stats["connections"] == 1
+            assert stats["queued_messages"] == 1
+            assert stats["policy"] == "drop"
+            assert stats["pubsub_backend"] == "InMemoryPubSub"
+
+    run(scenario())
+
+
+def test_sweep_pings_live_connections_once(run):
+    async def scenario():
+        async with managed(idle_timeout=60) as manager:
+            websocket = await connect_paused(manager)
+
+            manager._sweep()
+            manager._sweep()
+            websocket.resume()
+            await settle()
+
+            assert len(websocket.sent) == 2
+            assert json.loads(websocket.sent[1])["type"] == "ping"
+            assert manager.get_connection_count() == 1
+
+    run(scenario())
+
+
+def test_sweep_closes_idle_connections(run):
+    async def scenario():
+        async with managed(idle_timeout=0.05) as manager:
+            idle, active = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(idle, "s1")
+            active_connection = await manager.connect(active, "s1")
+            await asyncio.sleep(0.1)
+
+            active_connection.touch()
+            manager._sweep()
+            await settle()
+
+            assert idle.closed_with == IDLE_TIMEOUT_CLOSE_CODE
+            assert active.closed_with is None
+            assert manager.get_connection_count() == 1
+            assert manager.idle_closed == 1
+
+    run(scenario())
+
+
+def test_busy_connections_are_not_reaped(run):
+    async def scenario():
+        async with managed(idle_timeout=0.05) as manager:
+            websocket = FakeWebSocket()
+            connection = await manager.connect(websocket, "s1")
+            connection.touch(busy=True)
+            await asyncio.sleep(0.1)
+
+            manager._sweep()
+            await settle()
+            assert websocket.closed_with is None
+
+            # Once the request is handled, the idle clock starts again
+            connection.touch()
+            await asyncio.sleep(0.1)
+            manager._sweep()
+            await settle()
+            assert websocket.closed_with == IDLE_TIMEOUT_CLOSE_CODE
+
+    run(scenario())
+
+
+def test_heartbeat_task_reaps_idle_sockets(run):
+    async def scenario():
+        async with managed(heartbeat_interval=0.02, idle_timeout=0.05) as manager:
+            await manager.start()
+            websocket = FakeWebSocket()
+            await manager.connect(websocket, "s1")
+
+            await asyncio.sleep(0.15)
+
+            assert any(json.loads(message)["type"] == "ping" for message in websocket.sent)
+            assert websocket.closed_with == IDLE_TIMEOUT_CLOSE_CODE
+            assert manager.get_connection_count() == 0
+
+    run(scenario())
+
+
+def test_connection_limit_rejects_new_sockets(run):
+    async def scenario():
+        async with managed(max_connections=1) as manager:
+            await manager.connect(FakeWebSocket(), "s1")
+            rejected = FakeWebSocket()
+
+            assert await manager.connect(rejected, "s2") is None
+            assert json.loads(rejected.sent[0])["code"] == "too_many_connections"
+            assert rejected.closed_with == CONNECTION_LIMIT_CLOSE_CODE
+            assert manager.get_connection_count() == 1
+            assert manager.rejected_connections == 1
+
+    run(scenario())
+
+
+def test_session_limit_rejects_connects_and_joins(run):
+    async def scenario():
+        async with managed(max_connections_per_session=1) as manager:
+            await manager.connect(FakeWebSocket(), "s1")
+            rejected = FakeWebSocket()
+            assert await manager.connect(rejected, "s1") is None
+            assert json.loads(rejected.sent[0])["code"] == "session_connection_limit"
+
+            other = FakeWebSocket()
+            await manager.connect(other, "s2")
+            assert manager.bind(other, "s1") is False
+            await settle()
+
+            error = json.loads(other.sent[0])
+            assert error["code"] == "session_connection_limit"
+            assert error["session_id"] == "s1"
+            assert other.closed_with is None
+            assert manager.rejected_joins == 1
+
+    run(scenario())
+
+
+def test_inflight_limit_rejects_requests_with_their_seq(run):
+    async def scenario():
+        async with managed(max_inflight=2) as manager:
+            websocket = FakeWebSocket()
+            await manager.connect(websocket, "s1")
+
+            assert manager.admit_request(websocket, 1, {"type": "audio_chunk", "seq": 7})
+            assert not manager.admit_request(websocket, 2, {"type": "audio_chunk", "seq": 8})
+            await settle()
+
+            error = json.loads(websocket.sent[0])
+            assert error["code"] == "too_many_requests"
+            assert (error["request"], error["seq"]) == ("audio_chunk", 8)
+            assert manager.rejected_requests == 1
+
+    run(scenario())
+
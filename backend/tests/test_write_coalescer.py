@@ -0,0 +1,122 @@
+"""
+Tests for the group-commit session writer
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.models.database import AsyncSessionLocal, Session, create_tables
+from app.services import write_coalescer as write_coalescer_module
+from app.services.write_coalescer import WriteCoalescer
+
+
+async def create_session(**fields) -> str:
+    session_id = str(uuid.uuid4())
+    async with AsyncSessionLocal() as db:
+        db.add(Session(session_id=session_id, doctor_name="Dr. Test", patient_name="Pat", **fields))
+        await db.commit()
+    return session_id
+
+
+async def load(session_id: str) -> Session:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Session).where(Session.session_id == session_id))
+
+
+def test_concurrent_updates_share_one_commit(run):
+    async def scenario():
+        await create_tables()
+        session_ids = [await create_session() for _ in range(5)]
+        coalescer = WriteCoalescer(interval=0.05, max_batch=100)
+
+        results = await asyncio.gather(*(
+            coalescer.update(session_id, transcript=f"text {i}")
+            for i, session_id in enumerate(session_ids)
+        ))
+
+        assert results == [True] * 5
+        assert coalescer.stats() == {"writes": 5, "batches": 1, "pending_sessions": 0}
+        for i, session_id in enumerate(session_ids):
+            assert (await load(session_id)).transcript == f"text {i}"
+
+    run(scenario())
+
+
+def test_later_values_replace_earlier_ones_in_a_batch(run):
+    async def scenario():
+        await create_tables()
+        session_id = await create_session(transcript="old")
+        coalescer = WriteCoalescer(interval=0.05, max_batch=100)
+
+        results = await asyncio.gather(
+            coalescer.update(session_id, transcript="first"),
+            coalescer.update(session_id, transcript="second"),
+            coalescer.touch(session_id),
+        )
+
+        assert results == [True, True, True]
+        assert coalescer.batches == 1
+        session = await load(session_id)
+        assert session.transcript == "second"
+        assert session.updated_at is not None
+
+    run(scenario())
+
+
+def test_unknown_session_returns_false(run):
+    async def scenario():
+        await create_tables()
+        coalescer = WriteCoalescer(interval=0, max_batch=100)
+
+        assert await coalescer.update("no-such-session", transcript="x") is False
+
+    run(scenario())
+
+
+def test_commit_error_is_raised_to_every_waiter(run, monkeypatch):
+    class BrokenSession:
+        async def __aenter__(self):
+            raise RuntimeError("database is locked")
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+    monkeypatch.setattr(write_coalescer_module, "AsyncSessionLocal", BrokenSession)
+
+    async def scenario():
+        coalescer = WriteCoalescer(interval=0.01, max_batch=100)
+
+        results = await asyncio.gather(
+            coalescer.update("a", transcript="x"),
+            coalescer.update("b", transcript="y"),
+            return_exceptions=True,
+        )
+
+        assert [str(result) for result in results] == ["database is locked"] * 2
+        assert all(isinstance(result, RuntimeError) for result in results)
+        # The failed batch is not retried or left pending
+        assert coalescer.stats()["pending_sessions"] == 0
+
+    run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_batch(run):
+    async def scenario():
+        await create_tables()
+        session_ids = [await create_session() for _ in range(2)]
+        coalescer = WriteCoalescer(interval=0.05, max_batch=100)
+
+        cancelled = asyncio.create_task(coalescer.update(session_ids[0], transcript="kept"))
+        other = asyncio.create_task(coalescer.update(session_ids[1], transcript="other"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        assert await other is True
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert (await load(session_ids[0])).transcript == "kept"
+
+    run(scenario())
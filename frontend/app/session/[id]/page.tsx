@@ -95,10 +95,15 @@ export default function SessionPage() {
       
       switch (message.type) {
         case "transcript_complete":
-          setCurrentTranscript(message.data);
           setIsProcessing(false);
-          // Update session transcript in backend
-          updateSessionTranscript(message.data);
+          if (message.incomplete) {
+            // Parts of the recording failed to transcribe; the backend did not save it
+            alert(`${message.failed_segments.length} part(s) of the recording could not be transcribed, so it was not added to the transcript. Please try again.`);
+            break;
+          }
+          // The backend appends each recording to the session transcript
+          // (session_id is sent with the audio), so mirror that here
+          setCurrentTranscript(prev => prev ? `${prev} ${message.data}` : message.data);
           break;
         case "soap_generated":
           setSessionData(prev => prev ? { ...prev, soap_note: message.data } : prev);
@@ -111,6 +116,10 @@ export default function SessionPage() {
         case "compliance_report":
           setSessionData(prev => prev ? { ...prev, compliance_report: message.data } : prev);
           break;
+        case "ping":
+          // Server heartbeat; idle sockets that do not answer are closed
+          wsRef.current?.send(JSON.stringify({ type: "pong" }));
+          break;
       }
     };
     
@@ -178,22 +187,6 @@ export default function SessionPage() {
     }
   };
 
-  const updateSessionTranscript = async (transcript: string) => {
-    try {
-      await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/v1/sessions/${sessionId}/transcript`, {
-        method: "PUT",
-        headers: {
-          "Content-Type": "application/x-www-form-urlencoded",
-        },
-        body: new URLSearchParams({
-          transcript: transcript
-        }),
-      });
-    } catch (error) {
-      console.error("Error updating transcript:", error);
-    }
-  };
-
   const generateSOAPNote = () => {
     setIsProcessing(true);
     if (wsRef.current?.readyState === WebSocket.OPEN) {